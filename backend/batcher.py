@@ -0,0 +1,63 @@
+# backend/batcher.py
+import asyncio
+from typing import Callable, List
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item requests into one batched call.
+
+    Items submitted while a window is open are collected for up to
+    `max_wait_ms` (or until `max_batch_size` items arrived), then
+    `batch_fn(items)` runs once in `executor` and every awaiting caller
+    gets its own row of the result.
+    """
+
+    def __init__(self, batch_fn: Callable[[list], list], max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, executor=None):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+        self._pending = []
+        self._timer = None
+        self._running = set()   # strong refs so in-flight batches are not GC'd
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[tuple]):
+        loop = asyncio.get_running_loop()
+        items = [item for item, _ in batch]
+        try:
+            results = await loop.run_in_executor(self.executor, self.batch_fn, items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            # the caller may have gone away (client disconnect / timeout)
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,89 @@
+# backend/config.py
+import os
+
+# -------------------- Paths --------------------
+INDEX_DIR = os.environ.get("INDEX_DIR", "indices1")
+
+# -------------------- FAISS query-time knobs --------------------
+# Only used by IVF (nprobe) and HNSW (efSearch) indices, see embed.py --index-type
+FAISS_NPROBE = int(os.environ.get("FAISS_NPROBE", 16))
+FAISS_EF_SEARCH = int(os.environ.get("FAISS_EF_SEARCH", 64))
+# Map index files read-only so all uvicorn workers share one copy
+FAISS_MMAP = os.environ.get("FAISS_MMAP", "0") == "1"
+# For compressed indices (fp16 / sq8 / pq / ivf_pq): fetch RERANK_FACTOR * k candidates
+# and re-score them exactly from {name}_vectors.npy (0 or 1 = off)
+RERANK_FACTOR = int(os.environ.get("RERANK_FACTOR", 4))
+# Threads searching index shards (indices1/shard_NNN/) in parallel; 0 = one per shard
+SEARCH_THREADS = int(os.environ.get("SEARCH_THREADS", 0))
+
+# -------------------- Filtered Search --------------------
+# /search?page_id=&section=&source= restricts the index search to the matching
+# ids (backend/filters.py). Up to FILTER_EXACT_MAX matching ids per shard are
+# scored exactly; larger sets go through a FAISS IDSelector
+FILTER_EXACT_MAX = int(os.environ.get("FILTER_EXACT_MAX", 50000))
+
+# -------------------- Long-text Windows --------------------
+# embed.py splits long blocks into overlapping windows (one vector each).
+# Text search fetches TEXT_OVERFETCH * k windows and pools them into one
+# result per TEXT_GROUP ("block" or "page"): "max" keeps the best window's
+# score, "sum" adds up every window found (favours blocks that match throughout)
+TEXT_OVERFETCH = int(os.environ.get("TEXT_OVERFETCH", 4))
+TEXT_POOLING = os.environ.get("TEXT_POOLING", "max")
+TEXT_GROUP = os.environ.get("TEXT_GROUP", "block")
+
+# -------------------- Cross-modal Fusion --------------------
+# Unified responses also carry "results": text and image hits in one list.
+# Each modality's scores are z-normalized over its FUSION_OVERFETCH * k
+# candidates, then MMR picks k of them, penalizing repeats of a page by
+# (1 - MMR_LAMBDA) on a 0..1 relevance scale (1 = no diversification)
+FUSION_OVERFETCH = int(os.environ.get("FUSION_OVERFETCH", 3))
+MMR_LAMBDA = float(os.environ.get("MMR_LAMBDA", 0.5))
+
+# -------------------- Lexical / Hybrid Search --------------------
+# BM25 reads at most this many postings per query term (lists are sorted by
+# impact, so only low-weight matches of very common terms are skipped)
+BM25_MAX_POSTINGS = int(os.environ.get("BM25_MAX_POSTINGS", 10000))
+# mode=hybrid fuses the top HYBRID_DEPTH (at least k) of BM25 and of CLIP with
+# reciprocal rank fusion, score = sum 1 / (RRF_K + rank)
+HYBRID_DEPTH = int(os.environ.get("HYBRID_DEPTH", 50))
+RRF_K = int(os.environ.get("RRF_K", 60))
+
+# -------------------- Model / Startup --------------------
+MODEL_NAME = os.environ.get("MODEL_NAME", "openai/clip-vit-base-patch32")
+# Run one text + one image forward pass before reporting ready
+WARMUP = os.environ.get("WARMUP", "1") == "1"
+# torch | int8 | onnx | onnx_int8, see backend/encoders.py and benchmarks/encoders.py
+ENCODER_BACKEND = os.environ.get("ENCODER_BACKEND", "torch")
+# intra-op threads for the encoder (0 = one per core)
+ENCODER_THREADS = int(os.environ.get("ENCODER_THREADS", 0))
+ONNX_DIR = os.environ.get("ONNX_DIR", os.path.join("models", "onnx"))
+
+# -------------------- Query Micro-batching --------------------
+# Concurrent /search queries wait up to BATCH_MAX_WAIT_MS for company,
+# then share one CLIP forward pass of at most BATCH_MAX_SIZE queries
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 32))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 5))
+
+# -------------------- Caches --------------------
+# normalized query text -> CLIP embedding
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", 10000))
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", 3600))
+# (query, k, index version) -> full response
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 10000))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", 300))
+# refinement sessions: session_id -> query vector (~2 KB each), per worker process
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", 20000))
+SESSION_TTL = float(os.environ.get("SESSION_TTL", 1800))
+# how often (seconds) to stat indices1/ for a new embed.py run
+INDEX_CHECK_INTERVAL = float(os.environ.get("INDEX_CHECK_INTERVAL", 5))
+
+# -------------------- Request Execution --------------------
+# Threads for image decoding, CLIP batches and FAISS searches
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 4))
+# Requests allowed to be queued or running at once; beyond this the API answers 503
+MAX_INFLIGHT = int(os.environ.get("MAX_INFLIGHT", 64))
+
+# -------------------- Batch Search --------------------
+BATCH_SEARCH_MAX_QUERIES = int(os.environ.get("BATCH_SEARCH_MAX_QUERIES", 5000))
+# batches larger than this are streamed as NDJSON unless stream=false
+BATCH_SEARCH_STREAM_OVER = int(os.environ.get("BATCH_SEARCH_STREAM_OVER", 100))
@@ -0,0 +1,70 @@
+# backend/csr_store.py
+import os
+import json
+import argparse
+import numpy as np
+
+from backend.index_factory import shard_dirs
+from backend.meta_store import open_meta
+
+# -------------------- Format --------------------
+# Compressed sparse rows next to an index, used by the BM25 postings
+# (backend/lexical.py) and the filter postings (backend/filters.py):
+#   {base}.json         what the rows are (terms / keys) plus stats
+#   {base}_{part}.npy   one array per part; "offsets" is int64 (n_rows + 1)
+#                       and row r of every other part is part[off[r]:off[r+1]]
+# Arrays are written first and the json last, each through a temp file and
+# os.replace, so a reader only ever opens what the json describes.
+
+
+def csr_paths(index_dir: str, base: str, parts) -> dict:
+    path = os.path.join(index_dir, base)
+    return {"meta": path + ".json", **{part: f"{path}_{part}.npy" for part in parts}}
+
+
+def row_offsets(lengths) -> np.ndarray:
+    offsets = np.zeros(len(lengths) + 1, dtype="int64")
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def write_csr(paths: dict, arrays: dict, meta: dict):
+    for part, arr in arrays.items():
+        with open(paths[part] + ".tmp", "wb") as f:
+            np.save(f, arr)
+        os.replace(paths[part] + ".tmp", paths[part])
+    with open(paths["meta"] + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(paths["meta"] + ".tmp", paths["meta"])
+
+
+def read_csr(paths: dict):
+    """
+    Returns (meta, {part: memory-mapped array}). Parts whose file is
+    missing (written by an older version) are None.
+    """
+    with open(paths["meta"], "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    arrays = {
+        part: np.load(path, mmap_mode="r") if os.path.exists(path) else None
+        for part, path in paths.items() if part != "meta"
+    }
+    return meta, arrays
+
+
+# -------------------- CLI Helpers --------------------
+def index_dir_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--index-dir", default="indices1")
+    return parser
+
+
+def shard_records(index_dir: str, name: str):
+    """
+    Yields (directory, records of `name` in id order) for every shard of
+    index_dir, so a CLI can rebuild its structure without re-embedding.
+    """
+    for d in shard_dirs(index_dir):
+        meta = open_meta(d, name)
+        # older {name}_meta.json is a dict of id -> record
+        yield d, ((meta[i] for i in sorted(meta)) if isinstance(meta, dict) else meta)
@@ -0,0 +1,203 @@
+# backend/encoders.py
+import os
+import tempfile
+import numpy as np
+import torch
+
+# -------------------- Backends --------------------
+# torch      fp32 PyTorch CLIPModel (the reference every other backend is checked against)
+# int8       PyTorch with dynamic int8 quantization of every nn.Linear, CPU only
+# onnx       text / image towers exported to ONNX Runtime
+# onnx_int8  the exported ONNX graphs with dynamically quantized int8 weights
+ENCODER_BACKENDS = ("torch", "int8", "onnx", "onnx_int8")
+ONNX_DIR = os.path.join("models", "onnx")
+ONNX_OPSET = 17
+
+
+def normalize_rows(mat: np.ndarray) -> np.ndarray:
+    n = np.linalg.norm(mat, axis=1, keepdims=True)
+    n[n == 0] = 1
+    return (mat / n).astype("float32")
+
+
+def pooled(output):
+    # get_*_features returns a tensor or, on some transformers versions, a model output
+    if hasattr(output, "pooler_output"):
+        return output.pooler_output
+    if torch.is_tensor(output):
+        return output
+    raise RuntimeError(f"Unknown CLIP output type: {type(output)}")
+
+
+def set_threads(threads: int = None):
+    # 0 / None keeps the library default (one thread per core)
+    if threads:
+        torch.set_num_threads(threads)
+
+
+def load_processor(model_name: str):
+    from transformers import CLIPProcessor
+    return CLIPProcessor.from_pretrained(model_name, use_fast=False)
+
+
+# -------------------- PyTorch --------------------
+class TorchEncoder:
+    """
+    CLIP text / image towers in PyTorch, optionally with int8 dynamic
+    quantization (weights int8, activations quantized on the fly).
+    """
+
+    def __init__(self, model_name: str, quantize: bool = False, threads: int = None, device: str = None):
+        from transformers import CLIPModel
+
+        set_threads(threads)
+        model = CLIPModel.from_pretrained(model_name).eval()
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            device = "cpu"   # quantized kernels only exist on CPU
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = model.to(self.device)
+        self.processor = load_processor(model_name)
+
+    def embed_texts(self, texts: list) -> np.ndarray:
+        inputs = self.processor(text=texts, return_tensors="pt", padding=True, truncation=True).to(self.device)
+        with torch.no_grad():
+            emb = pooled(self.model.get_text_features(**inputs))
+        return normalize_rows(emb.cpu().numpy())
+
+    def embed_images(self, images: list) -> np.ndarray:
+        inputs = self.processor(images=images, return_tensors="pt").to(self.device)
+        with torch.no_grad():
+            emb = pooled(self.model.get_image_features(**inputs))
+        return normalize_rows(emb.cpu().numpy())
+
+
+# -------------------- ONNX Runtime --------------------
+class _TextTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return pooled(self.model.get_text_features(input_ids=input_ids, attention_mask=attention_mask))
+
+
+class _ImageTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return pooled(self.model.get_image_features(pixel_values=pixel_values))
+
+
+def onnx_paths(model_name: str, onnx_dir: str = ONNX_DIR, quantize: bool = False) -> dict:
+    slug = model_name.replace("/", "__")
+    suffix = ".int8.onnx" if quantize else ".onnx"
+    return {tower: os.path.join(onnx_dir, f"{slug}_{tower}{suffix}") for tower in ("text", "image")}
+
+
+def export_onnx(model_name: str, onnx_dir: str = ONNX_DIR, quantize: bool = False) -> dict:
+    """
+    Exports both towers once (and their int8 variants when asked) and
+    returns the paths. Existing files are reused, so only the first
+    process on a host pays for the export.
+    """
+    paths = onnx_paths(model_name, onnx_dir, quantize)
+    if all(os.path.exists(p) for p in paths.values()):
+        return paths
+
+    fp32 = onnx_paths(model_name, onnx_dir)
+    if not all(os.path.exists(p) for p in fp32.values()):
+        from transformers import CLIPModel
+
+        os.makedirs(onnx_dir, exist_ok=True)
+        model = CLIPModel.from_pretrained(model_name).eval()
+        processor = load_processor(model_name)
+        text = processor(text=["a photo", "a longer example caption"], return_tensors="pt", padding=True)
+        pixels = torch.zeros(2, 3, 224, 224)
+
+        print(f"Exporting {model_name} to ONNX in {onnx_dir} ...")
+        exports = [
+            (_TextTower(model), (text["input_ids"], text["attention_mask"]), fp32["text"],
+             ["input_ids", "attention_mask"], {"input_ids": {0: "batch", 1: "seq"},
+                                               "attention_mask": {0: "batch", 1: "seq"}}),
+            (_ImageTower(model), (pixels,), fp32["image"],
+             ["pixel_values"], {"pixel_values": {0: "batch"}}),
+        ]
+        for tower, example, path, names, axes in exports:
+            axes["embeds"] = {0: "batch"}
+            with torch.no_grad():
+                _write_replace(path, lambda tmp: torch.onnx.export(
+                    tower, example, tmp, input_names=names, output_names=["embeds"],
+                    dynamic_axes=axes, opset_version=ONNX_OPSET))
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        for tower, path in paths.items():
+            _write_replace(path, lambda tmp: quantize_dynamic(fp32[tower], tmp, weight_type=QuantType.QInt8))
+    return paths
+
+
+def _write_replace(path: str, write):
+    # uvicorn / embed.py workers may export at the same time: each writes its
+    # own temp file and renames it over path, so readers only see whole files
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class OnnxEncoder:
+    """
+    The two CLIP towers as ONNX Runtime sessions (fp32 or int8 weights).
+    Same inputs and outputs as TorchEncoder.
+    """
+
+    def __init__(self, model_name: str, quantize: bool = False, threads: int = None, onnx_dir: str = ONNX_DIR):
+        import onnxruntime as ort
+
+        paths = export_onnx(model_name, onnx_dir, quantize)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+
+        providers = ["CPUExecutionProvider"]
+        self.text_session = ort.InferenceSession(paths["text"], options, providers=providers)
+        self.image_session = ort.InferenceSession(paths["image"], options, providers=providers)
+        self.processor = load_processor(model_name)
+
+    def embed_texts(self, texts: list) -> np.ndarray:
+        inputs = self.processor(text=texts, return_tensors="np", padding=True, truncation=True)
+        emb = self.text_session.run(None, {
+            "input_ids": inputs["input_ids"].astype("int64"),
+            "attention_mask": inputs["attention_mask"].astype("int64"),
+        })[0]
+        return normalize_rows(emb)
+
+    def embed_images(self, images: list) -> np.ndarray:
+        inputs = self.processor(images=images, return_tensors="np")
+        emb = self.image_session.run(None, {"pixel_values": inputs["pixel_values"].astype("float32")})[0]
+        return normalize_rows(emb)
+
+
+# -------------------- Factory --------------------
+def load_encoder(backend: str, model_name: str, threads: int = None, onnx_dir: str = ONNX_DIR):
+    """
+    Returns an encoder with embed_texts(list[str]) and embed_images(list[PIL.Image]),
+    both giving L2-normalized (B, 512) float32 arrays.
+    """
+    if backend == "torch":
+        return TorchEncoder(model_name, threads=threads)
+    if backend == "int8":
+        return TorchEncoder(model_name, quantize=True, threads=threads)
+    if backend in ("onnx", "onnx_int8"):
+        return OnnxEncoder(model_name, quantize=backend == "onnx_int8", threads=threads, onnx_dir=onnx_dir)
+    raise ValueError(f"Unknown encoder backend {backend!r}, expected one of {ENCODER_BACKENDS}")
@@ -0,0 +1,87 @@
+# backend/executor.py
+import asyncio
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+
+class Overloaded(Exception):
+    """Raised when a request arrives while MAX_INFLIGHT requests are already queued or running."""
+
+
+class BoundedExecutor:
+    """
+    Dedicated thread pool for blocking work (image decode, CLIP, FAISS)
+    plus admission control: at most `max_inflight` requests may be queued
+    or running at once, the rest are rejected immediately instead of
+    growing an unbounded queue in front of the pool.
+    """
+
+    def __init__(self, max_workers: int, max_inflight: int, name: str = "inference"):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.max_workers = max_workers
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.rejected = 0
+        self.waiters = deque()   # futures of admit_waiting() callers, oldest first
+
+    def check_capacity(self):
+        # only touched from the event loop thread, so no lock is needed
+        if self.inflight >= self.max_inflight:
+            self.rejected += 1
+            raise Overloaded(f"{self.inflight} requests in flight")
+
+    @contextmanager
+    def admit(self):
+        self.check_capacity()
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def admit_waiting(self):
+        """
+        Like admit(), but waits for a free slot instead of raising. For work
+        that belongs to a request already let in, e.g. the later chunks of a
+        batch search, which should queue behind other requests, not fail.
+        """
+        while self.inflight >= self.max_inflight:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if not waiter.done():
+                    waiter.cancel()
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        self.inflight -= 1
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, partial(fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "max_inflight": self.max_inflight,
+            "inflight": self.inflight,
+            "waiting": sum(not w.done() for w in self.waiters),
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
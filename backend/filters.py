@@ -0,0 +1,99 @@
+# backend/filters.py
+import os
+from array import array
+import numpy as np
+
+from backend.csr_store import csr_paths, row_offsets, write_csr, read_csr
+
+# -------------------- Format --------------------
+# Attribute postings for filtered search, next to {name}.index in every
+# index / shard directory. Compressed sparse rows (backend/csr_store.py),
+# one sorted id list per "field=value":
+#   {name}_filters.json          {"keys": [...], "fields": [...]}
+#   {name}_filters_offsets.npy   int64 (n_keys + 1)
+#   {name}_filters_ids.npy       int64, ids of key i = ids[off[i]:off[i+1]]
+# Search intersects the lists of the requested fields and hands the result
+# to the index (index_factory.search_subset), so a filter never shrinks k.
+FILTER_FIELDS = ("page_id", "section", "source")
+
+
+def filter_paths(index_dir: str, name: str) -> dict:
+    return csr_paths(index_dir, f"{name}_filters", ("offsets", "ids"))
+
+
+def filter_key(field: str, value) -> str:
+    return f"{field}={value}"
+
+
+# -------------------- Build --------------------
+def build_filters(records, index_dir: str, name: str) -> dict:
+    """
+    Writes the postings of FILTER_FIELDS for an iterable of metadata records
+    in increasing id order (so every list comes out sorted).
+    """
+    postings = {}
+    for record in records:
+        for field in FILTER_FIELDS:
+            value = record.get(field)
+            if value is None or value == "":
+                continue
+            postings.setdefault(filter_key(field, value), array("q")).append(record["id"])
+
+    keys = list(postings)
+    offsets = row_offsets([len(postings[key]) for key in keys])
+    ids = np.concatenate([np.frombuffer(postings[key], dtype="int64") for key in keys]) if keys \
+        else np.zeros(0, dtype="int64")
+    write_csr(filter_paths(index_dir, name), {"offsets": offsets, "ids": ids},
+              {"fields": list(FILTER_FIELDS), "keys": keys})
+    return {"keys": len(keys), "postings": len(ids)}
+
+
+# -------------------- Lookup --------------------
+class FilterIndex:
+    """
+    field=value -> sorted ids for one directory. Id lists are memory-mapped.
+    """
+
+    def __init__(self, index_dir: str, name: str):
+        meta, arrays = read_csr(filter_paths(index_dir, name))
+        self.rows = {key: row for row, key in enumerate(meta["keys"])}
+        self.offsets = arrays["offsets"]
+        self.ids = arrays["ids"]
+
+    def postings(self, field: str, value) -> np.ndarray:
+        row = self.rows.get(filter_key(field, value))
+        if row is None:
+            return np.zeros(0, dtype="int64")
+        return self.ids[int(self.offsets[row]):int(self.offsets[row + 1])]
+
+    def allowed(self, filters: dict) -> np.ndarray:
+        """
+        Sorted ids matching every field of `filters` (AND), shortest list first.
+        """
+        lists = sorted((self.postings(f, v) for f, v in filters.items()), key=len)
+        ids = np.asarray(lists[0])
+        for other in lists[1:]:
+            if not len(ids):
+                break
+            ids = np.intersect1d(ids, other, assume_unique=True)
+        return ids
+
+
+def open_filters(index_dir: str, name: str):
+    if not os.path.exists(filter_paths(index_dir, name)["meta"]):
+        return None
+    return FilterIndex(index_dir, name)
+
+
+# -------------------- CLI --------------------
+if __name__ == "__main__":
+    # builds the postings for existing metadata, without re-embedding
+    from backend.csr_store import index_dir_parser, shard_records
+
+    parser = index_dir_parser("build the page_id / section / source filter postings")
+    args = parser.parse_args()
+
+    for name in ("text", "image"):
+        for d, records in shard_records(args.index_dir, name):
+            stats = build_filters(records, d, name)
+            print(f"{d} {name}: {stats['keys']} filter keys, {stats['postings']} postings")
@@ -0,0 +1,430 @@
+# backend/index_factory.py
+import os
+import time
+import argparse
+import warnings
+import numpy as np
+import faiss
+
+from backend.config import FILTER_EXACT_MAX
+
+# -------------------- Index Types --------------------
+# flat     exact brute force (the baseline)
+# ivf_flat inverted lists over k-means cells, raw vectors, tune nprobe
+# ivf_pq   inverted lists + product-quantized codes, tune nprobe
+# hnsw     graph index, tune efSearch
+# fp16     exhaustive, vectors stored as float16 (2x smaller)
+# sq8      exhaustive, 8-bit scalar quantization per dimension (4x smaller)
+# pq       exhaustive, product-quantized codes (PQ_M bytes per vector)
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "fp16", "sq8", "pq")
+# types whose stored vectors are approximate; embed.py keeps the originals
+# in {name}_vectors.npy for them so search can re-rank exactly
+LOSSY_TYPES = ("ivf_pq", "fp16", "sq8", "pq")
+
+TRAIN_SIZE = 50000
+ADD_CHUNK = 65536  # vectors copied into the index per add_with_ids call
+PQ_M = 64          # sub-quantizers for ivf_pq (512 / 64 = 8 dims each)
+HNSW_M = 32
+EF_CONSTRUCTION = 200
+
+
+def default_nlist(n: int) -> int:
+    # ~4*sqrt(n) cells, but keep >= 39 training points per centroid
+    return max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+
+def make_index(kind: str, dim: int, n: int, nlist: int = None) -> faiss.Index:
+    if kind == "flat":
+        return faiss.IndexFlatIP(dim)
+    if kind == "ivf_flat":
+        quantizer = faiss.IndexFlatIP(dim)
+        return faiss.IndexIVFFlat(quantizer, dim, nlist or default_nlist(n), faiss.METRIC_INNER_PRODUCT)
+    if kind == "ivf_pq":
+        quantizer = faiss.IndexFlatIP(dim)
+        return faiss.IndexIVFPQ(quantizer, dim, nlist or default_nlist(n), PQ_M, 8, faiss.METRIC_INNER_PRODUCT)
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = EF_CONSTRUCTION
+        return index
+    if kind == "fp16":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+    if kind == "sq8":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    if kind == "pq":
+        return faiss.IndexPQ(dim, PQ_M, 8, faiss.METRIC_INNER_PRODUCT)
+    raise ValueError(f"Unknown index type {kind!r}, expected one of {INDEX_TYPES}")
+
+
+def train_sample(vectors: np.ndarray, size: int = TRAIN_SIZE, seed: int = 0) -> np.ndarray:
+    if len(vectors) <= size:
+        return vectors
+    rows = np.random.default_rng(seed).choice(len(vectors), size, replace=False)
+    return vectors[np.sort(rows)]
+
+
+def build_index(vectors: np.ndarray, ids: np.ndarray, kind: str = "flat",
+                nlist: int = None, train_size: int = TRAIN_SIZE, by_id: bool = False) -> faiss.Index:
+    """
+    Builds an index of the requested type that is addressed by `ids`,
+    training it on a random sample when the type needs training.
+    IVF indices store ids natively (and support remove_ids); the others
+    are wrapped in IndexIDMap2.
+
+    With by_id=True, row ids[i] of `vectors` holds the vector of ids[i]
+    (e.g. a memory-mapped {name}_vectors.npy). Vectors are read in chunks
+    either way, so a memmap never has to be loaded whole.
+    """
+    ids = np.asarray(ids, dtype="int64")
+    dim = vectors.shape[1]
+    base = make_index(kind, dim, len(ids), nlist)
+
+    if not base.is_trained:
+        rows = train_sample(ids if by_id else np.arange(len(ids)), train_size)
+        sample = np.ascontiguousarray(vectors[rows], dtype="float32")
+        # sq8 only learns per-dimension ranges; IVF / PQ need enough points for k-means
+        if len(sample) < (1 if kind == "sq8" else 256):
+            # k-means / PQ codebooks need a minimum number of points
+            print(f"[!] Only {len(sample)} vectors, too few to train {kind}; using flat.")
+            base = make_index("flat", dim, len(vectors))
+        else:
+            base.train(sample)
+
+    index = base if isinstance(base, faiss.IndexIVF) else faiss.IndexIDMap2(base)
+    for start in range(0, len(ids), ADD_CHUNK):
+        chunk = ids[start:start + ADD_CHUNK]
+        rows = vectors[chunk] if by_id else vectors[start:start + ADD_CHUNK]
+        index.add_with_ids(np.ascontiguousarray(rows, dtype="float32"), chunk)
+    return index
+
+
+def read_index(path: str, mmap: bool = False) -> faiss.Index:
+    """
+    With mmap=True the vector storage is mapped read-only from the file
+    instead of copied into process memory, so every worker on the host
+    shares one physical copy through the page cache. embed.py only ever
+    replaces index files (write + rename), never rewrites them in place,
+    which keeps existing mappings valid.
+    """
+    if not mmap:
+        return faiss.read_index(path)
+
+    errors = []
+    for flags in mmap_flags():
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError as e:
+            errors.append(str(e).splitlines()[0])
+    warnings.warn(f"Cannot mmap {path}, loading a private copy: {'; '.join(errors)}", RuntimeWarning)
+    return faiss.read_index(path)
+
+
+def mmap_flags() -> list:
+    # tried in order: IO_FLAG_MMAP_IFC maps flat / HNSW / SQ storage, but
+    # combined with IO_FLAG_MMAP it makes IVF indices fail to load
+    # ("OnDiskInvertedListsIOHook::read_ArrayInvertedLists"); IVF inverted
+    # lists are mapped by IO_FLAG_MMAP alone
+    ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    attempts = [faiss.IO_FLAG_MMAP]
+    if ifc:
+        attempts.insert(0, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | ifc)
+    return attempts
+
+
+def base_index(index: faiss.Index) -> faiss.Index:
+    # unwraps IndexIDMap / IndexIDMap2
+    if hasattr(index, "id_map"):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def index_type(index: faiss.Index) -> str:
+    base = base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexScalarQuantizer):
+        return "fp16" if base.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    if isinstance(base, faiss.IndexPQ):
+        return "pq"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def set_search_params(index: faiss.Index, nprobe: int = None, ef_search: int = None):
+    """
+    Applies query-time knobs; ignored for index types that do not have them.
+    """
+    base = base_index(index)
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None and nprobe:
+        ivf.nprobe = nprobe
+    if hasattr(base, "hnsw") and ef_search:
+        base.hnsw.efSearch = ef_search
+
+
+def remove_ids(index: faiss.Index, ids: np.ndarray) -> faiss.Index:
+    """
+    Drops `ids` from an ID-mapped index. HNSW cannot delete in place,
+    so it is rebuilt from the vectors it still holds.
+    """
+    ids = np.asarray(ids, dtype="int64")
+    if not len(ids):
+        return index
+    if index_type(index) != "hnsw":
+        index.remove_ids(ids)
+        return index
+
+    all_ids = faiss.vector_to_array(index.id_map)
+    vectors = base_index(index).reconstruct_n(0, index.ntotal)
+    keep = ~np.isin(all_ids, ids)
+    return build_index(vectors[keep], all_ids[keep], "hnsw")
+
+
+def index_bytes(index: faiss.Index) -> int:
+    # size of the serialized index, i.e. what a worker holds in memory
+    return int(faiss.serialize_index(index).nbytes)
+
+
+# -------------------- Shards --------------------
+# embed.py --shards N writes indices1/shard_000 ... shard_{N-1}, each holding a
+# contiguous id range as {text,image}.index + {text,image}_meta.bin. Ids are
+# global, so the re-ranking vectors stay in one indices1/{name}_vectors.npy.
+def shard_dir(index_dir: str, shard: int) -> str:
+    return os.path.join(index_dir, f"shard_{shard:03d}")
+
+
+def shard_dirs(index_dir: str):
+    """
+    The directories to serve: the shard_NNN/ subdirectories if there are
+    any, else index_dir itself (a single, unsharded index).
+    """
+    if not os.path.isdir(index_dir):
+        return [index_dir]
+    shards = sorted(
+        os.path.join(index_dir, d) for d in os.listdir(index_dir)
+        if d.startswith("shard_") and os.path.isdir(os.path.join(index_dir, d))
+    )
+    return shards or [index_dir]
+
+
+# -------------------- Exact Re-ranking --------------------
+def vectors_path(index_dir: str, name: str) -> str:
+    return os.path.join(index_dir, f"{name}_vectors.npy")
+
+
+def read_vectors(index_dir: str, name: str):
+    """
+    Memory-maps the original float32 vectors (row i = id i), or None.
+    Only the rows of re-ranked candidates are ever paged in.
+    """
+    path = vectors_path(index_dir, name)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r")
+
+
+def search_reranked(index: faiss.Index, vectors, queries: np.ndarray, k: int, factor: int = 4, params=None):
+    """
+    Fetches factor * k candidates from a (compressed) index and re-scores
+    them with exact inner products against the original vectors.
+    Same (D, I) shapes as index.search; missing slots are -1.
+    """
+    if vectors is None or factor <= 1:
+        return index.search(queries, k, params=params)
+
+    _, cand = index.search(queries, k * factor, params=params)
+    valid = (cand >= 0) & (cand < len(vectors))
+    rows = np.where(valid, cand, 0)
+
+    # one gather for the whole batch: (n, k*factor, d)
+    flat = np.sort(np.unique(rows))
+    lookup = np.searchsorted(flat, rows)
+    scores = np.einsum("qcd,qd->qc", np.asarray(vectors[flat], dtype="float32")[lookup], queries)
+    scores[~valid] = -np.inf
+
+    order = np.argsort(-scores, axis=1)[:, :k]
+    D = np.take_along_axis(scores, order, axis=1).astype("float32")
+    I = np.take_along_axis(cand, order, axis=1)
+    I[~np.isfinite(D)] = -1
+    return D, I
+
+
+# -------------------- Filtered Search --------------------
+def search_params(index: faiss.Index, selector) -> faiss.SearchParameters:
+    # per-call parameters replace the index's own, so carry nprobe / efSearch over
+    base = base_index(index)
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if hasattr(base, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def search_subset(index: faiss.Index, vectors, queries: np.ndarray, k: int, ids: np.ndarray,
+                  factor: int = 4, exact_max: int = FILTER_EXACT_MAX):
+    """
+    Top-k among `ids` (sorted) only. Up to exact_max ids are scored exactly
+    against their vectors (the originals, else reconstructed from an
+    ID-mapped index), which costs O(len(ids)) whatever the index size.
+    Larger sets (and IVF indices without vectors) are searched by the index
+    itself through an IDSelector; IVF only scans nprobe cells, so nprobe is
+    widened per call until k is filled or every cell is scanned.
+    Same (D, I) shapes as index.search; missing slots are -1.
+    """
+    ids = np.asarray(ids, dtype="int64")
+    n = len(queries)
+    if not len(ids):
+        return np.full((n, k), -np.inf, dtype="float32"), np.full((n, k), -1, dtype="int64")
+
+    if len(ids) <= exact_max:
+        sub = None
+        if vectors is not None and ids[-1] < len(vectors):
+            sub = np.asarray(vectors[ids], dtype="float32")
+        elif hasattr(index, "id_map"):
+            sub = index.reconstruct_batch(ids)
+        if sub is not None:
+            scores = queries @ sub.T
+            top = min(k, len(ids))
+            order = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+            order = np.take_along_axis(order, np.argsort(-np.take_along_axis(scores, order, axis=1), axis=1), axis=1)
+            D = np.full((n, k), -np.inf, dtype="float32")
+            I = np.full((n, k), -1, dtype="int64")
+            D[:, :top] = np.take_along_axis(scores, order, axis=1)
+            I[:, :top] = ids[order]
+            return D, I
+
+    selector = faiss.IDSelectorBatch(ids)
+    params = search_params(index, selector)
+    D, I = search_reranked(index, vectors, queries, k, factor, params)
+    ivf = faiss.try_extract_index_ivf(base_index(index))
+    fill = min(k, len(ids))
+    while ivf is not None and params.nprobe < ivf.nlist and (I[:, :fill] < 0).any():
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=min(params.nprobe * 4, ivf.nlist))
+        D, I = search_reranked(index, vectors, queries, k, factor, params)
+    return D, I
+
+
+def all_vectors(index: faiss.Index):
+    """
+    Returns (ids, vectors) stored in an index built by build_index.
+    Exact for flat, IVF-Flat and HNSW, approximate for the LOSSY_TYPES.
+    """
+    if hasattr(index, "id_map"):
+        ids = faiss.vector_to_array(index.id_map)
+        return ids, base_index(index).reconstruct_n(0, index.ntotal)
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        return np.arange(index.ntotal), index.reconstruct_n(0, index.ntotal)
+
+    invlists = ivf.invlists
+    ids = np.concatenate([
+        faiss.rev_swig_ptr(invlists.get_ids(l), invlists.list_size(l)).copy()
+        for l in range(invlists.nlist)
+    ] or [np.zeros(0, dtype="int64")])
+    ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return ids, ivf.reconstruct_batch(ids)
+
+
+# -------------------- Recall / Latency Report --------------------
+SWEEPS = {
+    "flat": [None],
+    "ivf_flat": [1, 4, 16, 64],
+    "ivf_pq": [1, 4, 16, 64],
+    "hnsw": [16, 32, 64, 128],
+    "fp16": [None],
+    "sq8": [None],
+    "pq": [None],
+}
+
+
+def recall_report(vectors: np.ndarray, n_queries: int = 200, k: int = 10,
+                  kinds=INDEX_TYPES, nlist: int = None, seed: int = 0, rerank: int = 4):
+    """
+    Holds out `n_queries` vectors as queries, builds every index type on the
+    rest and measures recall@k against exact search, plus build time, index
+    size and per-query latency for each nprobe / efSearch setting. Lossy
+    types also get recall after re-ranking rerank * k candidates exactly.
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.permutation(len(vectors))
+    queries = np.ascontiguousarray(vectors[rows[:n_queries]])
+    database = np.ascontiguousarray(vectors[rows[n_queries:]])
+    ids = np.arange(len(database))
+
+    exact = build_index(database, ids, "flat")
+    _, truth = exact.search(queries, k)
+
+    report = []
+    for kind in kinds:
+        started = time.perf_counter()
+        index = build_index(database, ids, kind, nlist)
+        build_s = time.perf_counter() - started
+        size_mb = index_bytes(index) / 2**20
+
+        for param in SWEEPS[kind]:
+            if kind == "hnsw":
+                set_search_params(index, ef_search=param)
+            else:
+                set_search_params(index, nprobe=param)
+
+            started = time.perf_counter()
+            for q in queries:
+                index.search(q.reshape(1, -1), k)
+            latency_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+            _, found = index.search(queries, k)
+            hits = sum(len(np.intersect1d(t, f)) for t, f in zip(truth, found))
+            reranked = "-"
+            if kind in LOSSY_TYPES and rerank > 1:
+                _, found = search_reranked(index, database, queries, k, rerank)
+                hits_rr = sum(len(np.intersect1d(t, f)) for t, f in zip(truth, found))
+                reranked = round(hits_rr / (k * len(queries)), 4)
+
+            report.append({
+                "index": kind,
+                "param": "nprobe" if kind.startswith("ivf") else "efSearch" if kind == "hnsw" else "-",
+                "value": param,
+                f"recall@{k}": round(hits / (k * len(queries)), 4),
+                "rerank": reranked,
+                "ms_per_query": round(latency_ms, 4),
+                "build_s": round(build_s, 3),
+                "size_mb": round(size_mb, 2),
+                "bytes_per_vec": round(size_mb * 2**20 / max(len(database), 1), 1),
+            })
+    return report
+
+
+def print_report(report):
+    keys = list(report[0].keys())
+    print("  ".join(f"{key:>12}" for key in keys))
+    for row in report:
+        print("  ".join(f"{str(row[key]):>12}" for key in keys))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="recall@k, latency and size of FAISS index types")
+    parser.add_argument("--index-dir", default="indices1")
+    parser.add_argument("--modality", choices=("text", "image"), default="text")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--rerank", type=int, default=4,
+                        help="candidates per result re-ranked exactly for lossy types (0 = off)")
+    args = parser.parse_args()
+
+    index = faiss.read_index(os.path.join(args.index_dir, f"{args.modality}.index"))
+    originals = read_vectors(args.index_dir, args.modality)
+    if originals is not None:
+        ids, _ = all_vectors(index)
+        vectors = np.asarray(originals[np.sort(ids)], dtype="float32")
+    else:
+        if index_type(index) in LOSSY_TYPES:
+            print(f"[!] {args.modality}.index is {index_type(index)}, vectors are reconstructed approximately.")
+        _, vectors = all_vectors(index)
+    print(f"{len(vectors)} {args.modality} vectors, {args.queries} held-out queries\n")
+
+    print_report(recall_report(vectors, args.queries, args.k, nlist=args.nlist, rerank=args.rerank))
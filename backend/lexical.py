@@ -0,0 +1,243 @@
+# backend/lexical.py
+import os
+import re
+import time
+from array import array
+from collections import Counter
+import numpy as np
+
+from backend.csr_store import csr_paths, row_offsets, write_csr, read_csr
+
+# -------------------- Format --------------------
+# BM25 inverted index over the text blocks, next to text.index in every
+# index / shard directory. Compressed sparse rows (backend/csr_store.py),
+# one row per term:
+#   {name}_bm25.json          {"terms": [...], "n_docs", "avgdl", "k1", "b"}
+#   {name}_bm25_offsets.npy   int64 (n_terms + 1), postings of term t = [off[t], off[t+1])
+#   {name}_bm25_postings.npy  ("id" int64, "w" float32) per (term, block), by w
+#   {name}_bm25_ids.npy       int64, the same rows sorted by id
+#   {name}_bm25_weights.npy   float32, w for {name}_bm25_ids.npy
+# w is the BM25 term-frequency part, tf*(k1+1) / (tf + k1*(1-b+b*dl/avgdl)).
+# idf is applied at query time from the document frequencies of all shards,
+# so scores of different shards are comparable. Postings are sorted by w
+# (highest first), which lets a query read only the head of a list; the
+# id-sorted copy lets a selective filter look its ids up instead.
+K1 = 1.2
+B = 0.75
+FORMAT_VERSION = 2
+BM25_PARTS = ("offsets", "postings", "ids", "weights")
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i in is it its of on or
+she that the their there they this to was were which who will with you
+""".split())
+
+
+def tokenize(text: str) -> list:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def bm25_paths(index_dir: str, name: str) -> dict:
+    return csr_paths(index_dir, f"{name}_bm25", BM25_PARTS)
+
+
+def idf(df, n_docs):
+    # Lucene's variant, never negative
+    return np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+
+# -------------------- Build --------------------
+def build_bm25(records, index_dir: str, name: str = "text", k1: float = K1, b: float = B) -> dict:
+    """
+    Builds the inverted index for an iterable of metadata records (each with
+    "id", "title", "text") and writes it to index_dir. Returns the stats.
+    Chunked blocks are indexed once, under the id of their first window.
+    """
+    vocab = {}
+    term_ids, doc_ids, tfs, lengths = array("q"), array("q"), array("f"), array("f")
+    n_docs = total_len = 0
+    for record in records:
+        if record.get("window", 0):
+            continue
+        tokens = tokenize(f"{record.get('title', '')} {record.get('text', '')}")
+        n_docs += 1
+        total_len += len(tokens)
+        for term, tf in Counter(tokens).items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            doc_ids.append(record["id"])
+            tfs.append(tf)
+            lengths.append(len(tokens))
+
+    avgdl = total_len / n_docs if n_docs else 0.0
+    terms = np.frombuffer(term_ids, dtype="int64")
+    tf = np.frombuffer(tfs, dtype="float32")
+    dl = np.frombuffer(lengths, dtype="float32")
+    postings = np.empty(len(terms), dtype=[("id", "<i8"), ("w", "<f4")])
+    postings["id"] = np.frombuffer(doc_ids, dtype="int64")
+    postings["w"] = tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / max(avgdl, 1e-9)))
+
+    # rows by term, each row by impact; the copy by id
+    by_id = postings[np.lexsort((postings["id"], terms))]
+    postings = postings[np.lexsort((postings["id"], -postings["w"], terms))]
+    offsets = row_offsets(np.bincount(terms, minlength=len(vocab)))
+
+    stats = {"version": FORMAT_VERSION, "n_docs": n_docs, "avgdl": avgdl, "k1": k1, "b": b,
+             "n_terms": len(vocab), "n_postings": len(postings)}
+    arrays = {"offsets": offsets, "postings": postings,
+              "ids": np.ascontiguousarray(by_id["id"]), "weights": np.ascontiguousarray(by_id["w"])}
+    write_csr(bm25_paths(index_dir, name), arrays, dict(stats, terms=list(vocab)))
+    return stats
+
+
+# -------------------- Search --------------------
+class BM25Index:
+    """
+    One directory's inverted index. Postings are memory-mapped; only the
+    vocabulary is held in memory.
+    """
+
+    def __init__(self, index_dir: str, name: str = "text"):
+        meta, arrays = read_csr(bm25_paths(index_dir, name))
+        self.n_docs = meta["n_docs"]
+        self.vocab = {term: row for row, term in enumerate(meta["terms"])}
+        self.offsets = arrays["offsets"]
+        self.postings = arrays["postings"]
+        # id-sorted copy, None in indices built before FORMAT_VERSION 2
+        self.by_id = (arrays["ids"], arrays["weights"]) if arrays["ids"] is not None else None
+
+    def df(self, term: str) -> int:
+        row = self.vocab.get(term)
+        return 0 if row is None else int(self.offsets[row + 1] - self.offsets[row])
+
+    def search(self, weights: dict, k: int, max_postings: int, allowed: np.ndarray = None):
+        """
+        weights: term -> idf. Sums idf * w over the first max_postings
+        entries of each term's list. Returns (scores, ids), best first.
+        With `allowed` (sorted ids) every allowed id in a list is scored, so a
+        filter cannot push every match past the cut-off: a short `allowed` is
+        looked up in the id-sorted copy of the list, a long one masks the list.
+        """
+        ids, scores = [], []
+        for term, weight in weights.items():
+            row = self.vocab.get(term)
+            if row is None:
+                continue
+            start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+            if allowed is None:
+                hits_id, hits_w = self._head(start, min(end, start + max_postings))
+            elif self.by_id is not None and len(allowed) * np.log2(end - start + 1) < end - start:
+                hits_id, hits_w = self._lookup(start, end, allowed)
+            else:
+                hits_id, hits_w = self._mask(start, end, allowed)
+            ids.append(hits_id)
+            scores.append(hits_w * np.float32(weight))
+        if not ids:
+            return np.zeros(0, dtype="float32"), np.zeros(0, dtype="int64")
+
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        if not len(ids):
+            return scores, ids
+        if len(weights) > 1:
+            ids, inverse = np.unique(ids, return_inverse=True)
+            scores = np.bincount(inverse, weights=scores).astype("float32")
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return scores[top], ids[top]
+
+    def _head(self, start: int, end: int):
+        hits = self.postings[start:end]
+        return hits["id"], hits["w"]
+
+    def _mask(self, start: int, end: int, allowed: np.ndarray):
+        # reads the whole list
+        hits = self.postings[start:end]
+        if not len(allowed):
+            return hits["id"][:0], hits["w"][:0]
+        pos = np.minimum(np.searchsorted(allowed, hits["id"]), len(allowed) - 1)
+        keep = allowed[pos] == hits["id"]
+        return hits["id"][keep], hits["w"][keep]
+
+    def _lookup(self, start: int, end: int, allowed: np.ndarray):
+        # binary searches the id-sorted list, touching about log2(len) pages per allowed id
+        ids, w = self.by_id[0][start:end], self.by_id[1][start:end]
+        pos = np.minimum(np.searchsorted(ids, allowed), len(ids) - 1)
+        pos = pos[ids[pos] == allowed]
+        return np.asarray(ids[pos]), np.asarray(w[pos])
+
+
+def open_bm25(index_dir: str, name: str = "text"):
+    if not os.path.exists(bm25_paths(index_dir, name)["meta"]):
+        return None
+    return BM25Index(index_dir, name)
+
+
+def search_bm25(indices: list, query: str, k: int, max_postings: int = 10000, allowed: list = None):
+    """
+    Top-k over every shard's index with idf from the combined document
+    frequencies. allowed: sorted ids per shard to restrict to, or None.
+    Returns (scores, ids, shard of each hit), best first.
+    """
+    terms = set(tokenize(query))
+    n_docs = sum(index.n_docs for index in indices)
+    weights = {t: float(idf(sum(index.df(t) for index in indices), n_docs)) for t in terms}
+
+    parts = [
+        index.search(weights, k, max_postings, None if allowed is None else allowed[s])
+        for s, index in enumerate(indices)
+    ]
+    D = np.concatenate([d for d, _ in parts]) if parts else np.zeros(0, dtype="float32")
+    I = np.concatenate([i for _, i in parts]) if parts else np.zeros(0, dtype="int64")
+    S = np.repeat(np.arange(len(parts)), [len(i) for _, i in parts])
+    order = np.argsort(-D, kind="stable")[:k]
+    return D[order], I[order], S[order]
+
+
+# -------------------- CLI --------------------
+if __name__ == "__main__":
+    # (Re)builds the BM25 index from existing metadata, without re-embedding,
+    # and times queries made of words sampled from the corpus.
+    from backend.csr_store import index_dir_parser, shard_records
+    from backend.index_factory import shard_dirs
+
+    parser = index_dir_parser("build / time the BM25 index of the text blocks")
+    parser.add_argument("--no-build", action="store_true", help="only time queries on the existing index")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=50)
+    parser.add_argument("--max-postings", type=int, default=10000)
+    parser.add_argument("--allowed", type=float, default=0.0,
+                        help="also time queries restricted to this fraction of the ids (e.g. 0.001)")
+    args = parser.parse_args()
+
+    dirs = shard_dirs(args.index_dir)
+    if not args.no_build:
+        for d, records in shard_records(args.index_dir, "text"):
+            started = time.perf_counter()
+            stats = build_bm25(records, d, "text")
+            print(f"{d}: {stats['n_docs']} blocks, {stats['n_terms']} terms, "
+                  f"{stats['n_postings']} postings in {time.perf_counter() - started:.1f}s")
+
+    indices = [open_bm25(d, "text") for d in dirs]
+    # terms drawn by document frequency, so common (long-list) terms show up as often as in text
+    first = indices[0]
+    terms = list(first.vocab)
+    rng = np.random.default_rng(0)
+    allowed = None
+    if args.allowed:
+        indexed = [np.unique(index.postings["id"]) for index in indices]
+        allowed = [np.sort(rng.choice(ids, max(int(len(ids) * args.allowed), 1), replace=False)) for ids in indexed]
+    times, filtered = [], []
+    for _ in range(args.queries):
+        picks = rng.integers(0, len(first.postings), rng.integers(1, 5))
+        query = " ".join(terms[r] for r in np.searchsorted(first.offsets, picks, side="right") - 1)
+        started = time.perf_counter()
+        search_bm25(indices, query, args.k, args.max_postings)
+        times.append((time.perf_counter() - started) * 1000)
+        if allowed is not None:
+            started = time.perf_counter()
+            search_bm25(indices, query, args.k, args.max_postings, allowed)
+            filtered.append((time.perf_counter() - started) * 1000)
+    print(f"{args.queries} queries: p50 {np.percentile(times, 50):.2f} ms, p95 {np.percentile(times, 95):.2f} ms")
+    if filtered:
+        print(f"  filtered to {args.allowed:.2%} of ids: "
+              f"p50 {np.percentile(filtered, 50):.2f} ms, p95 {np.percentile(filtered, 95):.2f} ms")
@@ -1,15 +1,72 @@
 # backend/main.py
-from fastapi import FastAPI, UploadFile, File, Query
+from fastapi import FastAPI, UploadFile, File, Form, Query, Request, Response, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
-from typing import List
+from typing import List, Literal, Optional
 from PIL import Image
+import numpy as np
+import asyncio
+import json
 import io
+import os
 
-from backend.search import unified_text_search, unified_image_search, refine_search
+from backend import search as engine
+from backend.batcher import MicroBatcher
+from backend.config import (
+    INDEX_DIR, WARMUP, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, INDEX_CHECK_INTERVAL,
+    INFERENCE_WORKERS, MAX_INFLIGHT, BATCH_SEARCH_MAX_QUERIES, BATCH_SEARCH_STREAM_OVER,
+)
+from backend.executor import BoundedExecutor, Overloaded
+from backend.search import unified_search_from_embedding, refine_from_embeddings
+from backend.timing import RequestTimer, stage_stats
+
+# -------------------- Execution --------------------
+# All blocking work runs on this pool, never on the event loop
+inference = BoundedExecutor(INFERENCE_WORKERS, MAX_INFLIGHT)
+
+# Concurrent queries are coalesced into one CLIP forward pass per modality
+text_encoder = MicroBatcher(engine.embed_texts, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, inference.pool)
+image_encoder = MicroBatcher(engine.embed_images, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, inference.pool)
+
+# -------------------- Startup --------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load CLIP / FAISS in the background so the worker starts serving
+    # (and answering /ready) immediately instead of blocking on import.
+    loop = asyncio.get_running_loop()
+    app.state.loading = loop.run_in_executor(None, engine.load, WARMUP)
+    app.state.loading.add_done_callback(_report_load_failure)
+    watcher = asyncio.create_task(_watch_index())
+    yield
+    watcher.cancel()
+    inference.shutdown()
 
-app = FastAPI(title="Multimodal Search API")
+def _report_load_failure(future):
+    if future.exception() is not None:
+        print(f"[!] Failed to load search resources: {future.exception()}")
+
+async def _watch_index():
+    # picks up embed.py runs (incl. --incremental) without a restart
+    while True:
+        await asyncio.sleep(INDEX_CHECK_INTERVAL)
+        try:
+            await run_in_threadpool(engine.reload_if_changed)
+        except Exception as e:
+            print(f"[!] Index reload failed: {e}")
+
+app = FastAPI(title="Multimodal Search API", lifespan=lifespan)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server overloaded, retry shortly"},
+        headers={"Retry-After": "1"},
+    )
 
 # -------------------- CORS --------------------
 app.add_middleware(
@@ -20,31 +77,221 @@ app.add_middleware(
 )
 
 # -------------------- Static Images --------------------
+# Every source in the index under /images/<source>/<filename>, from the
+# source -> image dir map embed.py writes (indices1/sources.json). Sources
+# added by a later build are served after a restart.
+def image_dirs() -> dict:
+    path = os.path.join(INDEX_DIR, "sources.json")
+    if not os.path.exists(path):
+        return {"wikipedia": "wikipedia_scrape/images"}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+for source, image_dir in image_dirs().items():
+    app.mount(f"/images/{source}", StaticFiles(directory=image_dir, check_dir=False), name=f"images_{source}")
+
+# the older path, kept for clients that still build it
 app.mount(
     "/wikipedia_scrape/images",
-    StaticFiles(directory="wikipedia_scrape/images"),
+    StaticFiles(directory="wikipedia_scrape/images", check_dir=False),
     name="images"
 )
 
 # -------------------- Endpoints --------------------
+@app.get("/ready")
+def ready():
+    if not engine.is_ready():
+        return JSONResponse(status_code=503, content={"ready": False})
+    return {"ready": True, "load_timings": engine.load_timings}
+
+@app.get("/cache/stats")
+def cache_stats():
+    return engine.cache_stats()
+
+@app.get("/stats")
+def stats():
+    return {"executor": inference.stats(), "stages": stage_stats.summary()}
+
+async def encode_query(query: str) -> np.ndarray:
+    # normalized text; repeated queries / refinements skip CLIP
+    emb = engine.query_cache.get(query)
+    if emb is None:
+        emb = await text_encoder.submit(query)
+        engine.query_cache.put(query, emb)
+    return emb
+
 @app.get("/search")
-def search(q: str = Query(..., min_length=1), k: int = 5):
-    return unified_text_search(q, k)
+async def search(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    k: int = 5,
+    mode: Literal["vector", "lexical", "hybrid"] = "vector",
+    page_id: Optional[str] = None,
+    section: Optional[str] = None,
+    source: Optional[str] = None,
+):
+    timer = RequestTimer()
+    # pushed into the index search, so filtered results still fill k
+    filters = {f: v for f, v in (("page_id", page_id), ("section", section), ("source", source)) if v is not None}
+    with inference.admit():
+        key = engine.result_key(q, k, mode, filters)
+        result = engine.cached_result(key)
+        if result is not None:
+            response.headers["Server-Timing"] = "cache;desc=hit"
+            return result
+
+        with timer.stage("encode"):
+            emb = await encode_query(engine.normalize_query(q))
+
+        with timer.stage("search"):
+            try:
+                result = await inference.run(unified_search_from_embedding, emb, k, q, mode, filters)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        engine.result_cache.put(key, result)
+
+    response.headers["Server-Timing"] = timer.header()
+    return result
+
+def decode_image(data: bytes) -> Image.Image:
+    try:
+        return Image.open(io.BytesIO(data)).convert("RGB")
+    except Exception:
+        raise HTTPException(status_code=400, detail="Could not decode image")
 
 @app.post("/search/image/unified")
-async def image_search(file: UploadFile = File(...), k: int = 5):
-    image = Image.open(io.BytesIO(await file.read())).convert("RGB")
-    return unified_image_search(image, k)
+async def image_search(response: Response, file: UploadFile = File(...), k: int = 5):
+    timer = RequestTimer()
+    with inference.admit():
+        with timer.stage("upload"):
+            data = await file.read()
+        with timer.stage("decode"):
+            image = await inference.run(decode_image, data)
+        with timer.stage("encode"):
+            emb = await image_encoder.submit(image)
+        with timer.stage("search"):
+            result = await inference.run(unified_search_from_embedding, emb, k)
+
+    response.headers["Server-Timing"] = timer.header()
+    return result
 
 class RefineRequest(BaseModel):
-    base_embedding: List[float]
     refinement: str
+    session_id: Optional[str] = None
+    # older clients send the vector back instead of a session_id
+    base_embedding: Optional[List[float]] = None
     alpha: float = 0.6
+    k: int = 5
 
 @app.post("/search/refine")
-def refine(req: RefineRequest):
-    return refine_search(
-        req.base_embedding,
-        req.refinement,
-        req.alpha
-    )
+async def refine(req: RefineRequest, response: Response):
+    """
+    Blends the session's query vector with the refinement text. The
+    response carries a new session_id, so refinements can be chained.
+    """
+    timer = RequestTimer()
+    with inference.admit():
+        if req.session_id is not None:
+            key = engine.refine_key(req.session_id, req.refinement, req.alpha, req.k)
+            result = engine.cached_result(key)
+            if result is not None:
+                response.headers["Server-Timing"] = "cache;desc=hit"
+                return result
+            base = engine.session_vector(req.session_id)
+            if base is None:
+                raise HTTPException(status_code=404, detail="Unknown or expired session_id, search again")
+        elif req.base_embedding is not None:
+            key, base = None, np.asarray(req.base_embedding, dtype="float32")
+        else:
+            raise HTTPException(status_code=400, detail="session_id or base_embedding is required")
+
+        with timer.stage("encode"):
+            emb = await encode_query(engine.normalize_query(req.refinement))
+        with timer.stage("search"):
+            result = await inference.run(refine_from_embeddings, base, emb, req.alpha, req.k)
+        if key is not None:
+            engine.result_cache.put(key, result)
+
+    response.headers["Server-Timing"] = timer.header()
+    return result
+
+# -------------------- Batch Search --------------------
+def _decode_or_none(data: bytes) -> Optional[Image.Image]:
+    try:
+        return Image.open(io.BytesIO(data)).convert("RGB")
+    except Exception:
+        return None
+
+def _batch_rows(embed_fn, items, k):
+    """
+    Encodes one chunk of queries in a single CLIP pass and searches
+    both indices with one multi-query call each.
+    """
+    embs = embed_fn(items)
+    return engine.search_from_embeddings(embs, k)
+
+async def _batch_results(queries, images, k):
+    """
+    Yields one result dict per query / upload. "index" numbers the rows of
+    the whole request: the queries first, then the files.
+    Every BATCH_MAX_SIZE chunk takes its own admission slot, so a large
+    batch counts as one request per chunk in flight and queues behind
+    other requests between chunks; no slot is held while a row is yielded.
+    """
+    for start in range(0, len(queries), BATCH_MAX_SIZE):
+        chunk = queries[start:start + BATCH_MAX_SIZE]
+        async with inference.admit_waiting():
+            rows = await inference.run(_batch_rows, engine.embed_texts, chunk, k)
+        for offset, (q, (text, imgs)) in enumerate(zip(chunk, rows)):
+            yield {"index": start + offset, "query": q, "text_results": text, "image_results": imgs}
+
+    for start in range(0, len(images), BATCH_MAX_SIZE):
+        chunk = images[start:start + BATCH_MAX_SIZE]
+        rows = {}
+        async with inference.admit_waiting():
+            decoded = [(name, await inference.run(_decode_or_none, data)) for name, data in chunk]
+            ok = [(i, name, img) for i, (name, img) in enumerate(decoded) if img is not None]
+            if ok:
+                results = await inference.run(_batch_rows, engine.embed_images, [img for _, _, img in ok], k)
+                rows = {i: row for (i, _, _), row in zip(ok, results)}
+        for i, (name, _) in enumerate(decoded):
+            index = len(queries) + start + i
+            if i not in rows:
+                yield {"index": index, "file": name, "error": "Could not decode image"}
+                continue
+            text, imgs = rows[i]
+            yield {"index": index, "file": name, "text_results": text, "image_results": imgs}
+
+@app.post("/search/batch")
+async def batch_search(
+    queries: List[str] = Form(default=[]),
+    files: List[UploadFile] = File(default=[]),
+    k: int = Form(5),
+    stream: Optional[bool] = Form(None),
+):
+    """
+    Many text queries and/or images in one call. Results come back as
+    {"results": [...]} or, for large batches (or stream=true), as NDJSON
+    with one line per query written as soon as its chunk is searched.
+    """
+    total = len(queries) + len(files)
+    if total == 0:
+        raise HTTPException(status_code=400, detail="No queries or files given")
+    if total > BATCH_SEARCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_SEARCH_MAX_QUERIES} queries per batch")
+
+    images = [(f.filename, await f.read()) for f in files]
+    if stream is None:
+        stream = total > BATCH_SEARCH_STREAM_OVER
+
+    # An overloaded server answers 503 before anything is streamed;
+    # once let in, the chunks take admission one by one (_batch_results)
+    inference.check_capacity()
+    if not stream:
+        return {"results": [row async for row in _batch_results(queries, images, k)]}
+
+    async def ndjson():
+        async for row in _batch_results(queries, images, k):
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
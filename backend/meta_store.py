@@ -0,0 +1,160 @@
+# backend/meta_store.py
+import os
+import json
+import mmap
+from array import array
+import numpy as np
+
+# -------------------- Format --------------------
+# {name}_meta.bin
+#   header   MAGIC (8 bytes) | n_slots (u64) | offsets_pos (u64) | base_id (u64)
+#   blob     UTF-8 JSON records, back to back, in id order
+#   offsets  (n_slots + 1) little-endian u64, record i = blob[off[i]:off[i+1]]
+# Slot i holds the record whose FAISS id is base_id + i; deleted / missing ids
+# are empty. base_id is the first id of the store, so a shard holding ids
+# [b, e) has e - b slots, not e. MMETA001 files (no base_id) start at id 0.
+# The file is memory-mapped read-only, so every worker shares the same
+# page-cache copy and only the records that are actually looked up get decoded.
+MAGIC = b"MMETA002"
+HEADER_SIZE = 32
+LEGACY_HEADERS = {b"MMETA001": 24}
+
+
+class MetaStoreWriter:
+    """
+    Streams records (in increasing id order) into a new store.
+    The file only replaces `path` on close(), so readers never see a partial store.
+    base_id defaults to the id of the first record.
+    """
+
+    def __init__(self, path: str, base_id: int = None):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.base_id = base_id
+        self.f = open(self.tmp_path, "wb")
+        self.f.write(b"\0" * HEADER_SIZE)
+        self.offsets = array("Q", [0])   # 8 bytes per record, not a Python int each
+
+    def add(self, record_id: int, record: dict):
+        record_id = int(record_id)
+        if self.base_id is None:
+            self.base_id = record_id
+        slot = record_id - self.base_id
+        if slot < len(self.offsets) - 1:
+            raise ValueError(f"ids must be increasing and >= {self.base_id}, "
+                             f"got {record_id} after {self.base_id + len(self.offsets) - 2}")
+        # empty slots for ids that do not exist (deleted / failed blocks)
+        self.offsets.extend([self.offsets[-1]] * (slot - (len(self.offsets) - 1)))
+
+        data = json.dumps(record, ensure_ascii=False).encode("utf-8")
+        self.f.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+    def close(self):
+        offsets_pos = self.f.tell()
+        self.f.write(np.frombuffer(self.offsets, dtype="u8").astype("<u8").tobytes())
+        self.f.seek(0)
+        self.f.write(MAGIC)
+        self.f.write(np.array([len(self.offsets) - 1, offsets_pos, self.base_id or 0], dtype="<u8").tobytes())
+        self.f.close()
+        os.replace(self.tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.f.close()
+            os.remove(self.tmp_path)
+
+
+def write_meta_store(path: str, records):
+    """
+    Writes an iterable of records that carry an "id", in increasing id order.
+    """
+    with MetaStoreWriter(path) as writer:
+        for record in records:
+            writer.add(record["id"], record)
+
+
+class MetaStore:
+    """
+    Read-only, memory-mapped id -> record lookup in O(1).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic = self._mm[:8]
+        if magic == MAGIC:
+            self.header_size = HEADER_SIZE
+            n_slots, offsets_pos, base_id = np.frombuffer(self._mm, dtype="<u8", count=3, offset=8)
+        elif magic in LEGACY_HEADERS:
+            self.header_size = LEGACY_HEADERS[magic]
+            (n_slots, offsets_pos), base_id = np.frombuffer(self._mm, dtype="<u8", count=2, offset=8), 0
+        else:
+            raise ValueError(f"{path} is not a metadata store")
+        self.n_slots = int(n_slots)
+        self.base_id = int(base_id)
+        self.offsets = np.frombuffer(self._mm, dtype="<u8", count=self.n_slots + 1, offset=int(offsets_pos))
+
+    def get(self, record_id, default=None):
+        i = int(record_id) - self.base_id
+        if i < 0 or i >= self.n_slots:
+            return default
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        if start == end:
+            return default
+        return json.loads(self._mm[self.header_size + start:self.header_size + end])
+
+    def __getitem__(self, record_id):
+        record = self.get(record_id)
+        if record is None:
+            raise KeyError(record_id)
+        return record
+
+    def __contains__(self, record_id):
+        i = int(record_id) - self.base_id
+        return 0 <= i < self.n_slots and self.offsets[i] != self.offsets[i + 1]
+
+    def ids(self) -> np.ndarray:
+        return np.flatnonzero(self.offsets[1:] != self.offsets[:-1]) + self.base_id
+
+    def __len__(self):
+        return len(self.ids())
+
+    def __iter__(self):
+        # records in id order
+        for i in self.ids():
+            yield self.get(i)
+
+    def close(self):
+        self.offsets = None
+        self._mm.close()
+
+
+# -------------------- Loading --------------------
+def store_path(index_dir: str, name: str) -> str:
+    return os.path.join(index_dir, f"{name}_meta.bin")
+
+
+def open_meta(index_dir: str, name: str):
+    """
+    Returns the memory-mapped store for `name` ("text" / "image"), falling back
+    to a dict built from an older {name}_meta.json. Both support .get(id).
+    """
+    path = store_path(index_dir, name)
+    if os.path.exists(path):
+        return MetaStore(path)
+
+    with open(os.path.join(index_dir, f"{name}_meta.json"), "r", encoding="utf-8") as f:
+        records = json.load(f)
+    # older embed.py runs wrote positional lists without an explicit id:
+    # the position is the id, and is added so every record carries one
+    if records and "id" in records[0]:
+        return {r["id"]: r for r in records}
+    return {i: dict(r, id=i) for i, r in enumerate(records)}
@@ -1,108 +1,547 @@
 # backend/search.py
 import os
-import json
-import faiss
-import torch
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from PIL import Image
-from transformers import CLIPProcessor, CLIPModel
 
-# -------------------- Paths --------------------
-INDEX_DIR = "indices1"
-device = "cuda" if torch.cuda.is_available() else "cpu"
+from backend.cache import LRUCache
+from backend.config import (
+    INDEX_DIR, FAISS_NPROBE, FAISS_EF_SEARCH, FAISS_MMAP, MODEL_NAME,
+    ENCODER_BACKEND, ENCODER_THREADS, ONNX_DIR, RERANK_FACTOR, SEARCH_THREADS,
+    BM25_MAX_POSTINGS, HYBRID_DEPTH, RRF_K, TEXT_OVERFETCH, TEXT_POOLING, TEXT_GROUP, FILTER_EXACT_MAX,
+    FUSION_OVERFETCH, MMR_LAMBDA,
+    QUERY_CACHE_SIZE, QUERY_CACHE_TTL, RESULT_CACHE_SIZE, RESULT_CACHE_TTL,
+    SESSION_CACHE_SIZE, SESSION_TTL,
+)
+from backend.encoders import load_encoder
+from backend.filters import FILTER_FIELDS, open_filters
+from backend.index_factory import (
+    read_index, read_vectors, search_reranked, search_subset, set_search_params, shard_dirs,
+)
+from backend.lexical import open_bm25, search_bm25
+from backend.meta_store import open_meta
 
-# -------------------- Load CLIP --------------------
-clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32").to(device)
-clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32", use_fast=False)
+# -------------------- Lazy Resources --------------------
+# Nothing heavy happens at import time. load() fills these in, either from
+# the FastAPI lifespan hook or on first use.
+encoder = None
+resources = None              # SearchResources of the current index version
+_shard_pool = None            # fans a query batch out over the shards
 
-# -------------------- Load FAISS --------------------
-text_index = faiss.read_index(os.path.join(INDEX_DIR, "text.index"))
-image_index = faiss.read_index(os.path.join(INDEX_DIR, "image.index"))
+load_timings = {}
+index_version = None          # changes whenever embed.py rewrites indices1/
+_loaded = threading.Event()   # resources in memory
+_ready = threading.Event()    # loaded and warmed up
+_load_lock = threading.Lock()
 
-with open(os.path.join(INDEX_DIR, "text_meta.json"), "r", encoding="utf-8") as f:
-    text_meta = json.load(f)
+class SearchResources:
+    """
+    Everything read from one version of indices1/: one entry per shard
+    (indices1/shard_NNN/), or a single one for indices1/ itself.
+    A search takes `resources` once and only uses that object; a reload
+    builds a new one and publishes it in one assignment, so a query never
+    pairs a new index with old metadata.
+    """
 
-with open(os.path.join(INDEX_DIR, "image_meta.json"), "r", encoding="utf-8") as f:
-    image_meta = json.load(f)
+    def __init__(self, text_indices, image_indices, text_metas, image_metas, text_lexical,
+                 text_filters, image_filters, text_vectors=None, image_vectors=None, version=None):
+        self.text_indices = text_indices
+        self.image_indices = image_indices
+        self.text_metas = text_metas
+        self.image_metas = image_metas
+        self.text_lexical = text_lexical      # BM25 index per shard, empty if embed.py has not built one
+        self.text_filters = text_filters      # page_id / section / source postings per shard, empty if missing
+        self.image_filters = image_filters
+        self.text_vectors = text_vectors      # original vectors for exact re-ranking, if embed.py kept them
+        self.image_vectors = image_vectors
+        self.version = version
+
+def _load_model():
+    global encoder
+    # transformers / onnxruntime are imported here, only when needed
+    encoder = load_encoder(ENCODER_BACKEND, MODEL_NAME, ENCODER_THREADS, ONNX_DIR)
+
+def _load_indices() -> dict:
+    global _shard_pool
+    dirs = shard_dirs(INDEX_DIR)
+    texts = [read_index(os.path.join(d, "text.index"), mmap=FAISS_MMAP) for d in dirs]
+    images = [read_index(os.path.join(d, "image.index"), mmap=FAISS_MMAP) for d in dirs]
+    for index in texts + images:
+        set_search_params(index, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH)
+
+    lexical = [open_bm25(d, "text") for d in dirs]
+    if None in lexical:
+        print("[!] No BM25 index (text_bm25.json), mode=hybrid / lexical fall back to vector search. "
+              "Build it with: python -m backend.lexical")
+        lexical = []
+
+    filters = {m: [open_filters(d, m) for d in dirs] for m in ("text", "image")}
+    if any(None in f for f in filters.values()):
+        print("[!] No filter postings ({text,image}_filters.json), filtered search is disabled. "
+              "Build them with: python -m backend.filters")
+        filters = {"text": [], "image": []}
+
+    rerank = RERANK_FACTOR > 1
+    if len(dirs) > 1 and _shard_pool is None:
+        _shard_pool = ThreadPoolExecutor(SEARCH_THREADS or len(dirs), thread_name_prefix="shard")
+    return {
+        "text_indices": texts,
+        "image_indices": images,
+        "text_lexical": lexical,
+        "text_filters": filters["text"],
+        "image_filters": filters["image"],
+        "text_vectors": read_vectors(INDEX_DIR, "text") if rerank else None,
+        "image_vectors": read_vectors(INDEX_DIR, "image") if rerank else None,
+    }
+
+def _load_meta() -> dict:
+    # memory-mapped; records are decoded only when a search returns them
+    dirs = shard_dirs(INDEX_DIR)
+    return {
+        "text_metas": [open_meta(d, "text") for d in dirs],
+        "image_metas": [open_meta(d, "image") for d in dirs],
+    }
+
+def _timed(name, fn):
+    started = time.perf_counter()
+    result = fn()
+    load_timings[name] = round(time.perf_counter() - started, 3)
+    return result
+
+def warm_up():
+    # first forward pass pays for kernel selection / allocator growth
+    embed_text("warm up")
+    embed_image(Image.new("RGB", (224, 224)))
+
+def load(warmup: bool = False) -> dict:
+    """
+    Loads CLIP, both FAISS indices and metadata. The three loads run in
+    parallel threads so disk reads do not wait behind model initialisation.
+    Safe to call from several threads; only the first call does the work.
+    """
+    with _load_lock:
+        if _loaded.is_set():
+            return load_timings
+
+        global resources, index_version
+        started = time.perf_counter()
+        # taken before reading, so a write during loading triggers a reload
+        version = artifact_version()
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            model = pool.submit(_timed, "model", _load_model)
+            indices = pool.submit(_timed, "indices", _load_indices)
+            meta = pool.submit(_timed, "metadata", _load_meta)
+            model.result()
+            resources = SearchResources(**indices.result(), **meta.result(), version=version)
+            index_version = version
+
+        _loaded.set()
+        if warmup:
+            _timed("warmup", warm_up)
+        load_timings["total"] = round(time.perf_counter() - started, 3)
+        _ready.set()
+        print(f"Search resources loaded: {load_timings}")
+        return load_timings
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+def ensure_loaded():
+    if not _loaded.is_set():
+        load()
+
+# -------------------- Index Versioning --------------------
+INDEX_ARTIFACTS = (
+    "text.index", "image.index",
+    "text_meta.bin", "image_meta.bin",
+    "text_meta.json", "image_meta.json",
+    "text_vectors.npy", "image_vectors.npy",
+    "text_bm25.json", "text_filters.json", "image_filters.json",
+)
+
+def artifact_version() -> str:
+    parts = []
+    for d in sorted(set(shard_dirs(INDEX_DIR)) | {INDEX_DIR}):
+        for name in INDEX_ARTIFACTS:
+            path = os.path.join(d, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            parts.append(f"{path}:{st.st_mtime_ns}:{st.st_size}")
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+
+def reload_if_changed() -> bool:
+    """
+    Swaps in new indices / metadata after embed.py replaced them, all at
+    once. Returns True if a reload happened.
+    """
+    global resources, index_version
+    if not _loaded.is_set():
+        return False
+
+    version = artifact_version()
+    if version == index_version:
+        return False
+
+    with _load_lock:
+        if version == index_version:
+            return False
+        # everything is read before anything is published
+        fresh = SearchResources(**_load_indices(), **_load_meta(), version=version)
+        resources, index_version = fresh, version
+        # entries are keyed by version, so this only frees memory early
+        result_cache.clear()
+    print(f"Reloaded search indices, version {version}")
+    return True
+
+# -------------------- Caches --------------------
+query_cache = LRUCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+result_cache = LRUCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+
+def normalize_query(query: str) -> str:
+    # CLIP's tokenizer lowercases and collapses whitespace anyway
+    return " ".join(query.lower().split())
+
+def result_key(query: str, k: int, mode: str = "vector", filters: dict = None) -> tuple:
+    return (normalize_query(query), k, mode, tuple(sorted((filters or {}).items())), index_version)
+
+def cached_embed_text(query: str) -> np.ndarray:
+    key = normalize_query(query)
+    emb = query_cache.get(key)
+    if emb is None:
+        emb = embed_text(key)
+        query_cache.put(key, emb)
+    return emb
+
+def cached_result(key):
+    # a cached response is only usable while the session it names is open
+    result = result_cache.get(key)
+    if result is not None and sessions.get(result["session_id"]) is None:
+        return None
+    return result
+
+def cache_stats() -> dict:
+    return {
+        "index_version": index_version,
+        "query_embeddings": query_cache.stats(),
+        "results": result_cache.stats(),
+        "sessions": sessions.stats(),
+    }
+
+# -------------------- Refinement Sessions --------------------
+# Responses carry an opaque session_id instead of the 512-float query vector,
+# and /search/refine looks the vector up here. Ids are derived from the
+# vector, so repeating a query or a refinement step reopens the same session.
+# Sessions live in this process: with several uvicorn workers, refinements
+# need sticky routing (or get 404 and search again).
+sessions = LRUCache(SESSION_CACHE_SIZE, SESSION_TTL)
+
+def open_session(emb: np.ndarray) -> str:
+    emb = np.ascontiguousarray(emb, dtype="float32")
+    session_id = hashlib.blake2b(emb.tobytes(), digest_size=12).hexdigest()
+    sessions.put(session_id, emb)
+    return session_id
+
+def session_vector(session_id: str):
+    return sessions.get(session_id)
 
 # -------------------- Utility Functions --------------------
 def normalize(v: np.ndarray) -> np.ndarray:
     return v / np.linalg.norm(v)
 
+def embed_texts(texts: list) -> np.ndarray:
+    """
+    One CLIP forward pass for a batch of queries, returns (len(texts), 512).
+    """
+    ensure_loaded()
+    return encoder.embed_texts(texts)
+
+def embed_images(images: list) -> np.ndarray:
+    ensure_loaded()
+    return encoder.embed_images(images)
+
 def embed_text(text: str) -> np.ndarray:
-    inputs = clip_processor(text=[text], return_tensors="pt", padding=True, truncation=True).to(device)
-    with torch.no_grad():
-        emb = clip_model.get_text_features(**inputs)
-        if hasattr(emb, "pooler_output"):  # in case HF returns BaseModelOutputWithPooling
-            emb = emb.pooler_output
-    emb = torch.tensor(emb) if not isinstance(emb, torch.Tensor) else emb
-    return normalize(emb.cpu().numpy().reshape(-1)).astype("float32")
+    return embed_texts([text])[0]
 
 def embed_image(image: Image.Image) -> np.ndarray:
-    inputs = clip_processor(images=image, return_tensors="pt").to(device)
-    with torch.no_grad():
-        emb = clip_model.get_image_features(**inputs)
-        if hasattr(emb, "pooler_output"):
-            emb = emb.pooler_output
-    emb = torch.tensor(emb) if not isinstance(emb, torch.Tensor) else emb
-    return normalize(emb.cpu().numpy().reshape(-1)).astype("float32")
+    return embed_images([image])[0]
 
 # -------------------- FAISS Search --------------------
-def search_from_embedding(emb: np.ndarray, k: int = 5):
-    emb = emb.reshape(1, -1).astype("float32")
-    # Text search
-    D_t, I_t = text_index.search(emb, k)
-    text_results = [
-        {
-            "title": text_meta[i]["title"],
-            "text": text_meta[i]["text"],
-            "url": text_meta[i].get("url"),
+def _search_shards(indices, vectors, embs, k, allowed=None):
+    """
+    Every shard returns its own top-k (searched in parallel; FAISS releases
+    the GIL), and the union is cut back to k per query. Each shard's list is
+    exact for its ids, so the merged list is the exact global top-k.
+    allowed: per shard, the only ids that may be returned (see allowed_ids).
+    Returns (scores, ids, shard of each hit), each (n, k).
+    """
+    def search_shard(s):
+        if allowed is None:
+            return search_reranked(indices[s], vectors, embs, k, RERANK_FACTOR)
+        return search_subset(indices[s], vectors, embs, k, allowed[s], RERANK_FACTOR, FILTER_EXACT_MAX)
+
+    if len(indices) == 1:
+        D, I = search_shard(0)
+        return D, I, np.zeros_like(I)
+
+    parts = list(_shard_pool.map(search_shard, range(len(indices))))
+    D = np.concatenate([d for d, _ in parts], axis=1)
+    I = np.concatenate([i for _, i in parts], axis=1)
+    S = np.repeat(np.arange(len(parts)), [i.shape[1] for _, i in parts])
+    D = np.where(I >= 0, D, -np.inf)
+
+    order = np.argsort(-D, axis=1, kind="stable")[:, :k]
+    return (
+        np.take_along_axis(D, order, axis=1),
+        np.take_along_axis(I, order, axis=1),
+        S[order],
+    )
+
+def _text_hits(metas, ids, shards, scores):
+    """
+    (block key, page key, result) per hit. Windows of one block share the
+    block's full text, so (page, text) identifies the block.
+    """
+    hits = []
+    for i, s, d in zip(ids, shards, scores):
+        if i < 0:
+            continue
+        meta = metas[s].get(i)
+        if meta is None:
+            continue
+        page = meta.get("url") or f"{meta.get('source')}:{meta.get('page_id')}"
+        hits.append(((page, meta["text"]), page, {
+            "title": meta["title"],
+            "text": meta["text"],
+            "url": meta.get("url"),
             "score": float(d)
-        }
-        for i, d in zip(I_t[0], D_t[0])
-    ]
+        }))
+    return hits
+
+def pool_hits(hits, k, pooling=TEXT_POOLING, group=TEXT_GROUP):
+    """
+    Collapses window hits (best first) into one result per block or page.
+    Returns [(key, result)] of the top k, best first.
+    """
+    pooled = {}
+    for block, page, result in hits:
+        key = page if group == "page" else block
+        best = pooled.get(key)
+        if best is None:
+            pooled[key] = dict(result)
+        elif pooling == "sum":
+            best["score"] += result["score"]
+    ranked = list(pooled.items())
+    if pooling == "sum":
+        ranked.sort(key=lambda item: -item[1]["score"])
+    return ranked[:k]
+
+def _text_results(metas, ids, shards, scores, k=None):
+    return [result for _, result in pool_hits(_text_hits(metas, ids, shards, scores), k or len(ids))]
 
-    # Image search
-    D_i, I_i = image_index.search(emb, k)
-    image_results = [
-        {
-            "title": image_meta[i]["title"],
-            "filename": image_meta[i]["filename"],
-            "caption": image_meta[i].get("caption"),
-            "url": image_meta[i].get("url"),
+def _image_results(metas, ids, shards, scores):
+    results = []
+    for i, s, d in zip(ids, shards, scores):
+        if i < 0:
+            continue
+        meta = metas[s].get(i)
+        if meta is None:
+            continue
+        results.append({
+            "title": meta["title"],
+            "filename": meta["filename"],
+            "source": meta.get("source", "wikipedia"),   # served under /images/<source>/<filename>
+            "caption": meta.get("caption"),
+            "url": meta.get("url"),
             "score": float(d)
-        }
-        for i, d in zip(I_i[0], D_i[0])
+        })
+    return results
+
+def allowed_ids(filter_indexes, filters):
+    """
+    Per shard, the sorted ids whose metadata matches every field of
+    `filters` ({"page_id": ..., "section": ..., "source": ...}), or None
+    when nothing is filtered.
+    """
+    if not filters:
+        return None
+    unknown = set(filters) - set(FILTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown filter fields {sorted(unknown)}, expected {FILTER_FIELDS}")
+    if not filter_indexes:
+        raise ValueError("Filtered search needs filter postings, run: python -m backend.filters")
+    return [f.allowed(filters) for f in filter_indexes]
+
+def search_from_embeddings(embs: np.ndarray, k: int = 5, filters: dict = None):
+    """
+    One multi-query FAISS search per index (per shard) for a (n, 512) batch.
+    Returns [(text_results, image_results)] in query order.
+    """
+    ensure_loaded()
+    res = resources
+    embs = np.ascontiguousarray(embs, dtype="float32")
+    D_t, I_t, S_t = _search_shards(res.text_indices, res.text_vectors, embs, k * TEXT_OVERFETCH,
+                                   allowed_ids(res.text_filters, filters))
+    D_i, I_i, S_i = _search_shards(res.image_indices, res.image_vectors, embs, k,
+                                   allowed_ids(res.image_filters, filters))
+    return [
+        (_text_results(res.text_metas, I_t[q], S_t[q], D_t[q], k),
+         _image_results(res.image_metas, I_i[q], S_i[q], D_i[q]))
+        for q in range(len(embs))
     ]
 
-    return text_results, image_results
+def search_from_embedding(emb: np.ndarray, k: int = 5, filters: dict = None):
+    return search_from_embeddings(emb.reshape(1, -1), k, filters)[0]
+
+# -------------------- Lexical / Hybrid --------------------
+# vector   CLIP only
+# lexical  BM25 over title + full block text (CLIP only sees the first 77 tokens)
+# hybrid   both rankings fused with reciprocal rank fusion
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
+def reciprocal_rank_fusion(rankings: list, k: int):
+    """
+    rankings: pooled [(key, result)] lists, best first. Every list adds
+    1 / (RRF_K + rank) to the keys it contains. Returns the top k results
+    with the fused score.
+    """
+    fused, results = {}, {}
+    for ranking in rankings:
+        for rank, (key, result) in enumerate(ranking, 1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank)
+            results.setdefault(key, result)
+    best = sorted(fused, key=fused.get, reverse=True)[:k]
+    return [dict(results[key], score=fused[key]) for key in best]
+
+def text_hits(query: str, emb: np.ndarray, k: int, mode: str, filters: dict = None,
+              res: SearchResources = None):
+    """
+    Text results for one query in the given mode. Without a BM25 index
+    every mode is plain vector search.
+    """
+    res = res or resources
+    allowed = allowed_ids(res.text_filters, filters)
+    if mode == "vector" or not res.text_lexical:
+        D, I, S = _search_shards(res.text_indices, res.text_vectors, emb.reshape(1, -1),
+                                 k * TEXT_OVERFETCH, allowed)
+        return _text_results(res.text_metas, I[0], S[0], D[0], k)
+    if mode == "lexical":
+        # BM25 indexes whole blocks, so only page grouping can merge hits
+        D, I, S = search_bm25(res.text_lexical, query, k * TEXT_OVERFETCH, BM25_MAX_POSTINGS, allowed)
+        return _text_results(res.text_metas, I, S, D, k)
+
+    # both rankings are pooled first, so they are fused block by block
+    depth = max(k * TEXT_OVERFETCH, HYBRID_DEPTH)
+    D_v, I_v, S_v = _search_shards(res.text_indices, res.text_vectors, emb.reshape(1, -1), depth, allowed)
+    D_l, I_l, S_l = search_bm25(res.text_lexical, query, depth, BM25_MAX_POSTINGS, allowed)
+    return reciprocal_rank_fusion([
+        pool_hits(_text_hits(res.text_metas, I_v[0], S_v[0], D_v[0]), depth),
+        pool_hits(_text_hits(res.text_metas, I_l, S_l, D_l), depth),
+    ], k)
+
+# -------------------- Cross-modal Fusion --------------------
+def calibrate(scores: np.ndarray) -> np.ndarray:
+    # text->text and text->image cosines live on different scales; z-scores
+    # over one modality's candidates put them on a common one
+    if len(scores) < 2:
+        return np.zeros(len(scores))
+    std = scores.std()
+    return (scores - scores.mean()) / (std if std > 0 else 1.0)
+
+def mmr_select(relevance: np.ndarray, pages: np.ndarray, k: int, lam: float = MMR_LAMBDA) -> list:
+    """
+    Greedy maximal marginal relevance with page-level similarity: two
+    results are similar (1) if they come from the same page, else 0.
+    relevance in 0..1, pages as integer codes. Returns the picked rows.
+    """
+    picked = []
+    score = lam * relevance
+    for _ in range(min(k, len(relevance))):
+        i = int(np.argmax(score))
+        picked.append(i)
+        score[i] = -np.inf
+        # first pick from a page costs the rest of that page (1 - lam), once
+        same = (pages == pages[i]) & np.isfinite(score)
+        score[same] = lam * relevance[same] - (1 - lam)
+    return picked
+
+def fuse_results(text: list, images: list, k: int) -> list:
+    """
+    One ranked list of text and image results (each best first, over-fetched):
+    calibrated per modality, then diversified across pages with MMR.
+    """
+    items = [dict(r, type="text") for r in text] + [dict(r, type="image") for r in images]
+    if not items:
+        return []
+    z = np.concatenate([
+        calibrate(np.array([r["score"] for r in text], dtype="float64")),
+        calibrate(np.array([r["score"] for r in images], dtype="float64")),
+    ])
+    span = z.max() - z.min()
+    relevance = (z - z.min()) / span if span > 0 else np.ones(len(z))
+    _, pages = np.unique([r.get("url") or r["title"] for r in items], return_inverse=True)
+
+    fused = []
+    for i in mmr_select(relevance, pages, k):
+        items[i]["calibrated_score"] = round(float(z[i]), 4)
+        fused.append(items[i])
+    return fused
 
 # -------------------- Unified Search Functions --------------------
-def unified_text_search(query: str, k: int = 5):
-    emb = embed_text(query)
-    text, images = search_from_embedding(emb, k)
+def unified_search_from_embedding(emb: np.ndarray, k: int = 5, query: str = None,
+                                  mode: str = "vector", filters: dict = None):
+    """
+    Top k text and image results, plus "results": both modalities fused into
+    one page-diversified list, chosen from FUSION_OVERFETCH * k of each.
+    """
+    ensure_loaded()
+    res = resources
+    emb = np.ascontiguousarray(emb, dtype="float32")
+    depth = k * max(FUSION_OVERFETCH, 1)
+    text = text_hits(query, emb, depth, mode if query is not None else "vector", filters, res)
+    D, I, S = _search_shards(res.image_indices, res.image_vectors, emb.reshape(1, -1), depth,
+                             allowed_ids(res.image_filters, filters))
+    images = _image_results(res.image_metas, I[0], S[0], D[0])
     return {
-        "text_results": text,
-        "image_results": images,
-        "embedding": emb.tolist()
+        "text_results": text[:k],
+        "image_results": images[:k],
+        "results": fuse_results(text, images, k),
+        "session_id": open_session(emb)
     }
 
+def unified_text_search(query: str, k: int = 5, mode: str = "vector", filters: dict = None):
+    key = result_key(query, k, mode, filters)
+    result = cached_result(key)
+    if result is None:
+        result = unified_search_from_embedding(cached_embed_text(query), k, query, mode, filters)
+        result_cache.put(key, result)
+    return result
+
 def unified_image_search(image: Image.Image, k: int = 5):
-    emb = embed_image(image)
-    text, images = search_from_embedding(emb, k)
-    return {
-        "text_results": text,
-        "image_results": images,
-        "embedding": emb.tolist()
-    }
+    return unified_search_from_embedding(embed_image(image), k)
 
-def refine_search(base_embedding: list, refinement: str, alpha: float = 0.6, k: int = 5):
-    base = np.array(base_embedding).astype("float32")
-    refine_emb = embed_text(refinement)
-    blended = normalize((1 - alpha) * base + alpha * refine_emb)
-    text, images = search_from_embedding(blended, k)
-    return {
-        "text_results": text,
-        "image_results": images,
-        "embedding": blended.tolist()
-    }
+def refine_key(session_id: str, refinement: str, alpha: float, k: int) -> tuple:
+    return ("refine", session_id, normalize_query(refinement), alpha, k, index_version)
+
+def refine_from_embeddings(base: np.ndarray, refine_emb: np.ndarray, alpha: float = 0.6, k: int = 5):
+    # the result names a new session, so refinements can be chained
+    blended = normalize((1 - alpha) * base + alpha * refine_emb).astype("float32")
+    return unified_search_from_embedding(blended, k)
+
+def refine_search(session_id: str, refinement: str, alpha: float = 0.6, k: int = 5):
+    """
+    Refines the query of an open session. Raises KeyError if it expired.
+    """
+    key = refine_key(session_id, refinement, alpha, k)
+    result = cached_result(key)
+    if result is None:
+        base = session_vector(session_id)
+        if base is None:
+            raise KeyError(session_id)
+        result = refine_from_embeddings(base, cached_embed_text(refinement), alpha, k)
+        result_cache.put(key, result)
+    return result
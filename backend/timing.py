@@ -0,0 +1,58 @@
+# backend/timing.py
+import time
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import numpy as np
+
+
+class StageStats:
+    """
+    Rolling window of per-stage latencies (ms) across requests.
+    """
+
+    def __init__(self, window: int = 2000):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, ms: float):
+        with self._lock:
+            self._samples[stage].append(ms)
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = {stage: np.array(values) for stage, values in self._samples.items()}
+        return {
+            stage: {
+                "count": len(values),
+                "p50_ms": round(float(np.percentile(values, 50)), 3),
+                "p95_ms": round(float(np.percentile(values, 95)), 3),
+                "p99_ms": round(float(np.percentile(values, 99)), 3),
+            }
+            for stage, values in samples.items() if len(values)
+        }
+
+
+stage_stats = StageStats()
+
+
+class RequestTimer:
+    """
+    Times the stages of one request; rendered as a Server-Timing header.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            self.stages[name] = ms
+            stage_stats.record(name, ms)
+
+    def header(self) -> str:
+        return ", ".join(f"{name};dur={ms:.2f}" for name, ms in self.stages.items())
@@ -0,0 +1,107 @@
+# benchmarks/chunking.py
+"""
+Cost of embedding long text blocks as overlapping windows (embed.py
+--chunk-words / --chunk-overlap) against one vector per block.
+
+    python -m benchmarks.chunking --data-dir wikipedia_scrape --settings 0:0 50:15 40:10
+
+Growth is exact: text vectors, index and metadata bytes for the corpus under
+every setting (no CLIP needed). Query cost is measured on a flat index of
+random unit vectors of the same size: FAISS search for k * --overfetch
+windows plus pooling them back into k blocks, as backend/search.py does.
+"""
+import json
+import time
+import argparse
+import numpy as np
+import faiss
+
+from embed import DIM, chunk_text
+from page_store import iter_pages
+
+
+def corpus_blocks(data_dir):
+    for page, _ in iter_pages(data_dir):
+        for block in page.get("content", []):
+            text = block.get("content", "").strip() if block.get("type") == "text" else ""
+            if text:
+                yield page, block, text
+
+
+def growth(data_dir, settings):
+    rows = {s: {"vectors": 0, "meta_bytes": 0} for s in settings}
+    blocks = 0
+    for page, block, text in corpus_blocks(data_dir):
+        blocks += 1
+        record = {"page_id": page.get("page_id"), "title": page.get("title", ""), "url": page.get("url", ""),
+                  "type": "text", "section": block.get("section", ""), "text": text}
+        size = len(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+        for words, overlap in settings:
+            n = len(chunk_text(text, words, overlap))
+            rows[(words, overlap)]["vectors"] += n
+            # window records repeat the block plus "window" / "windows"
+            rows[(words, overlap)]["meta_bytes"] += n * (size + (30 if n > 1 else 0))
+    return blocks, rows
+
+
+def query_cost(n_blocks, n_vectors, k, overfetch, n_queries, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n_vectors, DIM)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    # windows of one block are consecutive, as embed.py numbers them
+    block_of = np.sort(rng.integers(0, n_blocks, n_vectors))
+    index = faiss.IndexFlatIP(DIM)
+    index.add(vectors)
+    queries = vectors[rng.integers(0, n_vectors, n_queries)] + 0.1 * rng.standard_normal((n_queries, DIM)).astype("float32")
+
+    fetch = k if n_vectors == n_blocks else k * overfetch
+    times = []
+    for q in queries:
+        t = time.perf_counter()
+        _, ids = index.search(q.reshape(1, -1), fetch)
+        seen = {}
+        for i in ids[0]:
+            seen.setdefault(block_of[i], i)
+            if len(seen) == k:
+                break
+        times.append((time.perf_counter() - t) * 1000)
+    return round(float(np.percentile(times, 50)), 3), round(float(np.percentile(times, 95)), 3)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="index growth and query cost of long-text windows")
+    parser.add_argument("--data-dir", default="wikipedia_scrape")
+    parser.add_argument("--settings", nargs="+", default=["0:0", "50:15"],
+                        help="chunk_words:chunk_overlap pairs, 0:0 = one vector per block")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--overfetch", type=int, default=4, help="TEXT_OVERFETCH used by search")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--json", help="also write the rows to this file")
+    args = parser.parse_args()
+
+    settings = [tuple(int(x) for x in s.split(":")) for s in args.settings]
+    blocks, rows = growth(args.data_dir, settings)
+    print(f"{blocks} text blocks in {args.data_dir}\n")
+
+    report = []
+    for words, overlap in settings:
+        row = rows[(words, overlap)]
+        p50, p95 = query_cost(blocks, row["vectors"], args.k, args.overfetch, args.queries)
+        report.append({
+            "chunking": f"{words}:{overlap}",
+            "vectors": row["vectors"],
+            "per_block": round(row["vectors"] / max(blocks, 1), 2),
+            "vector_mb": round(row["vectors"] * DIM * 4 / 2**20, 1),
+            "meta_mb": round(row["meta_bytes"] / 2**20, 1),
+            "p50_ms": p50,
+            "p95_ms": p95,
+        })
+
+    keys = list(report[0].keys())
+    print("  ".join(f"{key:>12}" for key in keys))
+    for row in report:
+        print("  ".join(f"{str(row[key]):>12}" for key in keys))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
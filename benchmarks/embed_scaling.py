@@ -0,0 +1,80 @@
+# benchmarks/embed_scaling.py
+"""
+Embedding throughput of embed.py --workers N for several N.
+
+    python -m benchmarks.embed_scaling --data-dir wikipedia_scrape --workers 1 2 4 8
+
+Every run is a fresh full build in its own scratch directory (nothing under
+indices1/ is touched), with cores split evenly between workers unless
+--threads is given. Reports blocks/s per modality, speedup over the first
+worker count and parallel efficiency.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(data_dir, workers, threads, batch_size, encoder):
+    scratch = tempfile.mkdtemp(prefix="embed_scaling_")
+    cmd = [
+        sys.executable, os.path.join(ROOT, "embed.py"),
+        "--data-dir", os.path.abspath(data_dir),
+        "--workers", str(workers),
+        "--batch-size", str(batch_size),
+        "--encoder", encoder,
+    ]
+    if threads:
+        cmd += ["--threads", str(threads)]
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    started = time.perf_counter()
+    try:
+        out = subprocess.run(cmd, cwd=scratch, env=env, capture_output=True, text=True, check=True).stdout
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    wall_s = time.perf_counter() - started
+
+    line = next(l for l in out.splitlines() if l.startswith("Throughput: "))
+    stats = json.loads(line[len("Throughput: "):])
+    return {
+        "workers": workers,
+        "threads_per_worker": threads or max(1, (os.cpu_count() or 1) // workers),
+        "text_per_s": stats["blocks_per_sec"]["text"],
+        "image_per_s": stats["blocks_per_sec"]["image"],
+        "wall_s": round(wall_s, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="embed.py throughput vs worker processes")
+    parser.add_argument("--data-dir", default="wikipedia_scrape")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=None, help="threads per worker (default: cores / workers)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--encoder", default="torch")
+    parser.add_argument("--json", help="also write the rows to this file")
+    args = parser.parse_args()
+
+    report = [run(args.data_dir, n, args.threads, args.batch_size, args.encoder) for n in args.workers]
+    base = report[0]
+    for row in report:
+        for m in ("text", "image"):
+            speedup = row[f"{m}_per_s"] / base[f"{m}_per_s"] if base[f"{m}_per_s"] else 0.0
+            row[f"{m}_speedup"] = round(speedup, 2)
+            row[f"{m}_efficiency"] = round(speedup * base["workers"] / row["workers"], 2)
+
+    keys = list(report[0].keys())
+    print("  ".join(f"{key:>18}" for key in keys))
+    for row in report:
+        print("  ".join(f"{str(row[key]):>18}" for key in keys))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,143 @@
+# benchmarks/encoders.py
+"""
+Accuracy and speed of the CLIP encoder backends against the fp32 PyTorch path.
+
+    python -m benchmarks.encoders --backends torch int8 onnx onnx_int8 --threads 4
+
+Accuracy: corpus = text blocks from indices1/text_meta, queries = page titles
+and images from wikipedia_scrape/images. For every backend we report the mean
+cosine to the fp32 vectors and top-k overlap with the fp32 results, both with
+the fp32 index (only queries re-encoded, what the API does after switching
+ENCODER_BACKEND) and with a corpus re-encoded by the backend.
+Speed: single-query latency p50/p95 and batched throughput.
+"""
+import os
+import json
+import time
+import argparse
+import numpy as np
+import faiss
+from PIL import Image
+
+from backend.encoders import ENCODER_BACKENDS, load_encoder
+from backend.index_factory import shard_dirs
+from backend.meta_store import open_meta
+
+MODEL_NAME = "openai/clip-vit-base-patch32"
+
+
+def load_inputs(index_dir, image_dir, n_corpus, n_queries, seed=0):
+    records = []
+    for d in shard_dirs(index_dir):
+        meta = open_meta(d, "text")
+        records += list(meta.values()) if isinstance(meta, dict) else list(meta)
+    rng = np.random.default_rng(seed)
+    rows = rng.permutation(len(records))[:n_corpus]
+    corpus = [records[i]["text"] for i in rows]
+    titles = sorted({r["title"] for r in records})
+    queries = [titles[i] for i in rng.permutation(len(titles))[:n_queries]]
+
+    images = []
+    if os.path.isdir(image_dir):
+        names = sorted(f for f in os.listdir(image_dir) if f.endswith(".jpg"))
+        for i in rng.permutation(len(names))[:n_queries]:
+            images.append(Image.open(os.path.join(image_dir, names[i])).convert("RGB"))
+    return corpus, queries, images
+
+
+def encode(fn, items, batch_size):
+    out = [fn(items[i:i + batch_size]) for i in range(0, len(items), batch_size)]
+    return np.concatenate(out) if out else np.zeros((0, 512), dtype="float32")
+
+
+def top_k(corpus_emb, query_emb, k):
+    index = faiss.IndexFlatIP(corpus_emb.shape[1])
+    index.add(corpus_emb)
+    return index.search(query_emb, k)[1]
+
+
+def overlap(a, b):
+    k = a.shape[1]
+    return float(np.mean([len(np.intersect1d(x, y)) / k for x, y in zip(a, b)]))
+
+
+def latency_ms(fn, items, repeats):
+    times = []
+    for item in items[:repeats]:
+        t = time.perf_counter()
+        fn([item])
+        times.append((time.perf_counter() - t) * 1000)
+    return round(float(np.percentile(times, 50)), 2), round(float(np.percentile(times, 95)), 2)
+
+
+def throughput(fn, items, batch_size):
+    started = time.perf_counter()
+    encode(fn, items, batch_size)
+    return round(len(items) / (time.perf_counter() - started), 1)
+
+
+def run(backends, corpus, queries, images, k, batch_size, threads, repeats):
+    encoders = {}
+    vectors = {}
+    for name in backends:
+        started = time.perf_counter()
+        encoders[name] = enc = load_encoder(name, MODEL_NAME, threads)
+        load_s = time.perf_counter() - started
+
+        enc.embed_texts(["warm up"])
+        if images:
+            enc.embed_images(images[:1])
+        vectors[name] = {
+            "load_s": load_s,
+            "corpus": encode(enc.embed_texts, corpus, batch_size),
+            "text": encode(enc.embed_texts, queries, batch_size),
+            "image": encode(enc.embed_images, images, batch_size),
+        }
+
+    ref = vectors["torch"]
+    truth = {m: top_k(ref["corpus"], ref[m], k) for m in ("text", "image") if len(ref[m])}
+
+    report = []
+    for name in backends:
+        enc, vec = encoders[name], vectors[name]
+        row = {"backend": name, "load_s": round(vec["load_s"], 2)}
+        for m in truth:
+            row[f"{m}_cos"] = round(float(np.mean(np.sum(vec[m] * ref[m], axis=1))), 4)
+            row[f"{m}_overlap@{k}"] = round(overlap(top_k(ref["corpus"], vec[m], k), truth[m]), 4)
+            row[f"{m}_overlap@{k}_reindexed"] = round(overlap(top_k(vec["corpus"], vec[m], k), truth[m]), 4)
+
+        row["text_p50_ms"], row["text_p95_ms"] = latency_ms(enc.embed_texts, queries, repeats)
+        row["text_per_s"] = throughput(enc.embed_texts, corpus, batch_size)
+        if images:
+            row["image_p50_ms"], row["image_p95_ms"] = latency_ms(enc.embed_images, images, repeats)
+            row["image_per_s"] = throughput(enc.embed_images, images, batch_size)
+        report.append(row)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CLIP encoder backends: top-k overlap vs fp32, latency, throughput")
+    parser.add_argument("--backends", nargs="+", choices=ENCODER_BACKENDS, default=["torch", "int8"])
+    parser.add_argument("--index-dir", default="indices1")
+    parser.add_argument("--image-dir", default=os.path.join("wikipedia_scrape", "images"))
+    parser.add_argument("--corpus", type=int, default=2000, help="text blocks to search over")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--repeats", type=int, default=50, help="single-query calls timed per backend")
+    parser.add_argument("--json", help="also write the rows to this file")
+    args = parser.parse_args()
+
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    corpus, queries, images = load_inputs(args.index_dir, args.image_dir, args.corpus, args.queries)
+    print(f"{len(corpus)} corpus texts, {len(queries)} text queries, {len(images)} image queries\n")
+
+    report = run(backends, corpus, queries, images, args.k, args.batch_size, args.threads, args.repeats)
+    for row in report:
+        print("\n".join(f"{key:>28}  {value}" for key, value in row.items()))
+        print()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
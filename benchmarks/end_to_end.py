@@ -0,0 +1,334 @@
+# benchmarks/end_to_end.py
+"""
+Crawl -> embed -> serve on a synthetic corpus, end to end.
+
+    python -m benchmarks.end_to_end --pages 300 --workers 1 2 --concurrency 1 8 32 --json e2e.json
+
+A fixture site of --pages wiki-style HTML pages (sections, paragraphs drawn
+from a Zipf vocabulary, generated PNGs, links between pages) is served from
+a local HTTP server, so runs are repeatable and never touch the network.
+Everything happens in a scratch directory; nothing under indices1/ or
+wikipedia_scrape/ is touched.
+
+  crawl   crawler.py against the fixture site (no rate limit): pages/s
+  embed   a full embed.py build of the crawl: blocks/s and index build time
+  search  uvicorn serving backend.main with --workers N; unique /search
+          queries from --concurrency C clients: p50 / p95 / p99 latency,
+          queries/s and RSS of every worker after the load
+
+Results are printed as tables and, with --json, written as one document
+(config + crawl + embed + search rows) so runs can be diffed.
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import numpy as np
+import aiohttp
+from PIL import Image, ImageDraw
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYLLABLES = ["ka", "lo", "mi", "ren", "to", "sa", "vu", "ne", "dri", "pa", "shi", "gor", "el", "tam", "qu", "ix"]
+
+
+# -------------------- Fixture Site --------------------
+def vocabulary(n_words, rng):
+    words = set()
+    while len(words) < n_words:
+        words.add("".join(rng.choice(SYLLABLES, rng.integers(2, 5))))
+    words = sorted(words)
+    # Zipf weights, so some terms are common (long posting lists) and most are rare
+    weights = 1.0 / np.arange(1, n_words + 1)
+    return words, weights / weights.sum()
+
+
+def sentence(words, weights, rng, n):
+    picks = rng.choice(len(words), n, p=weights)
+    return " ".join(words[i] for i in picks).capitalize() + "."
+
+
+def build_site(site_dir, n_pages, paragraphs, images, n_words, seed=0):
+    """
+    Writes site_dir/wiki/Page_N (HTML) and site_dir/images/*.png.
+    Every page links to the next one, so a crawl from Page_0 reaches all.
+    Returns the vocabulary for query generation.
+    """
+    rng = np.random.default_rng(seed)
+    words, weights = vocabulary(n_words, rng)
+    os.makedirs(os.path.join(site_dir, "wiki"), exist_ok=True)
+    os.makedirs(os.path.join(site_dir, "images"), exist_ok=True)
+
+    for p in range(n_pages):
+        body = [f"<h1>Page {p}</h1>"]
+        for j in range(paragraphs):
+            if j % 4 == 0:
+                body.append(f"<h2>{sentence(words, weights, rng, 2)[:-1]}</h2>")
+            text = " ".join(sentence(words, weights, rng, rng.integers(6, 18)) for _ in range(rng.integers(2, 8)))
+            body.append(f"<p>{text}</p>")
+        for j in range(images):
+            name = f"img_{p}_{j}.png"
+            # distinct content per image: the crawler stores identical images once
+            img = Image.new("RGB", (160, 120), tuple(int(c) for c in rng.integers(0, 256, 3)))
+            ImageDraw.Draw(img).rectangle(tuple(int(c) for c in sorted(rng.integers(0, 120, 2))) * 2,
+                                          fill=tuple(int(c) for c in rng.integers(0, 256, 3)))
+            img.save(os.path.join(site_dir, "images", name))
+            body.append(f'<img src="/images/{name}" alt="{sentence(words, weights, rng, 3)}">')
+        links = {(p + 1) % n_pages, *rng.integers(0, n_pages, 5).tolist()}
+        body.append(" ".join(f'<a href="/wiki/Page_{q}">Page {q}</a>' for q in sorted(links)))
+
+        html = f"<html><head><title>Page {p}</title></head><body>{''.join(body)}</body></html>"
+        with open(os.path.join(site_dir, "wiki", f"Page_{p}"), "w", encoding="utf-8") as f:
+            f.write(html)
+    return words, weights
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve_site(site_dir):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=site_dir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# -------------------- Crawl / Embed --------------------
+def run_script(args, cwd):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable] + args, cwd=cwd, env=env, capture_output=True, text=True, check=True).stdout
+    return out, time.perf_counter() - started
+
+
+def crawl(scratch, port, n_pages, workers):
+    out, wall_s = run_script([
+        os.path.join(ROOT, "crawler.py"), "--fresh",
+        "--start-url", f"http://127.0.0.1:{port}/wiki/Page_0",
+        "--max-pages", str(n_pages), "--workers", str(workers),
+        "--per-host", str(workers), "--rate", "0",
+    ], scratch)
+    m = re.search(r"Crawled (\d+) pages, (\d+) images in ([\d.]+)s \(([\d.]+) pages/s\)", out)
+    return {
+        "pages": int(m.group(1)),
+        "images": int(m.group(2)),
+        "seconds": float(m.group(3)),
+        "pages_per_s": float(m.group(4)),
+        "wall_s": round(wall_s, 2),
+    }
+
+
+def embed(scratch, args):
+    cmd = [os.path.join(ROOT, "embed.py"), "--data-dir", "wikipedia_scrape",
+           "--encoder", args.encoder, "--index-type", args.index_type, "--batch-size", str(args.batch_size)]
+    if args.shards:
+        cmd += ["--shards", str(args.shards)]
+    out, wall_s = run_script(cmd, scratch)
+    line = next(l for l in out.splitlines() if l.startswith("Throughput: "))
+    stats = json.loads(line[len("Throughput: "):])
+    return {
+        "text_blocks": stats["blocks"]["text"],
+        "image_blocks": stats["blocks"]["image"],
+        "text_per_s": stats["blocks_per_sec"]["text"],
+        "image_per_s": stats["blocks_per_sec"]["image"],
+        "text_index_s": stats.get("index_build_s", {}).get("text"),
+        "image_index_s": stats.get("index_build_s", {}).get("image"),
+        "wall_s": round(wall_s, 2),
+    }
+
+
+# -------------------- Serve / Load --------------------
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(scratch, workers, timeout):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning",
+         # workers importing torch / loading CLIP can miss the default 5 s ping and get restarted
+         "--timeout-worker-healthcheck", str(int(timeout))],
+        cwd=scratch, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    # /ready is answered by whichever worker accepts: wait for a run of 200s
+    # long enough that every worker has most likely loaded; warm-up covers the rest
+    ready = 0
+    while ready < workers * 4:
+        if proc.poll() is not None or time.monotonic() > deadline:
+            proc.kill()
+            raise RuntimeError(f"uvicorn with {workers} workers did not become ready")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=5) as r:
+                ready = ready + 1 if r.status == 200 else 0
+        except OSError:
+            ready = 0
+            time.sleep(0.2)
+    return proc, port
+
+
+def worker_pids(master):
+    # uvicorn forks no workers for --workers 1; otherwise they are its children
+    children = []
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except OSError:
+            continue
+        if ppid == master and b"resource_tracker" not in cmdline:
+            children.append(int(pid))
+    return sorted(children) or [master]
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return 0.0
+
+
+def make_queries(words, weights, n, seed=1):
+    # unique strings, so the result cache never answers
+    rng = np.random.default_rng(seed)
+    queries = set()
+    while len(queries) < n:
+        queries.add(" ".join(words[i] for i in rng.choice(len(words), rng.integers(1, 4), p=weights)))
+    return sorted(queries, key=lambda q: rng.random())
+
+
+async def load(port, queries, concurrency, k, mode):
+    url = f"http://127.0.0.1:{port}/search"
+    pending = iter(queries)
+    latencies, errors = [], 0
+
+    async def client(session):
+        nonlocal errors
+        for q in pending:
+            started = time.perf_counter()
+            async with session.get(url, params={"q": q, "k": k, "mode": mode}) as r:
+                await r.read()
+                if r.status != 200:
+                    errors += 1
+                    continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def search(scratch, words, weights, args):
+    rows = []
+    per_run = args.warmup + args.requests
+    queries = make_queries(words, weights, per_run * len(args.workers) * len(args.concurrency))
+    for w, workers in enumerate(args.workers):
+        proc, port = start_server(scratch, workers, args.ready_timeout)
+        try:
+            for c, concurrency in enumerate(args.concurrency):
+                start = (w * len(args.concurrency) + c) * per_run
+                batch = queries[start:start + per_run]
+                asyncio.run(load(port, batch[:args.warmup], concurrency, args.k, args.mode))
+                latencies, errors, elapsed = asyncio.run(
+                    load(port, batch[args.warmup:], concurrency, args.k, args.mode))
+                rss = [rss_mb(pid) for pid in worker_pids(proc.pid)]
+                p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (0.0, 0.0, 0.0)
+                rows.append({
+                    "workers": workers,
+                    "concurrency": concurrency,
+                    "qps": round(len(latencies) / elapsed, 1),
+                    "p50_ms": round(float(p50), 2),
+                    "p95_ms": round(float(p95), 2),
+                    "p99_ms": round(float(p99), 2),
+                    "errors": errors,
+                    "rss_mb": rss,
+                    "rss_mb_max": max(rss),
+                })
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    return rows
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    keys = list(rows[0].keys())
+    print("  ".join(f"{key:>14}" for key in keys))
+    for row in rows:
+        print("  ".join(f"{str(row[key]):>14}" for key in keys))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="end-to-end crawl / embed / search benchmark on a fixture site")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--paragraphs", type=int, default=12, help="text blocks per page")
+    parser.add_argument("--images", type=int, default=2, help="images per page")
+    parser.add_argument("--vocabulary", type=int, default=5000)
+    parser.add_argument("--crawl-workers", type=int, default=16)
+    parser.add_argument("--encoder", default="torch")
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--shards", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2], help="uvicorn worker counts")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=500, help="timed queries per run")
+    parser.add_argument("--warmup", type=int, default=50, help="untimed queries before each run")
+    parser.add_argument("--mode", default="vector", choices=("vector", "lexical", "hybrid"))
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--ready-timeout", type=float, default=300, help="seconds to wait for uvicorn")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="end_to_end_")
+    try:
+        words, weights = build_site(os.path.join(scratch, "site"), args.pages, args.paragraphs,
+                                    args.images, args.vocabulary)
+        server = serve_site(os.path.join(scratch, "site"))
+        try:
+            crawl_stats = crawl(scratch, server.server_address[1], args.pages, args.crawl_workers)
+        finally:
+            server.shutdown()
+        print_table("crawl", [crawl_stats])
+
+        embed_stats = embed(scratch, args)
+        print_table("embed", [embed_stats])
+
+        search_rows = search(scratch, words, weights, args)
+        print_table(f"search ({args.mode}, k={args.k})", search_rows)
+    finally:
+        if args.keep:
+            print(f"\nScratch directory kept: {scratch}")
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.json:
+        report = {
+            "config": {key: value for key, value in vars(args).items() if key not in ("json", "keep")},
+            "crawl": crawl_stats,
+            "embed": embed_stats,
+            "search": search_rows,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
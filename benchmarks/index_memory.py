@@ -0,0 +1,116 @@
+# benchmarks/index_memory.py
+"""
+Per-worker memory and query latency of FAISS indices loaded as a private
+copy (faiss.read_index) versus memory-mapped (FAISS_MMAP=1).
+
+    python -m benchmarks.index_memory --workers 1 2 4 8 --index-dir indices1
+
+RSS counts shared pages in every process; PSS splits them between the
+processes mapping them, so sum(PSS) is the real host-wide footprint.
+"""
+import os
+import json
+import time
+import argparse
+import multiprocessing as mp
+import numpy as np
+
+from backend.index_factory import read_index, set_search_params, shard_dirs
+
+
+def memory_kb():
+    # Linux only: /proc/self/smaps_rollup has Rss / Pss / Private_* in kB
+    stats = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0].rstrip(":") in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                stats[parts[0].rstrip(":")] = int(parts[1])
+    return stats
+
+
+def worker(index_dir, mmap, n_queries, k, barrier, results):
+    started = time.perf_counter()
+    indices = [
+        read_index(os.path.join(d, f"{m}.index"), mmap=mmap)
+        for d in shard_dirs(index_dir) for m in ("text", "image")
+    ]
+    load_s = time.perf_counter() - started
+    for index in indices:
+        set_search_params(index, nprobe=16, ef_search=64)
+
+    rng = np.random.default_rng(os.getpid())
+    queries = rng.standard_normal((n_queries, indices[0].d)).astype("float32")
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    latencies = []
+    for q in queries:
+        t = time.perf_counter()
+        for index in indices:
+            index.search(q.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    # measure while every worker still holds its indices
+    barrier.wait()
+    mem = memory_kb()
+    barrier.wait()
+
+    results.put({
+        "load_s": load_s,
+        "rss_mb": mem["Rss"] / 1024,
+        "pss_mb": mem["Pss"] / 1024,
+        "private_mb": (mem["Private_Clean"] + mem["Private_Dirty"]) / 1024,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    })
+
+
+def run(index_dir, mmap, n_workers, n_queries, k):
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(n_workers)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=worker, args=(index_dir, mmap, n_queries, k, barrier, results))
+        for _ in range(n_workers)
+    ]
+    for p in procs:
+        p.start()
+    rows = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    return {
+        "mode": "mmap" if mmap else "copy",
+        "workers": n_workers,
+        "load_s": round(max(r["load_s"] for r in rows), 3),
+        "rss_mb_per_worker": round(np.mean([r["rss_mb"] for r in rows]), 1),
+        "private_mb_per_worker": round(np.mean([r["private_mb"] for r in rows]), 1),
+        "total_pss_mb": round(sum(r["pss_mb"] for r in rows), 1),
+        "p50_ms": round(float(np.median([r["p50_ms"] for r in rows])), 3),
+        "p99_ms": round(float(np.max([r["p99_ms"] for r in rows])), 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FAISS copy vs mmap: memory per worker and latency")
+    parser.add_argument("--index-dir", default="indices1")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--json", help="also write the rows to this file")
+    args = parser.parse_args()
+
+    report = [
+        run(args.index_dir, mmap, n, args.queries, args.k)
+        for n in args.workers
+        for mmap in (False, True)
+    ]
+
+    keys = list(report[0].keys())
+    print("  ".join(f"{key:>22}" for key in keys))
+    for row in report:
+        print("  ".join(f"{str(row[key]):>22}" for key in keys))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
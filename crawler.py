@@ -1,43 +1,75 @@
 import os
+import re
+import time
+import hashlib
+import asyncio
+import argparse
 import requests
+import aiohttp
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
-from collections import deque
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from PIL import Image
 from io import BytesIO
 import json
 from tqdm import tqdm
 
+from frontier import Frontier
+from page_store import ShardWriter, SHARD_PAGES
+
 # ---------------- CONFIG ----------------
 start_url = "https://en.wikipedia.org/wiki/Kallang_Field"
 allowed_domain = "en.wikipedia.org"
 max_pages = 401
 
+# async crawler
+WORKERS = 16             # pages processed concurrently
+PER_HOST_CONCURRENCY = 4 # open requests per host
+PER_HOST_RATE = 10.0     # requests per second per host
+TIMEOUT = 10
+IMAGE_WORKERS = 8        # threads decoding / saving images
+
 output_dir = "wikipedia_scrape"
 os.makedirs(output_dir, exist_ok=True)
 os.makedirs(os.path.join(output_dir, "images"), exist_ok=True)
 os.makedirs(os.path.join(output_dir, "meta"), exist_ok=True)
 
+# seen URLs, queue and counters; lets an interrupted crawl resume
+FRONTIER_PATH = os.path.join(output_dir, "frontier.sqlite")
+
+# "json": one meta/meta_{page_id}.json per page
+# "jsonl": append-only pages/pages-NNNNN.jsonl[.gz] shards (see page_store.py)
+OUTPUT_FORMAT = "json"
+SOURCE = "wikipedia"
+page_writer = None   # ShardWriter when OUTPUT_FORMAT is "jsonl"
+
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) WikipediaCrawler/1.0"
 }
 
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+MIN_IMAGE_SIDE = 100
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+FETCH_CHUNK = 64 * 1024   # bytes read at a time while enforcing MAX_IMAGE_BYTES
+# Wikimedia thumbnails carry their width in the name: .../thumb/a/ab/X.jpg/80px-X.jpg
+THUMB_WIDTH = re.compile(r"/(\d+)px-[^/]+$")
+
 # ---------------- COUNTERS ----------------
 page_count = 1
 image_count = 1
 
 
-# ---------------- SCRAPE PAGE ----------------
-def extract_content(url, page_id):
-    global image_count
-
-    response = requests.get(url, headers=HEADERS, timeout=10)
-    if response.status_code != 200:
-        raise Exception(f"HTTP {response.status_code}")
-
-    soup = BeautifulSoup(response.content, "html.parser")
+# ---------------- PARSE PAGE ----------------
+def parse_page(html, url, domain=allowed_domain):
+    """
+    Parses one fetched page into its title, content blocks and outgoing links.
+    Image blocks carry the absolute "src" until the image has been saved.
+    """
+    soup = BeautifulSoup(html, "html.parser")
 
-    title = soup.title.string.strip() if soup.title else "No Title"
+    title = soup.title.string.strip() if soup.title and soup.title.string else "No Title"
 
     # Remove scripts/styles
     for tag in soup(["script", "style", "noscript"]):
@@ -63,102 +95,589 @@ def extract_content(url, page_id):
         elif tag.name == "img" and tag.has_attr("src"):
             img_url = urljoin(url, tag["src"])
 
-            if not any(img_url.lower().endswith(ext) for ext in [".jpg", ".jpeg", ".png"]):
+            if not img_url.lower().endswith(IMAGE_EXTS):
                 continue
 
-            try:
-                img_res = requests.get(img_url, headers=HEADERS, timeout=10)
-                img = Image.open(BytesIO(img_res.content))
+            content_blocks.append({
+                "type": "image",
+                "section": current_section,
+                "src": img_url,
+                "caption": tag.get("alt") or tag.get("title") or "No caption"
+            })
 
-                if img.width < 100 or img.height < 100:
-                    continue
+    return title, content_blocks, extract_links(soup, url, domain)
 
-                img_name = f"image_{image_count}.jpg"
-                img_path = os.path.join(output_dir, "images", img_name)
-                img.convert("RGB").save(img_path)
 
-                caption = tag.get("alt") or tag.get("title") or "No caption"
+# ---------------- EXTRACT LINKS ----------------
+def extract_links(soup, url, domain=allowed_domain):
+    links = set()
 
-                content_blocks.append({
-                    "type": "image",
-                    "section": current_section,
-                    "filename": img_name,
-                    "caption": caption
-                })
+    for a in soup.find_all("a", href=True):
+        href = a["href"]
+        full_url = urljoin(url, href)
+        parsed = urlparse(full_url)
 
-                image_count += 1
+        if parsed.netloc == domain and parsed.scheme.startswith("http"):
+            if "/wiki/" in parsed.path and ":" not in parsed.path.split("/wiki/")[-1]:
+                links.add(full_url.split("#")[0])
 
-            except:
-                continue
+    return links
+
+
+# ---------------- SAVE ----------------
+def too_small_by_url(url):
+    # lets us skip icons and tiny thumbnails without downloading them
+    m = THUMB_WIDTH.search(urlparse(url).path)
+    return m is not None and int(m.group(1)) < MIN_IMAGE_SIDE
 
+
+def inspect_image(data):
+    """
+    Returns (sha1 of the bytes, True if the image is big enough).
+    PIL only parses the header here; pixels are decoded later, and only
+    for images that are actually stored.
+    """
+    digest = hashlib.sha1(data).hexdigest()
+    try:
+        img = Image.open(BytesIO(data))
+    except Exception:
+        return digest, False
+    return digest, img.width >= MIN_IMAGE_SIDE and img.height >= MIN_IMAGE_SIDE
+
+
+def save_image(data, image_id):
+    """
+    Stores one downloaded image. Returns the filename,
+    or None if the image is too small or cannot be decoded.
+    """
+    img = Image.open(BytesIO(data))
+
+    if img.width < MIN_IMAGE_SIDE or img.height < MIN_IMAGE_SIDE:
+        return None
+
+    img_name = f"image_{image_id}.jpg"
+    img_path = os.path.join(output_dir, "images", img_name)
+    if img.format == "JPEG" and img.mode == "RGB":
+        # already what we would write; skip the decode + re-encode
+        with open(img_path, "wb") as f:
+            f.write(data)
+    else:
+        img.convert("RGB").save(img_path)
+    return img_name
+
+
+def write_meta(page_id, url, title, content_blocks):
     metadata = {
         "page_id": page_id,
         "url": url,
         "title": title,
+        "source": SOURCE,
         "content": content_blocks
     }
 
+    if page_writer is not None:
+        page_writer.write(metadata)
+        return
+
+    # written under a temp name so a crash never leaves half a JSON file behind
     meta_file = os.path.join(output_dir, "meta", f"meta_{page_id}.json")
-    with open(meta_file, "w", encoding="utf-8") as f:
+    with open(meta_file + ".tmp", "w", encoding="utf-8") as f:
         json.dump(metadata, f, indent=2, ensure_ascii=False)
+    os.replace(meta_file + ".tmp", meta_file)
+
+
+# ---------------- IMAGE STORE ----------------
+class ImageStore:
+    """
+    Downloads, checks and saves images on a thread pool, once per image URL
+    and once per distinct content (sha1), however many pages show them.
+    URL -> filename and hash -> filename are kept in the frontier DB, so
+    dedup also holds across restarts. The DB is only touched from the
+    calling thread, or from the FrontierThread in the async crawl, never
+    from pool threads.
+    """
+
+    def __init__(self, frontier, workers=IMAGE_WORKERS, db=None):
+        self.frontier = frontier
+        self.db = db        # FrontierThread of the async crawl
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image")
+        self.by_url = {}    # url -> future, while a download is in flight (async)
+        self.by_hash = {}   # sha1 -> future, while the file is being written (async)
+        self.stats = {"stored": 0, "url_hits": 0, "hash_hits": 0, "rejected": 0, "failed": 0}
+
+    def known(self, url):
+        name = self.frontier.image_for(url)
+        if name is not None:
+            self.stats["url_hits"] += 1
+        return name
+
+    def reject(self, url, digest=None):
+        self.stats["rejected"] += 1
+        self.frontier.add_image(url, digest, None)
+
+    def next_image_id(self):
+        image_id = take_image_id()
+        self.frontier.set_counter("image_count", image_count)
+        return image_id
+
+    def stored(self, url, digest, name):
+        if name:
+            self.stats["stored"] += 1
+            self.frontier.add_image(url, digest, name)
+        else:
+            self.reject(url, digest)
+        return name or None
+
+    def close(self):
+        self.pool.shutdown()
+
+    # ---------------- sync ----------------
+    def download(self, url):
+        response = requests.get(url, headers=HEADERS, timeout=TIMEOUT, stream=True)
+        if response.status_code != 200:
+            raise Exception(f"HTTP {response.status_code}")
+        if int(response.headers.get("Content-Length") or 0) > MAX_IMAGE_BYTES:
+            response.close()
+            return None
+        # chunked / header-less responses are capped while they are read
+        data = bytearray()
+        for chunk in response.iter_content(FETCH_CHUNK):
+            data += chunk
+            if len(data) > MAX_IMAGE_BYTES:
+                response.close()
+                return None
+        return bytes(data)
+
+    def fetch_all(self, urls):
+        """
+        Resolves a page's image URLs to filenames (None = no image),
+        downloading and saving the unknown ones in parallel.
+        """
+        names = {}
+        todo = []
+        for url in dict.fromkeys(urls):
+            name = self.known(url)
+            if name is not None:
+                names[url] = name or None
+            elif too_small_by_url(url):
+                self.reject(url)
+                names[url] = None
+            else:
+                todo.append(url)
+
+        def get(url):
+            data = self.download(url)
+            return (data, *inspect_image(data)) if data is not None else (None, None, False)
+
+        downloads = list(self.pool.map(lambda u: self._safe(get, u), todo))
+
+        new = {}   # sha1 -> (bytes, urls with that content)
+        for url, result in zip(todo, downloads):
+            names[url] = None
+            if result is None:
+                self.stats["failed"] += 1
+                continue
+            data, digest, ok = result
+            if not ok:
+                self.reject(url, digest)
+                continue
+            name = self.frontier.image_for_hash(digest)
+            if name:
+                self.stats["hash_hits"] += 1
+                self.frontier.add_image(url, digest, name)
+                names[url] = name
+            elif digest in new:
+                self.stats["hash_hits"] += 1
+                new[digest][1].append(url)
+            else:
+                new[digest] = (data, [url])
+
+        jobs = {digest: self.pool.submit(save_image, data, self.next_image_id())
+                for digest, (data, _) in new.items()}
+        for digest, job in jobs.items():
+            first, *rest = new[digest][1]
+            name = names[first] = self.stored(first, digest, self._safe(job.result))
+            for url in rest:
+                names[url] = name
+                self.frontier.add_image(url, digest, name)
+        return [names[url] for url in urls]
+
+    @staticmethod
+    def _safe(fn, *args):
+        try:
+            return fn(*args)
+        except Exception:
+            return None
+
+    # ---------------- async ----------------
+    async def get(self, session, limiter, url):
+        """
+        Returns the filename for one image URL, or None. Concurrent requests
+        for the same URL or the same content share one download / file.
+        """
+        name = await self.db.call(self.frontier.image_for, url)
+        if name is not None:
+            self.stats["url_hits"] += 1
+            return name or None
+        if url in self.by_url:
+            self.stats["url_hits"] += 1
+            return await asyncio.shield(self.by_url[url])
+
+        future = asyncio.get_running_loop().create_future()
+        self.by_url[url] = future
+        try:
+            name = await self._fetch(session, limiter, url)
+        except Exception:
+            # transient failure: not recorded, a later page may retry
+            self.stats["failed"] += 1
+            name = None
+        finally:
+            del self.by_url[url]
+            future.set_result(name)
+        return name
+
+    async def _fetch(self, session, limiter, url):
+        if too_small_by_url(url):
+            return await self._record(url, None, None)
+
+        data = await fetch(session, limiter, url, MAX_IMAGE_BYTES)
+        if data is None:
+            return await self._record(url, None, None)
+
+        loop = asyncio.get_running_loop()
+        digest, ok = await loop.run_in_executor(self.pool, inspect_image, data)
+        if not ok:
+            return await self._record(url, digest, None)
+
+        name = await self.db.call(self.frontier.image_for_hash, digest)
+        if name is None and digest in self.by_hash:
+            name = await asyncio.shield(self.by_hash[digest])
+        if name is not None:
+            self.stats["hash_hits"] += 1
+            await self.db.call(self.frontier.add_image, url, digest, name)
+            return name
+
+        future = loop.create_future()
+        self.by_hash[digest] = future
+        try:
+            image_id = take_image_id()
+            await self.db.call(self.frontier.set_counter, "image_count", image_count)
+            # PIL decode + JPEG encode is CPU work, keep it off the event loop
+            name = await loop.run_in_executor(self.pool, save_image, data, image_id)
+        except Exception:
+            name = None
+        finally:
+            del self.by_hash[digest]
+            future.set_result(name)
+        if name:
+            self.stats["stored"] += 1
+        return await self._record(url, digest, name)
+
+    async def _record(self, url, digest, name):
+        # async counterpart of stored() / reject()
+        if not name:
+            self.stats["rejected"] += 1
+        await self.db.call(self.frontier.add_image, url, digest, name)
+        return name or None
+
 
-    return title
+# ---------------- SCRAPE PAGE ----------------
+def extract_content(url, page_id, images, domain=allowed_domain):
+    """
+    Fetches a page once and returns (title, links).
+    """
+    response = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
+    if response.status_code != 200:
+        raise Exception(f"HTTP {response.status_code}")
 
+    title, blocks, links = parse_page(response.content, url, domain)
 
-# ---------------- EXTRACT LINKS ----------------
-def extract_links(url):
-    links = set()
+    image_blocks = [b for b in blocks if b["type"] == "image"]
+    names = iter(images.fetch_all([b.pop("src") for b in image_blocks]))
 
-    try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
-        soup = BeautifulSoup(response.content, "html.parser")
+    content_blocks = []
+    for block in blocks:
+        if block["type"] == "image":
+            img_name = next(names)
+            if not img_name:
+                continue
+            block["filename"] = img_name
+        content_blocks.append(block)
 
-        for a in soup.find_all("a", href=True):
-            href = a["href"]
-            full_url = urljoin(url, href)
-            parsed = urlparse(full_url)
+    write_meta(page_id, url, title, content_blocks)
+    return title, links
 
-            if parsed.netloc == allowed_domain and parsed.scheme.startswith("http"):
-                if "/wiki/" in parsed.path and ":" not in parsed.path.split("/wiki/")[-1]:
-                    links.add(full_url)
 
-    except:
-        pass
+# ---------------- FRONTIER ----------------
+def take_image_id():
+    global image_count
+    image_id = image_count
+    image_count += 1
+    return image_id
 
-    return links
 
+def restore_counters(frontier):
+    global page_count, image_count
+    page_count = frontier.get_counter("page_count", page_count)
+    image_count = frontier.get_counter("image_count", image_count)
 
-# ---------------- BFS CRAWLER ----------------
-def bfs_crawl(start_url, max_pages):
-    global page_count
 
-    visited = set()
-    queue = deque([start_url])
+def save_counters(frontier):
+    frontier.set_counter("page_count", page_count)
+    frontier.set_counter("image_count", image_count)
 
-    with tqdm(total=max_pages, desc="Crawling Wikipedia") as pbar:
-        while queue and page_count <= max_pages:
-            current = queue.popleft()
 
-            if current in visited:
-                continue
+# ---------------- BFS CRAWLER ----------------
+def bfs_crawl(start_url, max_pages, frontier, domain=allowed_domain, image_workers=IMAGE_WORKERS):
+    global page_count
+
+    restore_counters(frontier)
+    images = ImageStore(frontier, image_workers)
+    frontier.add([start_url])
+    done = frontier.count(Frontier.DONE)
 
-            visited.add(current)
+    with tqdm(total=max_pages, initial=done, desc="Crawling Wikipedia") as pbar:
+        while done < max_pages:
+            current = frontier.pop()
+            if current is None:
+                break
 
             try:
-                title = extract_content(current, page_count)
+                title, links = extract_content(current, page_count, images, domain)
                 pbar.set_description(f"Scraped: {title[:50]}")
                 pbar.update(1)
                 page_count += 1
+                done += 1
 
             except Exception as e:
                 print(f"[!] Failed: {current} ({e})")
+                frontier.failed(current)
                 continue
 
-            for link in extract_links(current):
-                if link not in visited:
-                    queue.append(link)
+            # links and counters first: a crash before done() only refetches the page
+            frontier.add(links)
+            save_counters(frontier)
+            frontier.done(current)
+
+    images.close()
+    print(f"Images: {images.stats}")
+
+
+# ---------------- ASYNC CRAWLER ----------------
+class FrontierThread:
+    """
+    Runs the async crawl's Frontier calls on one dedicated thread, so SQLite
+    commits never block the event loop. Calls run in the order they were
+    made: a counter is never overwritten by an older value, and the
+    connection is only ever used by one thread at a time.
+    """
+
+    def __init__(self):
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="frontier")
+
+    async def call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    def close(self):
+        self.pool.shutdown()
+
+
+class HostLimiter:
+    """
+    Caps concurrent requests and request rate per host.
+    """
+
+    def __init__(self, concurrency=PER_HOST_CONCURRENCY, rate=PER_HOST_RATE):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.semaphores = defaultdict(lambda: asyncio.Semaphore(concurrency))
+        self.next_slot = defaultdict(float)
+
+    @asynccontextmanager
+    async def slot(self, url):
+        host = urlparse(url).netloc
+        async with self.semaphores[host]:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            start = max(now, self.next_slot[host])
+            self.next_slot[host] = start + self.interval
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+async def fetch(session, limiter, url, max_bytes=None):
+    """
+    Returns the response body, or None if it is larger than max_bytes:
+    checked against Content-Length before reading, and against the bytes
+    read so far for chunked / header-less responses.
+    """
+    async with limiter.slot(url):
+        async with session.get(url) as response:
+            if response.status != 200:
+                raise Exception(f"HTTP {response.status}")
+            if not max_bytes:
+                return await response.read()
+            if (response.content_length or 0) > max_bytes:
+                return None
+            data = bytearray()
+            async for chunk in response.content.iter_chunked(FETCH_CHUNK):
+                data += chunk
+                if len(data) > max_bytes:
+                    return None
+            return bytes(data)
+
+
+async def crawl_page(session, limiter, images, url, page_id, domain):
+    """
+    Fetches a page once, stores its content and images, returns (title, links).
+    """
+    html = await fetch(session, limiter, url)
+    title, blocks, links = await asyncio.to_thread(parse_page, html, url, domain)
+
+    jobs = [images.get(session, limiter, b.pop("src")) for b in blocks if b["type"] == "image"]
+    names = iter(await asyncio.gather(*jobs))
+
+    content_blocks = []
+    for block in blocks:
+        if block["type"] == "image":
+            img_name = next(names)
+            if not img_name:
+                continue
+            block["filename"] = img_name
+        content_blocks.append(block)
+
+    await asyncio.to_thread(write_meta, page_id, url, title, content_blocks)
+    return title, links
+
+
+async def async_crawl(start_url, max_pages, frontier, domain=None, workers=WORKERS,
+                      per_host=PER_HOST_CONCURRENCY, rate=PER_HOST_RATE, image_workers=IMAGE_WORKERS):
+    """
+    Concurrent BFS crawl with a bounded worker pool and one shared
+    HTTP session. Returns crawl statistics (pages, images, pages/s).
+    """
+    domain = domain or urlparse(start_url).netloc
+    db = FrontierThread()
+    await db.call(restore_counters, frontier)
+    await db.call(frontier.add, [start_url])
+
+    first_image = image_count
+    done = await db.call(frontier.count, Frontier.DONE)
+    budget = max_pages - done
+    pages = 0
+    active = 0
+
+    limiter = HostLimiter(per_host, rate)
+    images = ImageStore(frontier, image_workers, db)
+    connector = aiohttp.TCPConnector(limit=workers * 2, limit_per_host=per_host)
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT)
+    pbar = tqdm(total=max_pages, initial=done, desc="Crawling Wikipedia")
+
+    async def worker():
+        global page_count
+        nonlocal budget, pages, active
+
+        while budget > 0:
+            # taken before awaiting the pop, so workers cannot overshoot max_pages
+            budget -= 1
+            active += 1
+            url = await db.call(frontier.pop)
+            if url is None:
+                budget += 1
+                active -= 1
+                if active == 0:
+                    return
+                # other pages are still in flight and may queue more links
+                await asyncio.sleep(0.05)
+                continue
+
+            # Reserve the page id up front; a failed page leaves a gap
+            page_id = page_count
+            page_count += 1
+            await db.call(frontier.set_counter, "page_count", page_count)
+
+            try:
+                title, links = await crawl_page(session, limiter, images, url, page_id, domain)
+            except Exception as e:
+                budget += 1
+                print(f"[!] Failed: {url} ({e})")
+                await db.call(frontier.failed, url)
+                continue
+            finally:
+                active -= 1
+
+            pages += 1
+            pbar.set_description(f"Scraped: {title[:50]}")
+            pbar.update(1)
+
+            await db.call(frontier.add, links)
+            await db.call(save_counters, frontier)
+            await db.call(frontier.done, url)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(headers=HEADERS, connector=connector, timeout=timeout) as session:
+        await asyncio.gather(*(worker() for _ in range(workers)))
+    elapsed = time.perf_counter() - started
+    pbar.close()
+    images.close()
+    db.close()
+
+    stats = {
+        "pages": pages,
+        "images": image_count - first_image,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(pages / elapsed, 2) if elapsed else 0.0,
+        "image_dedup": images.stats,
+    }
+    print(f"Crawled {stats['pages']} pages, {stats['images']} images "
+          f"in {stats['seconds']}s ({stats['pages_per_sec']} pages/s)")
+    print(f"Images: {images.stats}")
+    return stats
 
 
 # ---------------- RUN ----------------
 if __name__ == "__main__":
-    bfs_crawl(start_url, max_pages)
+    parser = argparse.ArgumentParser(description="Wikipedia BFS crawler")
+    parser.add_argument("--start-url", default=start_url)
+    parser.add_argument("--max-pages", type=int, default=max_pages)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--per-host", type=int, default=PER_HOST_CONCURRENCY,
+                        help="concurrent requests per host")
+    parser.add_argument("--rate", type=float, default=PER_HOST_RATE,
+                        help="requests per second per host (0 = unlimited)")
+    parser.add_argument("--image-workers", type=int, default=IMAGE_WORKERS,
+                        help="threads decoding / saving images")
+    parser.add_argument("--sync", action="store_true",
+                        help="use the single-threaded requests crawler")
+    parser.add_argument("--frontier", default=FRONTIER_PATH,
+                        help="SQLite file holding the crawl frontier")
+    parser.add_argument("--fresh", action="store_true",
+                        help="discard the saved frontier instead of resuming")
+    parser.add_argument("--format", choices=("json", "jsonl"), default=OUTPUT_FORMAT,
+                        help="one JSON file per page, or sharded JSONL")
+    parser.add_argument("--gzip", action="store_true", help="gzip JSONL shards")
+    parser.add_argument("--shard-pages", type=int, default=SHARD_PAGES,
+                        help="pages per JSONL shard")
+    args = parser.parse_args()
+
+    if args.format == "jsonl":
+        page_writer = ShardWriter(output_dir, compress=args.gzip, shard_pages=args.shard_pages)
+
+    if args.fresh:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.frontier + suffix):
+                os.remove(args.frontier + suffix)
+
+    frontier = Frontier(args.frontier)
+    try:
+        if args.sync:
+            bfs_crawl(args.start_url, args.max_pages, frontier, urlparse(args.start_url).netloc,
+                      args.image_workers)
+        else:
+            asyncio.run(async_crawl(args.start_url, args.max_pages, frontier,
+                                    workers=args.workers, per_host=args.per_host, rate=args.rate,
+                                    image_workers=args.image_workers))
+    finally:
+        frontier.close()
+        if page_writer is not None:
+            page_writer.close()
@@ -1,12 +1,15 @@
 import os
 import json
 import time
+import argparse
 import requests
 from io import BytesIO
 from PIL import Image
 from tqdm import tqdm
 from playwright.sync_api import sync_playwright
 
+from page_store import ShardWriter
+
 # ---------------- CONFIG ----------------
 BASE_URL = "https://www.daraz.com.np/catalog/?q=mens+shoes&page="
 MAX_PAGES = 5
@@ -15,6 +18,8 @@ OUT_DIR = "daraz_shoes"
 IMG_DIR = os.path.join(OUT_DIR, "images")
 os.makedirs(IMG_DIR, exist_ok=True)
 
+SOURCE = "daraz"
+
 # ---------------- IMAGE SAVE ----------------
 def save_image(url, idx):
     try:
@@ -26,10 +31,39 @@ def save_image(url, idx):
     except:
         return None
 
+# ---------------- JSONL ----------------
+def product_page(product_id, product, listing_url):
+    """
+    One product as a page record in the same shape crawler.py writes,
+    so embed.py --data-dir daraz_shoes can index it.
+    """
+    content = [{
+        "type": "text",
+        "section": "product",
+        "content": f"{product['title']} (price: {product['price']})"
+    }]
+    if product["image"]:
+        content.append({
+            "type": "image",
+            "section": "product",
+            "filename": product["image"],
+            "caption": product["title"]
+        })
+
+    return {
+        "page_id": product_id,
+        "url": product["url"] or f"{listing_url}#{product_id}",
+        "title": product["title"],
+        "source": SOURCE,
+        "content": content
+    }
+
 # ---------------- SCRAPER ----------------
-def scrape():
+def scrape(output_format="json", compress=False):
     all_pages = []
     img_id = 1
+    # jsonl: products are appended as they are scraped instead of kept in memory
+    writer = ShardWriter(OUT_DIR, compress=compress) if output_format == "jsonl" else None
 
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
@@ -72,29 +106,41 @@ def scrape():
                         img_name = save_image(image, img_id)
                         img_id += 1
 
-                        products.append({
+                        product = {
                             "title": name,
                             "price": price,
                             "url": link,
                             "image": img_name
-                        })
-
-            all_pages.append({
-                "page": page_num,
-                "url": url,
-                "product_count": len(products),
-                "products": products
-            })
+                        }
+                        if writer is not None:
+                            writer.write(product_page(img_id - 1, product, url))
+                        products.append(product)
+
+            if writer is None:
+                all_pages.append({
+                    "page": page_num,
+                    "url": url,
+                    "product_count": len(products),
+                    "products": products
+                })
 
             time.sleep(2)
 
         browser.close()
 
-    with open(os.path.join(OUT_DIR, "daraz_shoes.json"), "w", encoding="utf-8") as f:
-        json.dump(all_pages, f, indent=2, ensure_ascii=False)
+    if writer is not None:
+        writer.close()
+    else:
+        with open(os.path.join(OUT_DIR, "daraz_shoes.json"), "w", encoding="utf-8") as f:
+            json.dump(all_pages, f, indent=2, ensure_ascii=False)
 
     print("✅ Scraping completed successfully")
 
 # ---------------- RUN ----------------
 if __name__ == "__main__":
-    scrape()
+    parser = argparse.ArgumentParser(description="Daraz product scraper")
+    parser.add_argument("--format", choices=("json", "jsonl"), default="json",
+                        help="one daraz_shoes.json, or sharded JSONL under daraz_shoes/pages")
+    parser.add_argument("--gzip", action="store_true", help="gzip JSONL shards")
+    args = parser.parse_args()
+    scrape(args.format, args.gzip)
@@ -1,96 +1,138 @@
 import os
 import json
+import shutil
+import hashlib
+import time
+import argparse
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
 import numpy as np
 import faiss
-import torch
 from PIL import Image
-from transformers import CLIPProcessor, CLIPModel, logging
+from tqdm import tqdm
+from transformers import logging
+
+from backend import index_factory
+from backend.encoders import ENCODER_BACKENDS, load_encoder
+from backend.filters import build_filters, filter_paths
+from backend.lexical import bm25_paths, build_bm25
+from backend.meta_store import MetaStore, MetaStoreWriter, open_meta, store_path, write_meta_store
+from page_store import iter_pages
 
 # -------------------- Silence HF noise --------------------
 logging.set_verbosity_error()
 
 # -------------------- Paths --------------------
 DATA_DIR = "wikipedia_scrape"
-TEXT_META_DIR = os.path.join(DATA_DIR, "meta")
 IMAGE_DIR = os.path.join(DATA_DIR, "images")
+DEFAULT_SOURCE = "wikipedia"   # pages written before crawlers stamped "source"
 INDEX_DIR = "indices1"
+CHECKPOINT_DIR = os.path.join(INDEX_DIR, "checkpoint")
 os.makedirs(INDEX_DIR, exist_ok=True)
 
-# -------------------- Device --------------------
-device = "cuda" if torch.cuda.is_available() else "cpu"
+# -------------------- Config --------------------
+DIM = 512
+BATCH_SIZE = 32
+INDEX_TYPE = "flat"   # see backend/index_factory.INDEX_TYPES
+MODEL_NAME = "openai/clip-vit-base-patch32"
+ENCODER_BACKEND = "torch"   # see backend/encoders.ENCODER_BACKENDS
+# CLIP reads at most 77 tokens, so longer text blocks are embedded as
+# overlapping windows of CHUNK_WORDS words (~1.3 BPE tokens per word).
+# Every window is its own vector; search pools them back per block.
+CHUNK_WORDS = 50
+CHUNK_OVERLAP = 15
 
 # -------------------- Load CLIP --------------------
-clip_model = CLIPModel.from_pretrained(
-    "openai/clip-vit-base-patch32"
-).to(device)
-clip_model.eval()
+# Loaded by load_clip() from main(), so the backend can be picked on the command line
+encoder = None
+encoder_backend = ENCODER_BACKEND
 
-clip_processor = CLIPProcessor.from_pretrained(
-    "openai/clip-vit-base-patch32"
-)
+def load_clip(backend=ENCODER_BACKEND, threads=None):
+    global encoder, encoder_backend
+    encoder = load_encoder(backend, MODEL_NAME, threads)
+    encoder_backend = backend
 
 # -------------------- Utils --------------------
-def normalize(vec: np.ndarray) -> np.ndarray:
-    n = np.linalg.norm(vec)
-    return vec if n == 0 else vec / n
+def embed_texts_clip(texts: list) -> np.ndarray:
+    return encoder.embed_texts(texts)      # (B, 512), L2-normalized
 
-def extract_tensor(output):
-    """
-    Handles ALL HF CLIP return types safely.
-    """
-    if hasattr(output, "pooler_output"):
-        return output.pooler_output
-    if torch.is_tensor(output):
-        return output
-    raise RuntimeError(f"Unknown CLIP output type: {type(output)}")
+def embed_images_clip(images: list) -> np.ndarray:
+    return encoder.embed_images(images)    # (B, 512), L2-normalized
 
 def embed_text_clip(text: str) -> np.ndarray:
-    inputs = clip_processor(
-        text=[text],
-        return_tensors="pt",
-        padding=True,
-        truncation=True
-    ).to(device)
-
-    with torch.no_grad():
-        out = clip_model.get_text_features(**inputs)
-
-    tensor = extract_tensor(out)          # (1, 512)
-    vec = tensor[0].detach().cpu().numpy().astype("float32")
-    return normalize(vec)
-
-def embed_image_clip(image_path: str) -> np.ndarray:
-    image = Image.open(image_path).convert("RGB")
-
-    inputs = clip_processor(
-        images=image,
-        return_tensors="pt"
-    ).to(device)
-
-    with torch.no_grad():
-        out = clip_model.get_image_features(**inputs)
-
-    tensor = extract_tensor(out)           # (1, 512)
-    vec = tensor[0].detach().cpu().numpy().astype("float32")
-    return normalize(vec)
-
-# -------------------- Embed --------------------
-text_embeddings = []
-text_metadata = []
+    return embed_texts_clip([text])[0]
 
-image_embeddings = []
-image_metadata = []
+# -------------------- Chunking --------------------
+# Set from the command line by main() (and by every --workers process)
+chunk_words = CHUNK_WORDS
+chunk_overlap = CHUNK_OVERLAP
 
-meta_files = [f for f in os.listdir(TEXT_META_DIR) if f.endswith(".json")]
-print(f"Processing {len(meta_files)} metadata files...")
+def set_chunking(words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    global chunk_words, chunk_overlap
+    if words and not 0 <= overlap < words:
+        raise ValueError(f"--chunk-overlap must be in [0, {words}), got {overlap}")
+    chunk_words, chunk_overlap = words, overlap if words else 0
 
-for meta_file in meta_files:
-    with open(os.path.join(TEXT_META_DIR, meta_file), "r", encoding="utf-8") as f:
-        page_meta = json.load(f)
+def chunk_text(text, words=None, overlap=None):
+    """
+    Splits text into windows of `words` words, each repeating the last
+    `overlap` words of the one before. Short text (or words=0) is one window.
+    """
+    words = chunk_words if words is None else words
+    overlap = chunk_overlap if overlap is None else overlap
+    tokens = text.split()
+    if not words or len(tokens) <= words:
+        return [text]
+
+    windows = []
+    for start in range(0, len(tokens), words - overlap):
+        windows.append(" ".join(tokens[start:start + words]))
+        if start + words >= len(tokens):
+            break
+    return windows
+
+# -------------------- Collect Blocks --------------------
+# Pages are streamed from <data dir>/pages/*.jsonl[.gz] shards and the older
+# <data dir>/meta/*.json files (see page_store.py), in a stable order so that
+# batch boundaries (and therefore checkpoints) do not move between runs.
+# Several data dirs (e.g. wikipedia_scrape and daraz_shoes) are read one after
+# the other. Every page is tagged with the "source" its crawler stamped, and
+# every source keeps its images in its own <data dir>/images, which the API
+# serves under /images/<source>/ (sources.json), so filenames never collide.
+SOURCES_PATH = os.path.join(INDEX_DIR, "sources.json")
+
+def page_source(page_meta):
+    return page_meta.get("source") or DEFAULT_SOURCE
+
+def iter_corpus(data_dirs, sources=None):
+    """
+    Yields (page_meta, page_hash, image_dir) for every page of every data dir.
+    Fills `sources` with source -> image dir; a source found in two data dirs
+    is an error, since its images could not be told apart.
+    """
+    sources = {} if sources is None else sources
+    for data_dir in data_dirs:
+        image_dir = os.path.join(data_dir, "images")
+        for page_meta, page_hash in iter_pages(data_dir):
+            source = page_source(page_meta)
+            if sources.setdefault(source, image_dir) != image_dir:
+                raise ValueError(f"Source {source!r} is in both {sources[source]} and {image_dir}, "
+                                 f"images of one source must live in one data dir")
+            yield page_meta, page_hash, image_dir
+
+def page_blocks(page_meta, image_dir=IMAGE_DIR):
+    """
+    Flattens one page into (metadata, payload) pairs per modality.
+    Text payloads are the block text, image payloads the image path.
+    """
+    text_items = []
+    image_items = []
 
     page_id = page_meta.get("page_id")
     title = page_meta.get("title", "")
     url = page_meta.get("url", "")
+    source = page_source(page_meta)
 
     for block in page_meta.get("content", []):
         block_type = block.get("type")
@@ -100,64 +142,753 @@ for meta_file in meta_files:
             text = block.get("content", "").strip()
             if not text:
                 continue
-            try:
-                emb = embed_text_clip(text)
-                text_embeddings.append(emb)
-                text_metadata.append({
-                    "page_id": page_id,
-                    "title": title,
-                    "url": url,
-                    "type": "text",
-                    "section": section,
-                    "text": text
-                })
-            except Exception as e:
-                print(f"[!] Failed to embed text block: {e}")
+            record = {
+                "page_id": page_id,
+                "title": title,
+                "url": url,
+                "type": "text",
+                "source": source,
+                "section": section,
+                "text": text
+            }
+            windows = chunk_text(text)
+            if len(windows) == 1:
+                text_items.append((record, text))
+                continue
+            # every window keeps the full block text for display
+            for i, window in enumerate(windows):
+                text_items.append((dict(record, window=i, windows=len(windows)), window))
 
         elif block_type == "image":
             filename = block.get("filename")
             caption = block.get("caption", "No caption")
-            img_path = os.path.join(IMAGE_DIR, filename)
+            img_path = os.path.join(image_dir, filename)
 
             if not os.path.exists(img_path):
                 print(f"[!] Missing image: {img_path}")
                 continue
 
-            try:
-                emb = embed_image_clip(img_path)
-                image_embeddings.append(emb)
-                image_metadata.append({
-                    "page_id": page_id,
-                    "title": title,
-                    "url": url,
-                    "type": "image",
-                    "section": section,
-                    "filename": filename,
-                    "caption": caption
-                })
-            except Exception as e:
-                print(f"[!] Failed to embed image {filename}: {e}")
-
-print(f"Embedded {len(text_embeddings)} text blocks and {len(image_embeddings)} images.")
+            image_items.append(({
+                "page_id": page_id,
+                "title": title,
+                "url": url,
+                "type": "image",
+                "source": source,
+                "section": section,
+                "filename": filename,
+                "caption": caption
+            }, img_path))
+
+    return text_items, image_items
+
+# -------------------- Batch Embedders --------------------
+def embed_text_batch(texts):
+    """
+    Returns (embeddings, positions of the texts that were embedded).
+    Falls back to one-by-one embedding so a single bad block
+    does not take the whole batch down with it.
+    """
+    try:
+        return embed_texts_clip(texts), np.arange(len(texts))
+    except Exception as e:
+        print(f"[!] Batch text embedding failed, retrying one by one: {e}")
+
+    vecs, ok = [], []
+    for i, text in enumerate(texts):
+        try:
+            vecs.append(embed_text_clip(text))
+            ok.append(i)
+        except Exception as e:
+            print(f"[!] Failed to embed text block: {e}")
+    return stack_or_empty(vecs), np.array(ok, dtype="int64")
+
+def embed_image_batch(paths):
+    images, ok = [], []
+    for i, path in enumerate(paths):
+        try:
+            images.append(Image.open(path).convert("RGB"))
+            ok.append(i)
+        except Exception as e:
+            print(f"[!] Failed to open image {path}: {e}")
+
+    if not images:
+        return stack_or_empty([]), np.array(ok, dtype="int64")
+
+    try:
+        return embed_images_clip(images), np.array(ok, dtype="int64")
+    except Exception as e:
+        print(f"[!] Batch image embedding failed, retrying one by one: {e}")
+
+    vecs, kept = [], []
+    for i, image in zip(ok, images):
+        try:
+            vecs.append(embed_images_clip([image])[0])
+            kept.append(i)
+        except Exception as e:
+            print(f"[!] Failed to embed image {paths[i]}: {e}")
+    return stack_or_empty(vecs), np.array(kept, dtype="int64")
+
+def stack_or_empty(vecs):
+    if not vecs:
+        return np.zeros((0, DIM), dtype="float32")
+    return np.stack(vecs).astype("float32")
+
+# -------------------- Checkpointing --------------------
+def items_fingerprint(items):
+    # batch size and encoder are added by checkpoint_fingerprint
+    h = hashlib.sha1()
+    for meta, _ in items:
+        h.update(json.dumps(meta, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+def prepare_checkpoint(ckpt_dir, fingerprint):
+    """
+    Keeps batches from a previous run only if they were produced
+    from exactly the same inputs, batch size and encoder.
+    """
+    manifest_path = os.path.join(ckpt_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("fingerprint") == fingerprint:
+            return
+        print(f"[!] Inputs changed since last run, discarding {ckpt_dir}")
+
+    shutil.rmtree(ckpt_dir, ignore_errors=True)
+    os.makedirs(ckpt_dir, exist_ok=True)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint}, f)
+
+def save_batch(path, emb, idx):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, emb=emb, idx=idx)
+    os.replace(tmp_path, path)
 
 # -------------------- FAISS --------------------
-text_embeddings = np.stack(text_embeddings).astype("float32")
-image_embeddings = np.stack(image_embeddings).astype("float32")
-
-dim = 512
-text_index = faiss.IndexFlatIP(dim)
-image_index = faiss.IndexFlatIP(dim)
+def build_index(embeddings, ids, args, by_id=False):
+    # ID-mapped so incremental runs can drop stale vectors by id
+    return index_factory.build_index(
+        embeddings, ids, args.index_type, args.nlist, args.train_size, by_id
+    )
 
-text_index.add(text_embeddings)
-image_index.add(image_embeddings)
+def read_index(name, index_dir=INDEX_DIR):
+    return faiss.read_index(os.path.join(index_dir, f"{name}.index"))
 
-faiss.write_index(text_index, os.path.join(INDEX_DIR, "text.index"))
-faiss.write_index(image_index, os.path.join(INDEX_DIR, "image.index"))
+def write_index(index, name, index_dir=INDEX_DIR):
+    path = os.path.join(index_dir, f"{name}.index")
+    faiss.write_index(index, path + ".tmp")
+    os.replace(path + ".tmp", path)
 
-with open(os.path.join(INDEX_DIR, "text_meta.json"), "w", encoding="utf-8") as f:
-    json.dump(text_metadata, f, indent=2, ensure_ascii=False)
+def keeps_vectors(args):
+    return args.keep_vectors or args.index_type in index_factory.LOSSY_TYPES
 
-with open(os.path.join(INDEX_DIR, "image_meta.json"), "w", encoding="utf-8") as f:
-    json.dump(image_metadata, f, indent=2, ensure_ascii=False)
+def write_vectors(name, embeddings, ids, n_slots, append=False):
+    """
+    Stores the original float32 vectors (row i = id i) next to a compressed
+    index so search can re-rank its candidates exactly. With append=True
+    the rows of the previous file are kept and `ids` are added.
+    """
+    path = index_factory.vectors_path(INDEX_DIR, name)
+    old = index_factory.read_vectors(INDEX_DIR, name) if append else None
+
+    out = np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype="float32", shape=(n_slots, DIM))
+    if old is not None:
+        for start in range(0, min(len(old), n_slots), 65536):
+            stop = min(start + 65536, len(old), n_slots)
+            out[start:stop] = old[start:stop]
+    if len(ids):
+        out[np.asarray(ids)] = embeddings
+    out.flush()
+    del out, old
+    os.replace(path + ".tmp", path)
+
+def drop_vectors(name):
+    path = index_factory.vectors_path(INDEX_DIR, name)
+    if os.path.exists(path):
+        os.remove(path)
+
+def read_meta(name, index_dir=INDEX_DIR):
+    """
+    Yields the existing records of `name` in id order.
+    """
+    meta = open_meta(index_dir, name)
+    if isinstance(meta, MetaStore):
+        return iter(meta)
+    return (meta[i] for i in sorted(meta))
+
+def write_meta(records, name, index_dir=INDEX_DIR):
+    # records must come in increasing id order
+    write_meta_store(store_path(index_dir, name), records)
+    drop_legacy_meta(name, index_dir)
+
+def drop_legacy_meta(name, index_dir=INDEX_DIR):
+    legacy = os.path.join(index_dir, f"{name}_meta.json")
+    if os.path.exists(legacy):
+        os.remove(legacy)
+
+# -------------------- Shards --------------------
+# --shards N splits every modality into N contiguous id ranges, served from
+# indices1/shard_NNN/ (see backend/index_factory.shard_dirs). Ids stay global
+# and new ids from incremental runs go to the last shard, so an update only
+# rewrites the last shard plus the shards that lost vectors.
+def shard_bounds(count, n_shards):
+    # first id of shards 1..n-1; shard s holds ids [bounds[s-1], bounds[s])
+    return [count * s // n_shards for s in range(1, n_shards)]
+
+def shard_of(ids, bounds):
+    return np.searchsorted(np.asarray(bounds, dtype="int64"), ids, side="right")
+
+def layout_dirs(n_shards):
+    if n_shards <= 1:
+        return [INDEX_DIR]
+    return [index_factory.shard_dir(INDEX_DIR, s) for s in range(n_shards)]
+
+def clear_other_layout(n_shards):
+    """
+    Removes what a build with a different shard count left behind, so
+    search.py never serves a mix of old and new artifacts.
+    """
+    keep = set(layout_dirs(n_shards))
+    for d in index_factory.shard_dirs(INDEX_DIR):
+        if d != INDEX_DIR and d not in keep:
+            shutil.rmtree(d, ignore_errors=True)
+    if n_shards > 1:
+        stale = [os.path.join(INDEX_DIR, f"{m}{suffix}") for m in MODALITIES
+                 for suffix in (".index", "_meta.bin", "_meta.json")]
+        stale += list(bm25_paths(INDEX_DIR, "text").values())
+        stale += [p for m in MODALITIES for p in filter_paths(INDEX_DIR, m).values()]
+        for path in stale:
+            if os.path.exists(path):
+                os.remove(path)
+
+class ShardedMetaWriter:
+    """
+    One MetaStoreWriter per shard; records are routed by id, and every
+    shard's store starts at the first id of its range.
+    """
 
-print("✅ Embedding and indexing complete.")
+    def __init__(self, paths, bounds):
+        self.writers = [MetaStoreWriter(p, base_id=lo) for p, lo in zip(paths, [0] + list(bounds))]
+        self.bounds = bounds
+
+    def add(self, record_id, record):
+        self.writers[int(shard_of(record_id, self.bounds))].add(record_id, record)
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+def write_json(path, obj, indent=None):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=indent, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+# -------------------- Incremental State --------------------
+# indices1/embed_state.json remembers, per page, the hash of its meta file
+# and the FAISS id assigned to every block, so later runs only embed
+# what changed and know exactly which vectors to drop.
+STATE_PATH = os.path.join(INDEX_DIR, "embed_state.json")
+MODALITIES = ("text", "image")
+
+def page_key(page_meta):
+    if page_meta.get("url"):
+        return page_meta["url"]
+    source = page_source(page_meta)
+    if page_meta.get("_file"):
+        # meta/*.json names repeat between data dirs; the default source keeps its old keys
+        return page_meta["_file"] if source == DEFAULT_SOURCE else f"{source}:{page_meta['_file']}"
+    return f"{source}:{page_meta.get('page_id')}"
+
+def block_keys(items, modality):
+    """
+    Content hash per block. Identical blocks on one page are told apart
+    by their occurrence number so every block keeps its own id.
+    """
+    keys, seen = [], {}
+    for meta, payload in items:
+        h = hashlib.sha1(json.dumps(meta, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        if modality == "image":
+            # filenames are reused between crawls, so hash the pixels too
+            with open(payload, "rb") as f:
+                h.update(hashlib.sha1(f.read()).digest())
+        digest = h.hexdigest()
+        seen[digest] = seen.get(digest, 0) + 1
+        keys.append(f"{digest}:{seen[digest]}")
+    return keys
+
+def load_state():
+    if not os.path.exists(STATE_PATH):
+        return None
+    with open(STATE_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def fresh_state(index_type=INDEX_TYPE, encoder=ENCODER_BACKEND):
+    return {
+        "index_type": index_type, "encoder": encoder, "chunking": [chunk_words, chunk_overlap],
+        "next_id": {m: 0 for m in MODALITIES}, "pages": {},
+    }
+
+# -------------------- Full Build --------------------
+# The corpus is streamed twice and never held in memory:
+#   1. scan_pages: block keys for embed_state.json and the block count
+#   2. embed_stream, per modality: blocks are embedded batch by batch and each
+#      batch goes straight into {name}_vectors.npy (a memmap, row = id) and the
+#      metadata store; the index is then built from the memmap in chunks.
+# The id of a block is its position in the stream; blocks that fail to embed
+# leave an empty id, which the metadata store and the index both allow.
+def scan_pages(data_dirs, state, sources=None):
+    """
+    First pass. Fills state["pages"] with block key -> id (and `sources`,
+    see iter_corpus) and returns the number of blocks and an input
+    fingerprint per modality.
+    """
+    counts = {m: 0 for m in MODALITIES}
+    digests = {m: hashlib.sha1() for m in MODALITIES}
+
+    for page_meta, page_hash, image_dir in iter_corpus(data_dirs, sources):
+        page_items = dict(zip(MODALITIES, page_blocks(page_meta, image_dir)))
+        entry = {"hash": page_hash}
+        for m in MODALITIES:
+            keys = block_keys(page_items[m], m)
+            entry[m] = {k: counts[m] + i for i, k in enumerate(keys)}
+            counts[m] += len(keys)
+            for k in keys:
+                digests[m].update(k.encode())
+        state["pages"][page_key(page_meta)] = entry
+
+    return counts, {m: digests[m].hexdigest() for m in MODALITIES}
+
+def iter_items(data_dirs, modality, page_keys):
+    """
+    Second pass: the (metadata, payload) blocks of one modality, in the same
+    order scan_pages numbered them.
+    """
+    pages = iter_corpus(data_dirs)
+    for expected in page_keys:
+        page_meta, _, image_dir = next(pages, (None, None, None))
+        if page_meta is None or page_key(page_meta) != expected:
+            raise RuntimeError(f"Pages under {', '.join(data_dirs)} changed while embedding, run embed.py again")
+        yield from page_blocks(page_meta, image_dir)[MODALITIES.index(modality)]
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def payload_digest(payload):
+    # 8 bytes per distinct text / image path instead of the payload itself
+    return int.from_bytes(hashlib.sha1(payload.encode("utf-8")).digest()[:8], "big")
+
+def embed_stream(name, items, n_items, embed_batch, batch_size, checkpoint_dir, fingerprint,
+                 vectors_out, meta_out=None, worker=0, n_workers=1):
+    """
+    Embeds `items` (position = id) one batch at a time, writing each finished
+    batch to vectors_out[id] and meta_out before the next one is read, so
+    memory holds a single batch. Finished batches are also checkpointed so an
+    interrupted run resumes. Every distinct payload goes through CLIP once;
+    repeats copy the vector of their first occurrence.
+    With n_workers > 1 only batches b % n_workers == worker are embedded.
+    Returns the ids that were embedded.
+    """
+    ckpt_dir = os.path.join(checkpoint_dir, name)
+    if n_workers == 1:
+        prepare_checkpoint(ckpt_dir, checkpoint_fingerprint(fingerprint, batch_size))
+
+    first = {}   # payload digest -> id of its first occurrence, -1 if it failed
+    kept = []
+    resumed = duplicates = 0
+    n_batches = (n_items + batch_size - 1) // batch_size
+
+    progress = tqdm(batched(items, batch_size), total=n_batches, position=worker,
+                    desc=f"Embedding {name}" + (f" [{worker}]" if n_workers > 1 else ""))
+    for b, batch in enumerate(progress):
+        if b % n_workers != worker:
+            continue
+        start = b * batch_size
+        digests = [payload_digest(payload) for _, payload in batch]
+        path = os.path.join(ckpt_dir, f"batch_{b:06d}.npz")
+
+        if os.path.exists(path):
+            with np.load(path) as data:
+                emb, idx = data["emb"], data["idx"]
+            resumed += 1
+        else:
+            todo = {}   # digest -> batch position of its first occurrence in this batch
+            for i, d in enumerate(digests):
+                if d not in first and d not in todo:
+                    todo[d] = i
+            positions = list(todo.values())
+            new_emb, ok = embed_batch([batch[i][1] for i in positions])
+            fresh = {digests[positions[p]]: v for p, v in zip(ok, new_emb)}
+
+            rows, idx = [], []
+            for i, d in enumerate(digests):
+                if d in fresh:
+                    rows.append(fresh[d])
+                elif first.get(d, -1) >= 0:
+                    rows.append(vectors_out[first[d]])
+                else:
+                    continue
+                idx.append(start + i)
+            emb, idx = stack_or_empty(rows), np.array(idx, dtype="int64")
+            save_batch(path, emb, idx)
+
+        if len(idx):
+            vectors_out[idx] = emb
+        done = set(idx.tolist())
+        for i, ((meta, _), d) in enumerate(zip(batch, digests)):
+            if d in first:
+                duplicates += 1
+            if start + i in done:
+                if first.get(d, -1) < 0:
+                    first[d] = start + i
+                if meta_out is not None:
+                    record = dict(meta)
+                    record["id"] = start + i
+                    meta_out.add(start + i, record)
+                kept.append(start + i)
+            else:
+                first.setdefault(d, -1)
+
+    if resumed:
+        print(f"Resumed {resumed}/{n_batches} {name} batches from checkpoint.")
+    if duplicates:
+        print(f"{duplicates} duplicate {name} payloads reused an existing vector.")
+    return np.array(kept, dtype="int64")
+
+def embed_items(name, items, embed_batch, batch_size, checkpoint_dir):
+    """
+    embed_stream for an in-memory list of (metadata, payload), as collected
+    by an incremental run, so it gets the same batching, checkpoints and
+    payload dedup as a full build. Returns (embeddings, metadata, positions)
+    of the items that embedded, in item order.
+    """
+    vectors = np.zeros((len(items), DIM), dtype="float32")
+    kept = embed_stream(name, items, len(items), embed_batch, batch_size, checkpoint_dir,
+                        items_fingerprint(items), vectors)
+    return vectors[kept], [dict(items[i][0]) for i in kept], kept.tolist()
+
+def checkpoint_fingerprint(fingerprint, batch_size):
+    # batch boundaries do not depend on the worker count, so checkpoints are shared
+    return f"{fingerprint}:batch_size={batch_size}:encoder={encoder_backend}"
+
+# -------------------- Multi-process Embedding --------------------
+# --workers N splits the batches of each modality round-robin over N spawned
+# processes, each with its own CLIP copy and a fixed number of intra-op
+# threads (pinned to its own cores where the OS allows). Workers write their
+# vectors into the shared memmap at row = id and only return the ids they
+# kept; the parent then writes metadata in id order. Ids are stream
+# positions, so the merged artifacts do not depend on the worker count.
+def worker_cores(worker, threads):
+    if not hasattr(os, "sched_getaffinity"):
+        return None
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) < (worker + 1) * threads:
+        return None
+    return cores[worker * threads:(worker + 1) * threads]
+
+def embed_worker(worker, n_workers, threads, m, args, page_keys, count, fingerprint, spool):
+    cores = worker_cores(worker, threads)
+    if cores:
+        os.sched_setaffinity(0, cores)
+    load_clip(args.encoder, threads)
+    set_chunking(args.chunk_words, args.chunk_overlap)
+
+    embedders = {"text": embed_text_batch, "image": embed_image_batch}
+    vectors = np.load(spool, mmap_mode="r+")
+    kept = embed_stream(
+        m, iter_items(args.data_dir, m, page_keys), count, embedders[m],
+        args.batch_size, args.checkpoint_dir, fingerprint, vectors, None, worker, n_workers
+    )
+    vectors.flush()
+    return kept
+
+def embed_parallel(m, args, page_keys, count, fingerprint, spool, meta_out):
+    n_workers = args.workers
+    threads = args.threads or max(1, (os.cpu_count() or 1) // n_workers)
+    print(f"Embedding {m} with {n_workers} processes x {threads} threads.")
+
+    # the checkpoint directory is reset here, before any worker writes to it
+    prepare_checkpoint(os.path.join(args.checkpoint_dir, m), checkpoint_fingerprint(fingerprint, args.batch_size))
+    os.environ["OMP_NUM_THREADS"] = str(threads)   # inherited by the spawned workers
+
+    with ProcessPoolExecutor(n_workers, mp_context=mp.get_context("spawn")) as pool:
+        jobs = [
+            pool.submit(embed_worker, w, n_workers, threads, m, args, page_keys, count, fingerprint, spool)
+            for w in range(n_workers)
+        ]
+        kept = np.sort(np.concatenate([job.result() for job in jobs]))
+
+    # metadata in id order, independent of which worker embedded what
+    kept_set = set(kept.tolist())
+    for pos, (meta, _) in enumerate(iter_items(args.data_dir, m, page_keys)):
+        if pos in kept_set:
+            record = dict(meta)
+            record["id"] = pos
+            meta_out.add(pos, record)
+    return kept
+
+def full_build(args):
+    state = fresh_state(args.index_type, args.encoder)
+    sources = {}
+    counts, fingerprints = scan_pages(args.data_dir, state, sources)
+    page_keys = list(state["pages"])
+
+    print(f"Read {len(page_keys)} pages from {', '.join(args.data_dir)} (sources: {', '.join(sources)}): "
+          f"{counts['text']} text blocks and {counts['image']} images.")
+
+    n_shards = args.shards or 1
+    dirs = layout_dirs(n_shards)
+    for d in dirs:
+        os.makedirs(d, exist_ok=True)
+    state["shards"] = n_shards
+    state["shard_bounds"] = {}
+
+    embedders = {"text": embed_text_batch, "image": embed_image_batch}
+    throughput = {}
+    index_seconds = {}
+    for m in MODALITIES:
+        spool = index_factory.vectors_path(INDEX_DIR, m) + ".tmp"
+        vectors = np.lib.format.open_memmap(spool, mode="w+", dtype="float32", shape=(counts[m], DIM))
+        bounds = shard_bounds(counts[m], n_shards)
+        meta_out = ShardedMetaWriter([store_path(d, m) for d in dirs], bounds)
+
+        started = time.perf_counter()
+        if args.workers > 1:
+            vectors.flush()
+            kept = embed_parallel(m, args, page_keys, counts[m], fingerprints[m], spool, meta_out)
+        else:
+            kept = embed_stream(
+                m, iter_items(args.data_dir, m, page_keys), counts[m], embedders[m],
+                args.batch_size, args.checkpoint_dir, fingerprints[m], vectors, meta_out
+            )
+        elapsed = time.perf_counter() - started
+        throughput[m] = round(counts[m] / elapsed, 2) if elapsed else 0.0
+        print(f"Embedded {len(kept)}/{counts[m]} {m} blocks in {elapsed:.1f}s ({throughput[m]} blocks/s).")
+
+        started = time.perf_counter()
+        shard = shard_of(kept, bounds)
+        for s, d in enumerate(dirs):
+            write_index(build_index(vectors, kept[shard == s], args, by_id=True), m, d)
+        meta_out.close()
+        for d in dirs:
+            drop_legacy_meta(m, d)
+            build_filters(read_meta(m, d), d, m)
+            if m == "text":
+                build_bm25(read_meta(m, d), d, m)
+        index_seconds[m] = round(time.perf_counter() - started, 3)
+        print(f"Built {m} index, filters{' and BM25' if m == 'text' else ''} in {index_seconds[m]:.1f}s.")
+        state["shard_bounds"][m] = bounds
+
+        vectors.flush()
+        del vectors
+        if keeps_vectors(args):
+            os.replace(spool, index_factory.vectors_path(INDEX_DIR, m))
+        else:
+            os.remove(spool)
+            drop_vectors(m)
+
+        # blocks that failed to embed have no id
+        kept_ids = set(kept.tolist())
+        for entry in state["pages"].values():
+            entry[m] = {k: i for k, i in entry[m].items() if i in kept_ids}
+        state["next_id"][m] = counts[m]
+
+    clear_other_layout(n_shards)
+    write_json(SOURCES_PATH, sources, indent=2)
+    write_json(STATE_PATH, state)
+    # one machine-readable line, parsed by benchmarks/embed_scaling.py and benchmarks/end_to_end.py
+    print("Throughput: " + json.dumps({"workers": args.workers, "blocks_per_sec": throughput, "blocks": counts,
+                                       "index_build_s": index_seconds}))
+
+# -------------------- Incremental Build --------------------
+def incremental_build(args):
+    state = load_state()
+    if state is None:
+        print("[!] No embed_state.json yet, doing a full build first.")
+        return full_build(args)
+    if state.get("index_type", "flat") != args.index_type:
+        print(f"[!] Index type changed to {args.index_type}, doing a full build.")
+        return full_build(args)
+    if state.get("encoder", "torch") != args.encoder:
+        # vectors from different encoders are close but not interchangeable
+        print(f"[!] Encoder changed to {args.encoder}, doing a full build.")
+        return full_build(args)
+    if state.get("chunking", [0, 0]) != [chunk_words, chunk_overlap]:
+        print(f"[!] Chunking changed to {chunk_words} words / {chunk_overlap} overlap, doing a full build.")
+        return full_build(args)
+    n_shards = state.get("shards", 1)
+    if args.shards and args.shards != n_shards:
+        print(f"[!] Shard count changed to {args.shards}, doing a full build.")
+        return full_build(args)
+    dirs = layout_dirs(n_shards)
+
+    sources = {}
+    old_pages = state["pages"]
+    new_pages = {}
+    new_items = {m: [] for m in MODALITIES}
+    new_keys = {m: [] for m in MODALITIES}   # (page key, block key) per new item
+    stale = {m: [] for m in MODALITIES}
+    changed = 0
+
+    for page_meta, page_hash, image_dir in iter_corpus(args.data_dir, sources):
+        key = page_key(page_meta)
+        old = old_pages.get(key)
+
+        if old is not None and old["hash"] == page_hash:
+            new_pages[key] = old
+            continue
+
+        changed += 1
+        entry = {"hash": page_hash}
+        page_items = dict(zip(MODALITIES, page_blocks(page_meta, image_dir)))
+        for m in MODALITIES:
+            old_ids = old[m] if old else {}
+            entry[m] = {}
+            for k, item in zip(block_keys(page_items[m], m), page_items[m]):
+                if k in old_ids:
+                    entry[m][k] = old_ids[k]
+                else:
+                    new_items[m].append(item)
+                    new_keys[m].append((key, k))
+            stale[m].extend(i for k, i in old_ids.items() if k not in entry[m])
+        new_pages[key] = entry
+
+    removed_pages = [k for k in old_pages if k not in new_pages]
+    for key in removed_pages:
+        for m in MODALITIES:
+            stale[m].extend(old_pages[key][m].values())
+
+    print(
+        f"{changed} new/changed and {len(removed_pages)} removed pages: "
+        f"{len(new_items['text'])} text blocks and {len(new_items['image'])} images to embed, "
+        f"{len(stale['text'])} text and {len(stale['image'])} image vectors to drop."
+    )
+
+    embedders = {"text": embed_text_batch, "image": embed_image_batch}
+    for m in MODALITIES:
+        embeddings, metadata, kept = embed_items(
+            m, new_items[m], embedders[m], args.batch_size, args.checkpoint_dir
+        )
+        ids = np.arange(state["next_id"][m], state["next_id"][m] + len(metadata), dtype="int64")
+        for record, i, pos in zip(metadata, ids, kept):
+            record["id"] = int(i)
+            page, block = new_keys[m][pos]
+            new_pages[page][m][block] = int(i)
+
+        has_vectors = os.path.exists(index_factory.vectors_path(INDEX_DIR, m))
+        if has_vectors and len(ids):
+            # extended whatever the current flags: search re-ranks from this file
+            # and would treat every id past its end as missing.
+            # Stale rows stay until the next full build; the index no longer returns them
+            write_vectors(m, embeddings, ids, int(ids[-1]) + 1, append=True)
+        elif keeps_vectors(args) and not has_vectors:
+            print(f"[!] No {m}_vectors.npy to extend, run a full build to enable exact re-ranking.")
+
+        # new ids are above every bound, so they all go to the last shard
+        stale_ids = np.array(sorted(stale[m]), dtype="int64")
+        stale_shard = shard_of(stale_ids, state.get("shard_bounds", {}).get(m, []))
+        for s, d in enumerate(dirs):
+            last = s == len(dirs) - 1
+            shard_stale = set(stale_ids[stale_shard == s].tolist())
+            if last:
+                update_shard(m, d, embeddings, ids, metadata, shard_stale)
+            elif shard_stale:
+                update_shard(m, d, stack_or_empty([]), ids[:0], [], shard_stale)
+        state["next_id"][m] = int(state["next_id"][m] + len(metadata))
+
+    state["pages"] = new_pages
+    write_json(SOURCES_PATH, sources, indent=2)
+    write_json(STATE_PATH, state)
+
+def update_shard(m, index_dir, embeddings, ids, metadata, stale_ids):
+    if not len(ids) and not stale_ids:
+        return
+    # The three writes below are ordered so that every id in the index
+    # always has a metadata record while a reader is loading them.
+    # New ids are all above the old ones, so appending keeps id order.
+    write_meta(chain(read_meta(m, index_dir), metadata), m, index_dir)
+
+    index = read_index(m, index_dir)
+    index = index_factory.remove_ids(index, sorted(stale_ids))
+    if len(ids):
+        index.add_with_ids(embeddings, ids)
+    write_index(index, m, index_dir)
+
+    if stale_ids:
+        write_meta((r for r in read_meta(m, index_dir) if r["id"] not in stale_ids), m, index_dir)
+    build_filters(read_meta(m, index_dir), index_dir, m)
+    if m == "text":
+        # BM25 statistics (avgdl) cover the whole shard, so it is rebuilt, not patched
+        build_bm25(read_meta(m, index_dir), index_dir, m)
+
+# -------------------- Main --------------------
+def main(args):
+    global encoder_backend
+    set_chunking(args.chunk_words, args.chunk_overlap)
+    if args.workers > 1 and args.incremental:
+        # incremental runs only embed what changed; one process is enough
+        print("[!] --workers is only used by full builds.")
+        args.workers = 1
+
+    if args.workers > 1:
+        encoder_backend = args.encoder   # each worker loads its own CLIP
+    else:
+        load_clip(args.encoder, args.threads)
+
+    if args.incremental:
+        incremental_build(args)
+    else:
+        full_build(args)
+
+    if not args.keep_checkpoint:
+        shutil.rmtree(args.checkpoint_dir, ignore_errors=True)
+
+    print("✅ Embedding and indexing complete.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CLIP embedding + FAISS indexing")
+    parser.add_argument("--data-dir", nargs="+", default=[DATA_DIR],
+                        help="crawler output: pages/*.jsonl[.gz] and/or meta/*.json, plus images/; "
+                             "several dirs (e.g. wikipedia_scrape daraz_shoes) are indexed together, "
+                             "one source each")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="blocks per CLIP forward pass")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR,
+                        help="where finished batches are stored for resuming")
+    parser.add_argument("--keep-checkpoint", action="store_true",
+                        help="do not delete batch checkpoints after a successful run")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only embed new/changed blocks and drop stale vectors")
+    parser.add_argument("--index-type", choices=index_factory.INDEX_TYPES, default=INDEX_TYPE)
+    parser.add_argument("--nlist", type=int, default=None,
+                        help="IVF cells (default ~4*sqrt(n))")
+    parser.add_argument("--train-size", type=int, default=index_factory.TRAIN_SIZE,
+                        help="vectors sampled to train IVF / PQ indices")
+    parser.add_argument("--keep-vectors", action="store_true",
+                        help="also store {name}_vectors.npy for exact indices (always kept for "
+                             + ", ".join(index_factory.LOSSY_TYPES) + ")")
+    parser.add_argument("--encoder", choices=ENCODER_BACKENDS, default=ENCODER_BACKEND,
+                        help="CLIP inference backend (int8 / onnx trade a little accuracy for speed)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="encoder intra-op threads (per worker with --workers; "
+                             "default: one per core, split between workers)")
+    parser.add_argument("--chunk-words", type=int, default=CHUNK_WORDS,
+                        help="split longer text blocks into overlapping windows of this many words "
+                             "(0 = one vector per block)")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP,
+                        help="words shared by consecutive windows")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="split the indices into N shard directories under indices1/ "
+                             "(full builds; incremental runs keep the current layout)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="embedding processes for a full build")
+    main(parser.parse_args())
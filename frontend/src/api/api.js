@@ -20,10 +20,11 @@ export const searchImage = async (file) => {
   return response.data;
 };
 
-// ----- Refine search using embedding -----
-export const refineSearch = async (baseEmbedding, refinement, alpha = 0.6) => {
+// ----- Refine search within a session -----
+// sessionId comes from any search response; the result carries the next one
+export const refineSearch = async (sessionId, refinement, alpha = 0.6) => {
   const response = await axios.post(`${BASE_URL}/search/refine`, {
-    base_embedding: baseEmbedding,
+    session_id: sessionId,
     refinement,
     alpha,
   });
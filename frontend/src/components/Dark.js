@@ -194,7 +194,7 @@ export default function SearchPage() {
                 className="rounded-2xl overflow-hidden bg-slate-800 cursor-pointer hover:scale-[1.02] transition"
               >
                 <img
-                  src={`http://localhost:8000/wikipedia_scrape/images/${img.filename}`}
+                  src={`http://localhost:8000/images/${img.source || "wikipedia"}/${img.filename}`}
                   alt={img.caption}
                   className="w-full object-cover"
                 />
@@ -211,7 +211,7 @@ export default function SearchPage() {
           onClick={() => setSelectedImage(null)}
         >
           <img
-            src={`http://localhost:8000/wikipedia_scrape/images/${selectedImage.filename}`}
+            src={`http://localhost:8000/images/${selectedImage.source || "wikipedia"}/${selectedImage.filename}`}
             className="max-h-[90vh] rounded-2xl"
           />
         </div>
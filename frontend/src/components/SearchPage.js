@@ -8,7 +8,7 @@ export default function SearchPage() {
   const [loading, setLoading] = useState(false);
   const [hasSearched, setHasSearched] = useState(false);
   const [isFocused, setIsFocused] = useState(false);
-  const [baseEmbedding, setBaseEmbedding] = useState(null);
+  const [sessionId, setSessionId] = useState(null);
   const [refineText, setRefineText] = useState("");
   const [refining, setRefining] = useState(false);
   const [searchHistory, setSearchHistory] = useState([]);
@@ -36,7 +36,7 @@ export default function SearchPage() {
     try {
       const res = await axios.get(`http://localhost:8000/search?q=${encodeURIComponent(q)}`);
       setResults(res.data);
-      setBaseEmbedding(res.data.embedding);
+      setSessionId(res.data.session_id);
     } catch (err) {
       console.error("Search failed:", err);
     } finally {
@@ -61,7 +61,7 @@ export default function SearchPage() {
       );
 
       setResults(res.data);
-      setBaseEmbedding(res.data.embedding);
+      setSessionId(res.data.session_id);
     } catch (err) {
       console.error("Image search failed:", err);
     } finally {
@@ -71,7 +71,7 @@ export default function SearchPage() {
 
   // REFINE
   const handleRefine = async () => {
-    if (!refineText.trim() || !baseEmbedding) return;
+    if (!refineText.trim() || !sessionId) return;
     setRefining(true);
     setSearchHistory(prev => [`${query} → ${refineText}`, ...prev.slice(0, 4)]);
 
@@ -84,14 +84,16 @@ export default function SearchPage() {
 
       await new Promise(resolve => setTimeout(resolve, 300));
 
-      const data = await refineSearch(baseEmbedding, refineText);
+      const data = await refineSearch(sessionId, refineText);
       
       setResults(data);
-      setBaseEmbedding(data.embedding);
+      setSessionId(data.session_id);
       setQuery(prev => `${prev} → ${refineText}`);
       setRefineText("");
     } catch (err) {
       console.error("Refinement failed:", err);
+      // the server forgot the session (expired); a new search starts a fresh one
+      if (err.response?.status === 404) setSessionId(null);
     } finally {
       setTimeout(() => setRefining(false), 400);
     }
@@ -150,7 +152,7 @@ export default function SearchPage() {
             setHasSearched(false); 
             setQuery(""); 
             setResults({ text_results: [], image_results: [] }); 
-            setBaseEmbedding(null);
+            setSessionId(null);
           }}
           className={`group cursor-pointer transition-all duration-1000 select-none relative ${hasSearched ? "" : "mb-12"}`}
         >
@@ -314,7 +316,7 @@ export default function SearchPage() {
           </div>
 
           {/* Refinement Input */}
-          {baseEmbedding && (
+          {sessionId && (
             <div className={`mb-12 max-w-2xl mx-auto transition-all duration-500 ${refining ? "scale-[0.98] opacity-70" : "scale-100 opacity-100"}`}>
               <div className="relative">
                 <div className="absolute -inset-1 bg-gradient-to-r from-indigo-500 to-violet-500 rounded-[2rem] blur-xl opacity-20"></div>
@@ -532,7 +534,7 @@ export default function SearchPage() {
                     >
                       {/* Image */}
                       <img 
-                        src={`http://localhost:8000/wikipedia_scrape/images/${img.filename}`} 
+                        src={`http://localhost:8000/images/${img.source || "wikipedia"}/${img.filename}`} 
                         alt={img.caption || img.title}
                         className="w-full object-cover transition-all duration-700 group-hover:scale-110 group-hover:brightness-110" 
                         loading="lazy"
@@ -585,7 +587,7 @@ export default function SearchPage() {
           </button>
           <div className="max-w-5xl max-h-[90vh] animate-in zoom-in-95 duration-300">
             <img 
-              src={`http://localhost:8000/wikipedia_scrape/images/${selectedImage.filename}`}
+              src={`http://localhost:8000/images/${selectedImage.source || "wikipedia"}/${selectedImage.filename}`}
               alt={selectedImage.caption || selectedImage.title}
               className="max-h-[90vh] w-auto rounded-2xl shadow-2xl"
             />
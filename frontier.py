@@ -0,0 +1,154 @@
+import sqlite3
+import hashlib
+from urllib.parse import urlsplit, urlunsplit, quote, unquote, parse_qsl, urlencode
+
+# ---------------- URL NORMALIZATION ----------------
+DEFAULT_PORTS = {"http": 80, "https": 443}
+PATH_SAFE = "/:@!$&'()*+,;=-._~"
+
+
+def normalize_url(url):
+    """
+    Canonical form used for dedup: lowercase scheme/host, no default port,
+    no fragment, consistently percent-encoded path and sorted query.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+
+    netloc = host
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{parts.port}"
+
+    path = quote(unquote(parts.path), safe=PATH_SAFE) or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def url_key(url):
+    # 63-bit hash so the UNIQUE index holds integers instead of full URLs
+    digest = hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1
+
+
+# ---------------- FRONTIER ----------------
+class Frontier:
+    """
+    On-disk crawl frontier backed by SQLite.
+
+    Every URL ever discovered is stored once (deduplicated on its normalized
+    form) together with its state, so the crawl can be resumed after a crash
+    and memory does not grow with the number of pages.
+    """
+
+    QUEUED, ACTIVE, DONE, FAILED = 0, 1, 2, 3
+
+    def __init__(self, path):
+        # not thread-safe: the async crawler moves all calls onto one thread
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS urls (
+                id    INTEGER PRIMARY KEY AUTOINCREMENT,
+                key   INTEGER NOT NULL UNIQUE,
+                url   TEXT    NOT NULL,
+                state INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS urls_state ON urls (state, id);
+            CREATE TABLE IF NOT EXISTS counters (
+                name  TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS images (
+                key      INTEGER PRIMARY KEY,   -- url_key of the image URL
+                hash     TEXT,                  -- sha1 of the downloaded bytes
+                filename TEXT NOT NULL          -- '' when the image was rejected
+            );
+            CREATE INDEX IF NOT EXISTS images_hash ON images (hash);
+        """)
+        # Pages that were being fetched when the last run died go back in line
+        self.db.execute("UPDATE urls SET state = ? WHERE state = ?", (self.QUEUED, self.ACTIVE))
+        self.db.commit()
+
+    def add(self, urls):
+        """
+        Queues every URL that has not been seen before. Returns the number added.
+        """
+        rows = []
+        for url in urls:
+            url = normalize_url(url)
+            rows.append((url_key(url), url))
+
+        before = self.db.total_changes
+        self.db.executemany("INSERT OR IGNORE INTO urls (key, url) VALUES (?, ?)", rows)
+        self.db.commit()
+        return self.db.total_changes - before
+
+    def pop(self):
+        """
+        Returns the oldest queued URL (BFS order) and marks it active, or None.
+        """
+        row = self.db.execute(
+            "SELECT id, url FROM urls WHERE state = ? ORDER BY id LIMIT 1", (self.QUEUED,)
+        ).fetchone()
+        if row is None:
+            return None
+        self.db.execute("UPDATE urls SET state = ? WHERE id = ?", (self.ACTIVE, row[0]))
+        self.db.commit()
+        return row[1]
+
+    def mark(self, url, state):
+        self.db.execute("UPDATE urls SET state = ? WHERE key = ?", (state, url_key(normalize_url(url))))
+        self.db.commit()
+
+    def done(self, url):
+        self.mark(url, self.DONE)
+
+    def failed(self, url):
+        self.mark(url, self.FAILED)
+
+    def count(self, state):
+        return self.db.execute("SELECT COUNT(*) FROM urls WHERE state = ?", (state,)).fetchone()[0]
+
+    def get_counter(self, name, default=0):
+        row = self.db.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_counter(self, name, value):
+        self.db.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, value)
+        )
+        self.db.commit()
+
+    # ---------------- IMAGES ----------------
+    # Every image URL is downloaded once and every distinct image stored once,
+    # across pages and across restarts.
+    def image_for(self, url):
+        """
+        Returns the stored filename for an image URL, '' if it was rejected,
+        or None if it has never been downloaded.
+        """
+        row = self.db.execute(
+            "SELECT filename FROM images WHERE key = ?", (url_key(normalize_url(url)),)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def image_for_hash(self, digest):
+        row = self.db.execute(
+            "SELECT filename FROM images WHERE hash = ? AND filename != '' LIMIT 1", (digest,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def add_image(self, url, digest, filename):
+        self.db.execute(
+            "INSERT OR REPLACE INTO images (key, hash, filename) VALUES (?, ?, ?)",
+            (url_key(normalize_url(url)), digest, filename or "")
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,203 @@
+import os
+import gzip
+import json
+import hashlib
+import sqlite3
+import threading
+
+# ---------------- FORMAT ----------------
+# <data_dir>/pages/pages-00000.jsonl[.gz], one page record per line:
+#   {"page_id", "url", "title", "source", "content": [blocks]}
+# Shards are append-only: every run opens a new shard, and a shard is closed
+# once it holds SHARD_PAGES records. A crash can only leave a torn last line,
+# which readers skip. A re-crawled page is appended again; readers use the
+# last record of every url, found through <data_dir>/pages/urls.sqlite
+# (see UrlIndex).
+PAGES_DIR = "pages"
+SHARD_PAGES = 10000
+URL_INDEX = "urls.sqlite"
+
+
+def shard_name(n, compress):
+    return f"pages-{n:05d}.jsonl" + (".gz" if compress else "")
+
+
+def list_shards(pages_dir):
+    if not os.path.isdir(pages_dir):
+        return []
+    return sorted(
+        f for f in os.listdir(pages_dir)
+        if f.startswith("pages-") and f.endswith((".jsonl", ".jsonl.gz"))
+    )
+
+
+# ---------------- WRITER ----------------
+class ShardWriter:
+    """
+    Appends page records to sharded JSONL files. Thread-safe, so the async
+    crawler can write from worker threads.
+    """
+
+    def __init__(self, data_dir, compress=False, shard_pages=SHARD_PAGES):
+        self.dir = os.path.join(data_dir, PAGES_DIR)
+        os.makedirs(self.dir, exist_ok=True)
+        self.compress = compress
+        self.shard_pages = shard_pages
+        self.lock = threading.Lock()
+
+        existing = list_shards(self.dir)
+        self.next_shard = int(existing[-1][6:11]) + 1 if existing else 0
+        self.f = None
+        self.count = 0
+
+    def _open(self):
+        path = os.path.join(self.dir, shard_name(self.next_shard, self.compress))
+        self.next_shard += 1
+        self.count = 0
+        if self.compress:
+            self.f = gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+        else:
+            self.f = open(path, "w", encoding="utf-8")
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            if self.f is None or self.count >= self.shard_pages:
+                self.close_shard()
+                self._open()
+            self.f.write(line)
+            # the crawler marks the page done right after this returns
+            self.f.flush()
+            self.count += 1
+
+    def close_shard(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def close(self):
+        with self.lock:
+            self.close_shard()
+
+
+# ---------------- READER ----------------
+def iter_shard(path):
+    """
+    Yields (record, sha1 of the line, line number) for one shard, skipping
+    a torn last line.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    try:
+        with opener(path, "rb") as f:
+            for line, raw in enumerate(f):
+                if not raw.strip():
+                    continue
+                try:
+                    record = json.loads(raw)
+                except ValueError:
+                    print(f"[!] Skipping unreadable line in {path}")
+                    continue
+                yield record, hashlib.sha1(raw.rstrip(b"\n")).hexdigest(), line
+    except EOFError:
+        print(f"[!] {path} ends early (interrupted write), using what was read")
+
+
+def iter_meta_files(meta_dir):
+    """
+    Yields (record, sha1 of the file) for the older one-file-per-page layout.
+    """
+    if not os.path.isdir(meta_dir):
+        return
+    for name in sorted(f for f in os.listdir(meta_dir) if f.endswith(".json")):
+        with open(os.path.join(meta_dir, name), "rb") as f:
+            raw = f.read()
+        record = json.loads(raw.decode("utf-8"))
+        record.setdefault("_file", name)
+        yield record, hashlib.sha1(raw).hexdigest()
+
+
+class UrlIndex:
+    """
+    url -> (shard, line) of its last record, plus the (shard, line) of every
+    record a later one replaced, on disk next to the shards. Finding
+    superseded records then needs neither a second read of the pages nor
+    the urls in memory. Readers keep it current: refresh() indexes the
+    shards that are new or have grown since the last call (normally only
+    what the latest crawl added), and starts over if a known shard is gone.
+    """
+
+    def __init__(self, pages_dir):
+        self.dir = pages_dir
+        # waits for another process refreshing the same index (embed.py --workers)
+        self.conn = sqlite3.connect(os.path.join(pages_dir, URL_INDEX), timeout=60)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS last (url TEXT PRIMARY KEY, shard TEXT NOT NULL, line INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS shards (shard TEXT PRIMARY KEY, size INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS superseded (shard TEXT NOT NULL, line INTEGER NOT NULL,
+                                                   PRIMARY KEY (shard, line));
+            CREATE TRIGGER IF NOT EXISTS replaced AFTER UPDATE ON last BEGIN
+                INSERT OR IGNORE INTO superseded VALUES (old.shard, old.line);
+            END;
+        """)
+
+    def refresh(self, shards):
+        indexed = dict(self.conn.execute("SELECT shard, size FROM shards"))
+        with self.conn:
+            if set(indexed) - set(shards):
+                for table in ("last", "shards", "superseded"):
+                    self.conn.execute(f"DELETE FROM {table}")
+                indexed = {}
+            for s in shards:
+                path = os.path.join(self.dir, s)
+                # taken before reading: a shard that grows meanwhile is indexed again next time
+                size = os.path.getsize(path)
+                if indexed.get(s) == size:
+                    continue
+                self.conn.executemany(
+                    "INSERT INTO last VALUES (?, ?, ?) ON CONFLICT(url) DO UPDATE"
+                    " SET shard = excluded.shard, line = excluded.line"
+                    " WHERE (excluded.shard, excluded.line) > (last.shard, last.line)",
+                    ((r["url"], s, line) for r, _, line in iter_shard(path) if r.get("url")),
+                )
+                self.conn.execute("INSERT OR REPLACE INTO shards VALUES (?, ?)", (s, size))
+
+    def has(self, url) -> bool:
+        return self.conn.execute("SELECT 1 FROM last WHERE url = ?", (url,)).fetchone() is not None
+
+    def superseded(self, shard) -> set:
+        # normally only the re-crawled pages of one shard
+        return {line for (line,) in self.conn.execute("SELECT line FROM superseded WHERE shard = ?", (shard,))}
+
+    def close(self):
+        self.conn.close()
+
+
+def iter_pages(data_dir):
+    """
+    Streams every page under data_dir: meta/*.json (the older layout) first,
+    then the JSONL shards oldest first. A url written more than once
+    (re-crawled into a newer shard, or refetched after a crash) yields only
+    its last record, so new content replaces old; a meta/*.json page is
+    replaced by any shard record of its url. The pages are read once, plus
+    the shards UrlIndex has not seen yet, and one page is in memory at a time.
+    """
+    pages_dir = os.path.join(data_dir, PAGES_DIR)
+    shards = list_shards(pages_dir)
+    index = None
+    if shards:
+        index = UrlIndex(pages_dir)
+        index.refresh(shards)
+
+    try:
+        for record, digest in iter_meta_files(os.path.join(data_dir, "meta")):
+            if index is None or not record.get("url") or not index.has(record["url"]):
+                yield record, digest
+        for s in shards:
+            skip = index.superseded(s)
+            # records appended since the refresh are not indexed yet and are kept
+            for record, digest, line in iter_shard(os.path.join(pages_dir, s)):
+                if line not in skip:
+                    yield record, digest
+    finally:
+        if index is not None:
+            index.close()
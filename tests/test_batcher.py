@@ -0,0 +1,49 @@
+# tests/test_batcher.py
+import asyncio
+
+from backend.batcher import MicroBatcher
+
+
+def test_concurrent_submits_share_one_call():
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [2 * x for x in items]
+
+    async def scenario():
+        batcher = MicroBatcher(double, max_batch_size=4, max_wait_ms=20)
+        return await asyncio.gather(*(batcher.submit(x) for x in range(6)))
+
+    assert asyncio.run(scenario()) == [0, 2, 4, 6, 8, 10]
+    # a full batch goes out at once, the rest when the window closes
+    assert calls == [[0, 1, 2, 3], [4, 5]]
+
+
+def test_batch_error_reaches_every_caller_and_batcher_recovers():
+    def fail_on_bad(items):
+        if "bad" in items:
+            raise ValueError("bad item")
+        return [x.upper() for x in items]
+
+    async def scenario():
+        batcher = MicroBatcher(fail_on_bad, max_batch_size=8, max_wait_ms=5)
+        failed = await asyncio.gather(batcher.submit("ok"), batcher.submit("bad"), return_exceptions=True)
+        return failed, await batcher.submit("later")
+
+    failed, later = asyncio.run(scenario())
+    assert all(isinstance(e, ValueError) for e in failed) and len(failed) == 2
+    assert later == "LATER"
+
+
+def test_cancelled_caller_does_not_break_the_batch():
+    async def scenario():
+        batcher = MicroBatcher(lambda items: items, max_batch_size=8, max_wait_ms=10)
+        gone = asyncio.ensure_future(batcher.submit("gone"))
+        kept = asyncio.ensure_future(batcher.submit("kept"))
+        await asyncio.sleep(0)
+        gone.cancel()
+        return await kept, gone
+
+    kept, gone = asyncio.run(scenario())
+    assert kept == "kept" and gone.cancelled()
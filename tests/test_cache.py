@@ -0,0 +1,41 @@
+# tests/test_cache.py
+from backend import cache
+from backend.cache import LRUCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_least_recently_used_entry_is_evicted():
+    lru = LRUCache(maxsize=2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    assert lru.get("a") == 1          # "b" is now the oldest
+    lru.put("c", 3)
+    assert lru.get("b") is None and lru.get("a") == 1 and lru.get("c") == 3
+    stats = lru.stats()
+    assert (stats["size"], stats["evictions"], stats["hits"], stats["misses"]) == (2, 1, 3, 1)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    lru = LRUCache(maxsize=10, ttl=5)
+    lru.put("a", 1)
+    clock.now += 4
+    lru.put("b", 2)
+    assert lru.get("a") == 1
+    clock.now += 2                    # "a" is 6s old, "b" 2s
+    assert lru.get("a", "gone") == "gone" and lru.get("b") == 2
+    assert len(lru) == 1 and lru.stats()["expirations"] == 1
+
+
+def test_zero_size_cache_stores_nothing():
+    lru = LRUCache(maxsize=0)
+    lru.put("a", 1)
+    assert lru.get("a") is None and len(lru) == 0
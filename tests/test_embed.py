@@ -0,0 +1,91 @@
+# tests/test_embed.py
+import argparse
+import hashlib
+import json
+import os
+import numpy as np
+import pytest
+
+import embed
+from backend import index_factory
+
+
+class HashEncoder:
+    """Deterministic stand-in for CLIP: one unit vector per distinct text."""
+
+    def embed_texts(self, texts):
+        seeds = [int(hashlib.sha1(t.encode()).hexdigest()[:8], 16) for t in texts]
+        rows = np.array([np.random.default_rng(s).standard_normal(embed.DIM) for s in seeds], dtype="float32")
+        return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def build_args(**overrides):
+    args = dict(
+        data_dir=["wikipedia_scrape"], batch_size=2, checkpoint_dir="checkpoint", keep_checkpoint=False,
+        index_type=embed.INDEX_TYPE, nlist=None, train_size=index_factory.TRAIN_SIZE, keep_vectors=False,
+        encoder=embed.ENCODER_BACKEND, threads=None, chunk_words=embed.CHUNK_WORDS,
+        chunk_overlap=embed.CHUNK_OVERLAP, shards=None, workers=1,
+    )
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def write_page(name, *texts):
+    os.makedirs(os.path.join("wikipedia_scrape", "meta"), exist_ok=True)
+    page = {"page_id": name, "url": f"http://x/{name}", "title": name, "source": "wikipedia",
+            "content": [{"type": "text", "section": "", "content": t} for t in texts]}
+    with open(os.path.join("wikipedia_scrape", "meta", f"{name}.json"), "w", encoding="utf-8") as f:
+        json.dump(page, f)
+
+
+def indexed_texts():
+    records = list(embed.read_meta("text"))
+    index = embed.read_index("text")
+    assert index.ntotal == len(records)
+    for record in records:
+        # every record is reachable through its own id, and nothing else is indexed
+        _, I = index.search(HashEncoder().embed_texts([record["text"]]), 1)
+        assert I[0][0] == record["id"]
+    return {r["text"]: r["id"] for r in records}
+
+
+def test_chunk_text_windows_overlap():
+    text = " ".join(f"w{i}" for i in range(10))
+    windows = embed.chunk_text(text, words=4, overlap=1)
+    assert windows == ["w0 w1 w2 w3", "w3 w4 w5 w6", "w6 w7 w8 w9"]
+    # the last window ends at the text, it is not padded out or repeated
+    assert embed.chunk_text(text, words=4, overlap=2)[-1] == "w6 w7 w8 w9"
+    assert embed.chunk_text(text, words=10, overlap=3) == [text]
+    assert embed.chunk_text(text, words=0, overlap=0) == [text]
+
+
+def test_set_chunking_rejects_overlap_of_a_whole_window():
+    with pytest.raises(ValueError):
+        embed.set_chunking(4, 4)
+    embed.set_chunking()
+
+
+def test_incremental_build_replaces_removes_and_adds_pages(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(embed, "encoder", HashEncoder())
+    embed.set_chunking()
+
+    write_page("a", "alpha one", "alpha two")
+    write_page("b", "beta")
+    write_page("c", "gamma")
+    embed.full_build(build_args())
+    before = indexed_texts()
+    assert set(before) == {"alpha one", "alpha two", "beta", "gamma"}
+
+    write_page("a", "alpha one", "alpha three")
+    os.remove(os.path.join("wikipedia_scrape", "meta", "b.json"))
+    write_page("d", "delta")
+    embed.incremental_build(build_args())
+
+    after = indexed_texts()
+    assert set(after) == {"alpha one", "alpha three", "gamma", "delta"}
+    # unchanged blocks keep their ids, new ones are numbered after the old ones
+    assert after["alpha one"] == before["alpha one"] and after["gamma"] == before["gamma"]
+    assert min(after["alpha three"], after["delta"]) > max(before.values())
+    state = embed.load_state()
+    assert sorted(state["pages"]) == ["http://x/a", "http://x/c", "http://x/d"]
@@ -0,0 +1,43 @@
+# tests/test_executor.py
+import asyncio
+import pytest
+
+from backend.executor import BoundedExecutor, Overloaded
+
+
+def test_admit_rejects_when_full_and_admit_waiting_queues():
+    async def scenario():
+        inference = BoundedExecutor(1, 1)
+        order = []
+
+        async def chunk(name):
+            async with inference.admit_waiting():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        with inference.admit():
+            with pytest.raises(Overloaded):
+                inference.check_capacity()
+            waiting = asyncio.gather(chunk("a"), chunk("b"))
+            await asyncio.sleep(0.01)
+            assert order == [] and inference.stats()["waiting"] == 2
+        await waiting
+        return inference, order
+
+    inference, order = asyncio.run(scenario())
+    assert order == ["a", "b"]
+    assert inference.inflight == 0 and inference.rejected == 1
+
+
+def test_cancelled_waiter_does_not_take_a_slot():
+    async def scenario():
+        inference = BoundedExecutor(1, 1)
+        with inference.admit():
+            waiter = asyncio.ensure_future(inference.admit_waiting().__aenter__())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.sleep(0)
+        return inference
+
+    inference = asyncio.run(scenario())
+    assert inference.inflight == 0 and inference.stats()["waiting"] == 0
@@ -0,0 +1,30 @@
+# tests/test_frontier.py
+from frontier import Frontier, normalize_url
+
+
+def test_normalize_url_canonical_form():
+    assert normalize_url("HTTP://En.Wikipedia.org:80/wiki/A#History") == "http://en.wikipedia.org/wiki/A"
+    assert normalize_url("https://host:8443/x?b=2&a=1") == "https://host:8443/x?a=1&b=2"
+    assert normalize_url("https://host/wiki/%7EA%20B") == normalize_url("https://host/wiki/~A B")
+    assert normalize_url("https://host") == "https://host/"
+
+
+def test_frontier_resumes_from_its_db(tmp_path):
+    path = str(tmp_path / "frontier.sqlite")
+    frontier = Frontier(path)
+    assert frontier.add(["https://h/a", "https://h/b", "https://H/a#top"]) == 2
+    assert frontier.pop() == "https://h/a"
+    frontier.done("https://h/a")
+    assert frontier.pop() == "https://h/b"   # left active by the "crash" below
+    frontier.set_counter("page_count", 1)
+    frontier.add_image("https://h/i.png", "sha", "image_0.jpg")
+    frontier.close()
+
+    frontier = Frontier(path)
+    assert frontier.count(Frontier.DONE) == 1 and frontier.get_counter("page_count") == 1
+    assert frontier.add(["https://h/a", "https://h/c"]) == 1
+    # the page that was in flight goes back in line, ahead of newer ones
+    assert [frontier.pop(), frontier.pop(), frontier.pop()] == ["https://h/b", "https://h/c", None]
+    assert frontier.image_for("https://h/i.png") == "image_0.jpg"
+    assert frontier.image_for_hash("sha") == "image_0.jpg"
+    frontier.close()
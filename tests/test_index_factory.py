@@ -0,0 +1,59 @@
+# tests/test_index_factory.py
+import warnings
+import numpy as np
+import faiss
+import pytest
+
+from backend import index_factory
+from backend.index_factory import build_index, make_index, read_index
+
+
+def write_ivf(path, n=2000, dim=32):
+    x = np.random.default_rng(0).standard_normal((n, dim)).astype("float32")
+    index = faiss.IndexIDMap2(make_index("ivf_flat", dim, n, nlist=16))
+    index.train(x)
+    index.add_with_ids(x, np.arange(n, dtype="int64"))
+    faiss.write_index(index, str(path))
+    return x
+
+
+def test_ivf_index_is_memory_mapped(tmp_path):
+    path = tmp_path / "text.index"
+    x = write_ivf(path)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        mapped = read_index(str(path), mmap=True)
+    ivf = faiss.extract_index_ivf(mapped)
+    # a private copy would be ArrayInvertedLists
+    assert not isinstance(faiss.downcast_InvertedLists(ivf.invlists), faiss.ArrayInvertedLists)
+
+    copy = read_index(str(path))
+    faiss.extract_index_ivf(copy).nprobe = ivf.nprobe = 16
+    assert np.array_equal(mapped.search(x[:5], 3)[1], copy.search(x[:5], 3)[1])
+
+
+def test_mmap_failure_warns_and_loads_private_copy(tmp_path, monkeypatch):
+    path = tmp_path / "text.index"
+    write_ivf(path)
+    real_read = faiss.read_index
+
+    def no_mmap(p, flags=0):
+        if flags:
+            raise RuntimeError("mmap not supported")
+        return real_read(p)
+
+    monkeypatch.setattr(index_factory.faiss, "read_index", no_mmap)
+    with pytest.warns(RuntimeWarning, match="Cannot mmap"):
+        index = read_index(str(path), mmap=True)
+    assert index.ntotal == 2000
+
+
+def test_ivf_subset_search_fills_k():
+    x = np.random.default_rng(0).standard_normal((2000, 32)).astype("float32")
+    index = build_index(x, np.arange(2000), "ivf_flat", nlist=16)
+    index.nprobe = 1
+    ids = np.arange(0, 2000, 37)
+    # without vectors, IVF goes through the IDSelector whatever exact_max is
+    D, I = index_factory.search_subset(index, None, x[:3], 10, ids)
+    assert (I >= 0).all() and np.isin(I, ids).all()
+    assert np.all(D[:, :-1] >= D[:, 1:])
@@ -0,0 +1,34 @@
+# tests/test_lexical.py
+import os
+import numpy as np
+
+from backend.lexical import bm25_paths, build_bm25, open_bm25, search_bm25
+
+
+def write_bm25(path, n=3000):
+    rng = np.random.default_rng(0)
+    words = ["common"] + [f"w{i}" for i in range(50)]
+    records = ({"id": i, "text": "common " + " ".join(rng.choice(words, 20))} for i in range(n))
+    build_bm25(records, str(path))
+    return open_bm25(str(path))
+
+
+def test_selective_filter_matches_full_scan(tmp_path):
+    index = write_bm25(tmp_path)
+    allowed = [np.arange(5, 3000, 97)]
+    looked_up = search_bm25([index], "common w3", 1000, 10, allowed)
+    index.by_id = None
+    scanned = search_bm25([index], "common w3", 1000, 10, allowed)
+    assert len(looked_up[1]) and set(looked_up[1]) <= set(allowed[0])
+    assert sorted(zip(looked_up[1], looked_up[0])) == sorted(zip(scanned[1], scanned[0]))
+
+
+def test_index_without_id_sorted_postings_still_filters(tmp_path):
+    write_bm25(tmp_path)
+    paths = bm25_paths(str(tmp_path), "text")
+    os.remove(paths["ids"])
+    os.remove(paths["weights"])
+    index = open_bm25(str(tmp_path))
+    assert index.by_id is None
+    _, ids, _ = search_bm25([index], "common", 10, 10, [np.array([3, 4, 2999])])
+    assert set(ids) == {3, 4, 2999}
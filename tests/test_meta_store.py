@@ -0,0 +1,66 @@
+# tests/test_meta_store.py
+import json
+import os
+
+from backend.meta_store import HEADER_SIZE, MetaStore, MetaStoreWriter, open_meta, write_meta_store
+
+
+def test_round_trip(tmp_path):
+    records = [
+        {"id": 0, "title": "Kallang Field", "text": "a stadium"},
+        {"id": 1, "title": "Café", "caption": "ünïcödé ✓", "windows": 2},
+        {"id": 4, "title": "gap before", "text": ""},
+    ]
+    write_meta_store(str(tmp_path / "text_meta.bin"), records)
+
+    store = open_meta(str(tmp_path), "text")
+    assert isinstance(store, MetaStore) and len(store) == 3
+    assert list(store) == records
+    assert store[1] == records[1] and store.get(4) == records[2]
+    assert store.get(2) is None and 3 not in store and store.get(5, "none") == "none"
+    store.close()
+
+
+def test_shard_store_only_has_slots_for_its_own_ids(tmp_path):
+    path = str(tmp_path / "text_meta.bin")
+    with MetaStoreWriter(path, base_id=1000) as writer:
+        writer.add(1000, {"id": 1000})
+        writer.add(1002, {"id": 1002})
+
+    store = MetaStore(path)
+    assert (store.base_id, store.n_slots) == (1000, 3)
+    assert store.get(1002) == {"id": 1002} and store.get(1001) is None and store.get(2) is None
+    assert 1000 in store and 1001 not in store and 0 not in store
+    assert list(store.ids()) == [1000, 1002]
+    # header + 2 records + 4 offsets, nothing for ids 0..999
+    assert os.path.getsize(path) == HEADER_SIZE + 2 * len(b'{"id": 1000}') + 4 * 8
+
+
+def test_base_id_defaults_to_first_record(tmp_path):
+    path = str(tmp_path / "text_meta.bin")
+    write_meta_store(path, [{"id": 7, "t": "a"}, {"id": 9, "t": "b"}])
+    store = MetaStore(path)
+    assert store.base_id == 7 and [r["t"] for r in store] == ["a", "b"]
+
+
+def test_reads_stores_written_without_base_id(tmp_path):
+    path = str(tmp_path / "text_meta.bin")
+    blob = b'{"id": 0}{"id": 2}'
+    with open(path, "wb") as f:
+        f.write(b"MMETA001")
+        f.write((3).to_bytes(8, "little") + (24 + len(blob)).to_bytes(8, "little"))
+        f.write(blob)
+        for off in (0, 9, 9, 18):
+            f.write(off.to_bytes(8, "little"))
+
+    store = MetaStore(path)
+    assert store.base_id == 0 and list(store.ids()) == [0, 2]
+    assert store.get(2) == {"id": 2} and store.get(1) is None
+
+
+def test_positional_json_records_get_their_position_as_id(tmp_path):
+    with open(tmp_path / "text_meta.json", "w", encoding="utf-8") as f:
+        json.dump([{"title": "a"}, {"title": "b"}], f)
+    meta = open_meta(str(tmp_path), "text")
+    assert meta[1] == {"title": "b", "id": 1}
+    assert [r["id"] for r in meta.values()] == [0, 1]
@@ -0,0 +1,50 @@
+# tests/test_page_store.py
+import json
+import os
+
+from page_store import PAGES_DIR, URL_INDEX, ShardWriter, iter_pages
+
+
+def page(url, title):
+    return {"page_id": title, "url": url, "title": title, "source": "wikipedia", "content": []}
+
+
+def titles(data_dir):
+    return [record["title"] for record, _ in iter_pages(str(data_dir))]
+
+
+def test_last_record_per_url_wins(tmp_path):
+    os.makedirs(tmp_path / "meta")
+    with open(tmp_path / "meta" / "a.json", "w", encoding="utf-8") as f:
+        json.dump(page("http://x/a", "a0"), f)
+    with open(tmp_path / "meta" / "c.json", "w", encoding="utf-8") as f:
+        json.dump(page("http://x/c", "c0"), f)
+
+    writer = ShardWriter(str(tmp_path), shard_pages=2)
+    for record in (page("http://x/a", "a1"), page("http://x/b", "b1"), page("http://x/b", "b2")):
+        writer.write(record)
+    writer.close()
+    # a later run opens a new shard
+    writer = ShardWriter(str(tmp_path))
+    writer.write(page("http://x/a", "a2"))
+    writer.close()
+
+    assert titles(tmp_path) == ["c0", "b2", "a2"]
+    assert os.path.exists(tmp_path / PAGES_DIR / URL_INDEX)
+
+
+def test_url_index_follows_new_and_deleted_shards(tmp_path):
+    writer = ShardWriter(str(tmp_path))
+    writer.write(page("http://x/a", "a1"))
+    writer.close()
+    assert titles(tmp_path) == ["a1"]
+
+    writer = ShardWriter(str(tmp_path))
+    writer.write(page("http://x/a", "a2"))
+    writer.close()
+    assert titles(tmp_path) == ["a2"]
+
+    # the newer shard is gone, so the index starts over
+    shards = sorted(os.listdir(tmp_path / PAGES_DIR))
+    os.remove(tmp_path / PAGES_DIR / [s for s in shards if s.startswith("pages-")][-1])
+    assert titles(tmp_path) == ["a1"]
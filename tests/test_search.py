@@ -0,0 +1,68 @@
+# tests/test_search.py
+import numpy as np
+import pytest
+
+from backend import search
+
+
+def ranking(*keys):
+    return [(key, {"title": key, "score": 1.0}) for key in keys]
+
+
+def test_reciprocal_rank_fusion_sums_reciprocal_ranks():
+    fused = search.reciprocal_rank_fusion([ranking("a", "b", "c"), ranking("c", "a", "d")], 3)
+    # a: 1/(K+1) + 1/(K+2), c: 1/(K+3) + 1/(K+1), b: 1/(K+2), d: 1/(K+3)
+    assert [r["title"] for r in fused] == ["a", "c", "b"]
+    assert fused[0]["score"] == pytest.approx(1 / (search.RRF_K + 1) + 1 / (search.RRF_K + 2))
+    assert fused[2]["score"] == pytest.approx(1 / (search.RRF_K + 2))
+
+
+def test_reciprocal_rank_fusion_keeps_first_result_seen():
+    first = [("a", {"title": "vector", "score": 0.9})]
+    second = [("a", {"title": "lexical", "score": 12.0})]
+    (fused,) = search.reciprocal_rank_fusion([first, second], 5)
+    assert fused["title"] == "vector" and fused["score"] == pytest.approx(2 / (search.RRF_K + 1))
+    assert first[0][1]["score"] == 0.9   # inputs are not modified
+
+
+def window_hits(*hits):
+    # (block, page, score) -> the (block key, page key, result) triples of _text_hits
+    return [(block, page, {"title": block, "score": score}) for block, page, score in hits]
+
+
+def test_pool_hits_keeps_best_window_per_block():
+    hits = window_hits(("b1", "p1", 0.9), ("b2", "p1", 0.8), ("b1", "p1", 0.7), ("b3", "p2", 0.6))
+    pooled = search.pool_hits(hits, 5, pooling="max", group="block")
+    assert [(key, r["score"]) for key, r in pooled] == [("b1", 0.9), ("b2", 0.8), ("b3", 0.6)]
+    assert search.pool_hits(hits, 2, pooling="max", group="block")[-1][0] == "b2"
+
+
+def test_pool_hits_sum_by_page_reorders():
+    hits = window_hits(("b1", "p1", 0.9), ("b3", "p2", 0.8), ("b4", "p2", 0.7), ("b2", "p1", 0.1))
+    pooled = search.pool_hits(hits, 5, pooling="sum", group="page")
+    assert [key for key, _ in pooled] == ["p2", "p1"]
+    assert pooled[0][1]["score"] == pytest.approx(1.5) and hits[1][2]["score"] == 0.8
+
+
+def test_mmr_select_spreads_picks_over_pages():
+    relevance = np.array([1.0, 0.9, 0.5])
+    pages = np.array([0, 0, 1])
+    assert search.mmr_select(relevance.copy(), pages, 3, lam=0.5) == [0, 2, 1]
+    assert search.mmr_select(relevance.copy(), pages, 3, lam=1.0) == [0, 1, 2]
+    assert search.mmr_select(relevance.copy(), pages, 10, lam=0.5) == [0, 2, 1]
+
+
+def test_fuse_results_calibrates_each_modality_then_diversifies():
+    text = [
+        {"title": "t1", "url": "p1", "score": 0.9},
+        {"title": "t2", "url": "p1", "score": 0.8},
+        {"title": "t3", "url": "p2", "score": 0.1},
+    ]
+    images = [{"title": "i1", "url": "p3", "score": 0.3}, {"title": "i2", "url": "p2", "score": 0.2}]
+    fused = search.fuse_results(text, images, 5)
+    # raw image cosines are lower, but the best image is the best of its modality
+    assert [r["title"] for r in fused] == ["i1", "t1", "i2", "t2", "t3"]
+    assert [r["type"] for r in fused[:2]] == ["image", "text"]
+    assert fused[0]["calibrated_score"] == 1.0
+    assert [r["title"] for r in search.fuse_results(text, [], 2)] == ["t1", "t3"]
+    assert search.fuse_results([], [], 5) == []